@@ -28,12 +28,17 @@ drive.mount('/content/drive', force_remount=True)
 
 # 2) Import
 import os, re, numpy as np, rasterio
-from rasterio.warp import calculate_default_transform, reproject, Resampling
+from rasterio.warp import calculate_default_transform, aligned_target, reproject, Resampling
 from rasterio.io import MemoryFile
 from rasterio.crs import CRS
+from rasterio.transform import Affine
 from rasterio.merge import merge
 import matplotlib.pyplot as plt
 from pyproj import Transformer # Import Transformer for coordinate conversion
+from crism_stretch import robust_norm_rgb
+from crism_mtrdr import MTRDRCube, find_label
+from crism_tiles import TileStore
+from jezero_grid import JEZERO_GRID
 
 # Avoid check Earth/Mars if metadata is missing
 os.environ["PROJ_IGNORE_CELESTIAL_BODY"] = "YES"
@@ -64,6 +69,13 @@ MARS_EQC  = CRS.from_string("+proj=eqc +lat_ts=0 +lat_0=0 +lon_0=0 +a=3396190 +b
 MARS_GEOG = CRS.from_string("+proj=longlat +a=3396190 +b=3396190 +no_defs")  # fallback per SR senza CRS
 TARGET_RES_M = 200  # m/px (100 o 72 per più dettaglio)
 
+# Quadtree tile store shared by all runs/regions (None = single-mosaic mode with rasterio.merge)
+# Each scene updates only the tiles it touches; coarser levels are rebuilt from finer ones.
+# Opt-in: the store persists and merges with max, so pixels of earlier runs (removed scenes,
+# older processing) stay in it. Point it at a fresh directory to rebuild from this run only,
+# e.g. TILE_STORE_DIR = os.path.join(OUT_DIR, "tiles")
+TILE_STORE_DIR = None
+
 # Band aliases (as per single workflow)
 BAND_ALIASES = {
   "BD1900": ["BD1900","BD1900_2","BD1900_1"],
@@ -88,6 +100,8 @@ def reproject_match(src_ds, dst_crs, dst_res):
     transform, width, height = calculate_default_transform(
         src_ds.crs, dst_crs, src_ds.width, src_ds.height, *src_ds.bounds, resolution=dst_res
     )
+    # snap to multiples of dst_res (same pixel grid for every scene and for the tile store)
+    transform, width, height = aligned_target(transform, width, height, dst_res)
     profile = src_ds.profile.copy()
     profile.update({"crs": dst_crs, "transform": transform, "width": width, "height": height})
     data = np.full((src_ds.count, height, width), np.nan, dtype="float32")  # buffer a NaN
@@ -103,14 +117,30 @@ def reproject_match(src_ds, dst_crs, dst_res):
         )
     return data, profile
 
-def robust_norm(a):
-    v=a[np.isfinite(a)]
-    if v.size==0: return np.zeros_like(a, dtype=np.float32)
-    vmin,vmax=np.percentile(v,[2,98])
-    if not np.isfinite(vmin) or not np.isfinite(vmax) or vmax<=vmin:
-        return np.zeros_like(a, dtype=np.float32)
-    out=(a-vmin)/(vmax-vmin)
-    return np.clip(out,0,1).astype(np.float32)
+def reproject_cube_bands(cube, band_idx, dst_crs, dst_res):
+    """Reprojects selected bands of an MTRDRCube (memmap views, 0-based indices) to dst_crs, NoData=NaN."""
+    src_crs = CRS.from_string(cube.crs_proj4)
+    src_tf  = Affine(*cube.transform)
+    transform, width, height = calculate_default_transform(
+        src_crs, dst_crs, cube.samples, cube.lines, *cube.bounds, resolution=dst_res
+    )
+    transform, width, height = aligned_target(transform, width, height, dst_res)
+    profile = {"driver": "GTiff", "dtype": "float32", "crs": dst_crs, "transform": transform,
+               "width": width, "height": height, "count": len(band_idx)}
+    data = np.full((len(band_idx), height, width), np.nan, dtype="float32")
+    for k, i in enumerate(band_idx):
+        src = cube.band(i)
+        if not src.dtype.isnative:          # e.g. IEEE_REAL: byte-swap this band only
+            src = src.astype(src.dtype.newbyteorder("="))
+        reproject(
+            source=src, destination=data[k],
+            src_transform=src_tf, src_crs=src_crs,
+            dst_transform=transform, dst_crs=dst_crs,
+            resampling=Resampling.bilinear,
+            src_nodata=cube.nodata,
+            dst_nodata=np.nan,
+        )
+    return data, profile
 
 def save_rgba(path, R, G, B, alpha_mask):
     A = np.where(alpha_mask, 1.0, 0.0).astype(np.float32)
@@ -122,36 +152,56 @@ def save_rgba(path, R, G, B, alpha_mask):
 # ===========================
 scene_tifs = []
 skipped = []
+store = TileStore(TILE_STORE_DIR, TARGET_RES_M, crs=MARS_EQC.to_string()) if TILE_STORE_DIR else None
 
 for p in SR_PATHS:
     assert os.path.exists(p), f"Manca: {p}"
-    ds0 = rasterio.open(p)
-
-    # If CRS is missing, declare Martian geographic CRS for reprojection
-    if ds0.crs is None:
-        arr0 = ds0.read()
-        prof0 = ds0.profile.copy(); prof0.update({"crs": MARS_GEOG})
-        mem = MemoryFile()
-        with mem.open(**prof0) as tmp:
-            for i in range(arr0.shape[0]): tmp.write(arr0[i], i+1)
-        ds = mem.open()
-    else:
-        ds = ds0
 
-    names = list(ds.descriptions) if (ds.descriptions and ds.descriptions[0] is not None) else [f"B{i}" for i in range(1, ds.count+1)]
-    i_b1900 = find_idx(BAND_ALIASES["BD1900"], names)
-    i_d2300 = find_idx(BAND_ALIASES["D2300"],  names)
-    i_b2210 = find_idx(BAND_ALIASES["BD2210"], names)
-    if not (i_b1900 and i_d2300 and i_b2210):
-        skipped.append(os.path.basename(p)); continue  # probably IF/TRDR or SR without indices
-
-    # Reproject the entire stack as in the single code, but with NoData=NaN
-    arr_rp, prof_rp = reproject_match(ds, MARS_EQC, TARGET_RES_M)
+    # Native path: PDS label next to the .img -> memory-mapped cube, only 3 bands are touched
+    cube = None
+    if find_label(p) != p:
+        try:
+            cube = MTRDRCube(p)
+        except (ValueError, KeyError) as e:
+            print(f"[warn] {os.path.basename(p)}: label not usable by the native reader ({e}) -> rasterio")
+    if cube is not None and cube.crs_proj4 is not None:
+        i_b1900 = cube.band_index(BAND_ALIASES["BD1900"])
+        i_d2300 = cube.band_index(BAND_ALIASES["D2300"])
+        i_b2210 = cube.band_index(BAND_ALIASES["BD2210"])
+        if None in (i_b1900, i_d2300, i_b2210):
+            skipped.append(os.path.basename(p)); continue  # probably IF/TRDR or SR without indices
+
+        arr_rp, prof_rp = reproject_cube_bands(cube, [i_d2300, i_b2210, i_b1900], MARS_EQC, TARGET_RES_M)
+        D23, BD221, BD190 = arr_rp[0], arr_rp[1], arr_rp[2]
+    else:
+        ds0 = rasterio.open(p)
+
+        # If CRS is missing, declare Martian geographic CRS for reprojection
+        if ds0.crs is None:
+            arr0 = ds0.read()
+            prof0 = ds0.profile.copy(); prof0.update({"crs": MARS_GEOG})
+            mem = MemoryFile()
+            with mem.open(**prof0) as tmp:
+                for i in range(arr0.shape[0]): tmp.write(arr0[i], i+1)
+            ds = mem.open()
+        else:
+            ds = ds0
+
+        names = list(ds.descriptions) if (ds.descriptions and ds.descriptions[0] is not None) else [f"B{i}" for i in range(1, ds.count+1)]
+        i_b1900 = find_idx(BAND_ALIASES["BD1900"], names)
+        i_d2300 = find_idx(BAND_ALIASES["D2300"],  names)
+        i_b2210 = find_idx(BAND_ALIASES["BD2210"], names)
+        if not (i_b1900 and i_d2300 and i_b2210):
+            skipped.append(os.path.basename(p)); continue  # probably IF/TRDR or SR without indices
+
+        # Reproject the entire stack as in the single code, but with NoData=NaN
+        arr_rp, prof_rp = reproject_match(ds, MARS_EQC, TARGET_RES_M)
+
+        D23   = arr_rp[i_d2300-1]
+        BD221 = arr_rp[i_b2210-1]
+        BD190 = arr_rp[i_b1900-1]
 
     # Footprint mask: keep only the actual swath footprint
-    D23   = arr_rp[i_d2300-1]
-    BD221 = arr_rp[i_b2210-1]
-    BD190 = arr_rp[i_b1900-1]
     stack = np.stack([D23, BD221, BD190], axis=0)
     foot  = np.isfinite(stack).any(axis=0)                          # at least one valid band
     foot &= (np.nan_to_num(stack, nan=0.0).sum(axis=0) > 0.0)       # avoid filling zeros
@@ -175,10 +225,15 @@ for p in SR_PATHS:
         dst.write(BD221.astype("float32"), 2); dst.set_band_description(2, "BD2210")
         dst.write(BD190.astype("float32"), 3); dst.set_band_description(3, "BD1900")
     scene_tifs.append(out_tif)
+    if store is not None:
+        n_tiles = store.write_scene(np.stack([D23, BD221, BD190], axis=0), prof_rp["transform"])
+        print(f"[tiles] {scene_id}: {n_tiles} tile(s) updated")
 
     # Per-scene Quicklook (optional but useful)
-    R,G,B = robust_norm(D23), robust_norm(BD221), robust_norm(BD190)
-    save_rgba(os.path.join(OUT_DIR, f"{scene_id}_RGB.png"), R,G,B, np.isfinite(D23)&np.isfinite(BD221)&np.isfinite(BD190))
+    # Bands already saved: take one 3-band copy and normalize it in place (single fused pass)
+    alpha = np.isfinite(D23)&np.isfinite(BD221)&np.isfinite(BD190)
+    rgb = robust_norm_rgb(np.stack([D23, BD221, BD190], axis=0))
+    save_rgba(os.path.join(OUT_DIR, f"{scene_id}_RGB.png"), rgb[0],rgb[1],rgb[2], alpha)
 
 
 print(f"Scene valide: {len(scene_tifs)}")
@@ -193,20 +248,22 @@ if len(scene_tifs)==0:
 # 6) Mosaic per band (respects NoData) + RGB with alpha
 # ===========================
 srcs = [rasterio.open(t) for t in scene_tifs]
-# merge multi-band, method 'max', and especially nodata=np.nan
-mosaic, trans = merge(srcs, method='max', nodata=np.nan)
+if store is not None:
+    # coarser levels only above the tiles touched in this run
+    store.build_overviews()
+    # union of the scene footprints, read back from the intersecting tiles only ('max' merge, NaN nodata)
+    left   = min(s.bounds.left   for s in srcs); bottom = min(s.bounds.bottom for s in srcs)
+    right  = max(s.bounds.right  for s in srcs); top    = max(s.bounds.top    for s in srcs)
+    mosaic, trans = store.read_bbox(left, bottom, right, top)
+    trans = Affine(*trans)
+else:
+    # merge multi-band, method 'max', and especially nodata=np.nan
+    mosaic, trans = merge(srcs, method='max', nodata=np.nan)
 # Bands: [0]=D2300, [1]=BD2210, [2]=BD1900
 D23_m, BD221_m, BD190_m = mosaic[0], mosaic[1], mosaic[2]
 valid = np.isfinite(D23_m) | np.isfinite(BD221_m) | np.isfinite(BD190_m) # Use OR to check for any valid band
 
-# RGB with global normalization and alpha outside the footprint
-R,G,B = robust_norm(D23_m), robust_norm(BD221_m), robust_norm(BD190_m)
-rgba_path = os.path.join(OUT_DIR, "jezero_CRISM_RGB_mosaic.png")
-# The alpha mask should be based on whether *any* band has valid data for that pixel
-save_rgba(rgba_path, R,G,B, valid)
-
-
-# Also save the raw 3-band GeoTIFF of the mosaic
+# Save the raw 3-band GeoTIFF of the mosaic
 prof_m = srcs[0].profile.copy()
 prof_m.update({"height": mosaic.shape[1], "width": mosaic.shape[2],
                "transform": trans, "count": 3, "dtype": "float32",
@@ -217,6 +274,14 @@ with rasterio.open(tif_mosaic, "w", **prof_m) as dst:
     dst.write(BD221_m.astype("float32"), 2); dst.set_band_description(2, "BD2210")
     dst.write(BD190_m.astype("float32"), 3); dst.set_band_description(3, "BD1900")
 
+# RGB with global normalization and alpha outside the footprint
+# (after the GeoTIFF is written: the mosaic buffer is normalized in place, one fused pass for R,G,B)
+rgb = robust_norm_rgb(mosaic)
+rgba_path = os.path.join(OUT_DIR, "jezero_CRISM_RGB_mosaic.png")
+# The alpha mask should be based on whether *any* band has valid data for that pixel
+save_rgba(rgba_path, rgb[0],rgb[1],rgb[2], valid)
+
+
 for s in srcs: s.close()
 
 print("✅ PNG RGB con alpha:", rgba_path)
@@ -264,10 +329,8 @@ B = BD1900 (H2O)
         transformer = Transformer.from_crs("EPSG:4326", MARS_EQC, always_xy=True)
 
         # Transform the user-provided Lat/Lon coordinates to EQC
-        crop_lon_min = 77.2663 # Western most longitude in degrees
-        crop_lat_min = 18.0077 # Minimum latitude in degrees
-        crop_lon_max = 78.1112 # Eastern most longitude in degrees
-        crop_lat_max = 18.8094 # Maximum latitude in degrees
+        # (bounding box of the shared 100×100 grid, jezero_grid.py)
+        crop_lon_min, crop_lat_min, crop_lon_max, crop_lat_max = JEZERO_GRID.bbox_deg
 
 
         # Note: transformer.transform returns (lon, lat) for EPSG:4326 when always_xy=True
@@ -0,0 +1,65 @@
+# Per-pixel mineral classification of the MTRDR cubes + class fractions per mesh cell
+# Uses SR_PATHS and OUT_DIR (CRISM_RGB.py) from previous cells; cells = shared JEZERO_GRID (jezero_grid.py).
+# Each cube is memory-mapped (crism_mtrdr.py) and classified in line chunks within MEM_BUDGET_MB,
+# so native 18 m/px scenes never need a full read; each chunk goes straight into its GeoTIFF window
+# (chunks aligned to the 256-line tile rows, so every tile is written once). Outputs:
+#   <scene>_mineral_classes.tif           -> uint8 class raster (0 = unclassified, 255 = no data)
+#   mesh_mineral_class_fractions.csv      -> x, y, n_valid_px, frac_<class> per mesh cell
+
+import os
+import rasterio
+from rasterio.crs import CRS
+from rasterio.transform import Affine
+from rasterio.windows import Window
+
+from crism_mtrdr import MTRDRCube, find_label
+from crism_classify import (MEM_BUDGET_MB, MINERAL_CLASSES, NODATA_CLASS, CellClassCounter,
+                            class_fractions_table, classify_cube)
+from jezero_grid import JEZERO_GRID
+
+TILE = 256
+
+if 'SR_PATHS' in locals() and 'OUT_DIR' in locals():
+
+    counter = CellClassCounter(JEZERO_GRID.shape)
+
+    for p in dict.fromkeys(SR_PATHS):          # same scene listed twice -> classified once
+        if not os.path.exists(p) or find_label(p) == p:
+            print(f"[skip] {os.path.basename(p)}: missing file or PDS label")
+            continue
+        cube = MTRDRCube(p)
+        if cube.transform is None:
+            print(f"[skip] {os.path.basename(p)}: no map projection in label")
+            continue
+
+        # cell row per cube line, cell column per cube sample (cached per cube geometry)
+        rows, cols = JEZERO_GRID.index_map(cube.crs_proj4, cube.transform, (cube.lines, cube.samples))
+        scene_id = os.path.splitext(os.path.basename(p))[0]
+        out_tif = os.path.join(OUT_DIR, f"{scene_id}_mineral_classes.tif")
+        prof = {"driver": "GTiff", "height": cube.lines, "width": cube.samples, "count": 1,
+                "dtype": "uint8", "crs": CRS.from_string(cube.crs_proj4),
+                "transform": Affine(*cube.transform), "nodata": NODATA_CLASS,
+                "compress": "LZW", "tiled": True, "blockxsize": TILE, "blockysize": TILE}
+
+        # each chunk is counted per cell and written to its window: memory stays at one chunk
+        with rasterio.open(out_tif, "w", **prof) as dst:
+            count = counter.callback(rows, cols)
+
+            def on_chunk(l0, codes):
+                count(l0, codes)
+                dst.write(codes, 1, window=Window(0, l0, cube.samples, codes.shape[0]))
+
+            _, active = classify_cube(cube, MINERAL_CLASSES, MEM_BUDGET_MB, on_chunk=on_chunk,
+                                      keep=False, align=TILE)
+            for cls in active:
+                dst.update_tags(**{f"CLASS_{cls['code']}": cls["name"]})
+        print(f"✅ {scene_id}: classes {[c['name'] for c in active]} -> {out_tif}")
+
+    df_classes = class_fractions_table(counter, MINERAL_CLASSES)
+    output_classes_csv = os.path.join(OUT_DIR, "mesh_mineral_class_fractions.csv")
+    df_classes.to_csv(output_classes_csv, index=False)
+    print(f"✅ Class fractions per mesh cell saved to: {output_classes_csv}")
+    display(df_classes[df_classes["n_valid_px"] > 0].head())
+
+else:
+    print("Errore: Variabili SR_PATHS/OUT_DIR non trovate. Assicurati di aver eseguito le celle precedenti.")
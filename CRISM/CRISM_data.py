@@ -30,86 +30,25 @@ else:
     if mosaic_nodata is not None:
         mosaic_data = np.where(mosaic_data == mosaic_nodata, np.nan, mosaic_data)
 
-# 2. Define mesh grid, iterate, extract, calculate averages, store, and write to CSV
+# 2. Define mesh grid, extract, calculate averages, store, and write to CSV
+# The mesh is the shared JEZERO_GRID (jezero_grid.py, same cells as MOLA and THEMIS):
+# its pixel -> cell map for the mosaic geometry is computed once, then each band is
+# averaged per cell with a single bincount pass (no per-cell windows).
 
 import pandas as pd
-from rasterio.windows import from_bounds
-
-# Assuming mosaic_data, mosaic_transform, mosaic_width, mosaic_height are available from the previous cell
-# Assuming crop_xmin, crop_xmax, crop_ymin, crop_ymax are available from previous plotting cells
-
-if 'mosaic_data' in locals() and 'mosaic_transform' in locals() and \
-   'mosaic_width' in locals() and 'mosaic_height' in locals() and \
-   'crop_xmin' in locals() and 'crop_xmax' in locals() and \
-   'crop_ymin' in locals() and 'crop_ymax' in locals():
-
-    # Define the number of cells in the mesh
-    n_cells_x = 100
-    n_cells_y = 100
-
-    # Calculate the size of each mesh cell in EQC coordinates based on the cropped extent
-    cell_width_eqc = (crop_xmax - crop_xmin) / n_cells_x
-    cell_height_eqc = (crop_ymax - crop_ymin) / n_cells_y # Note: y_min and y_max order for height calculation
-
-    results = []
-
-    # Iterate through each mesh cell
-    for i in range(n_cells_x):
-        for j in range(n_cells_y):
-            # Calculate the EQC bounds of the current mesh cell
-            # xmin_cell = crop_xmin + i * cell_width_eqc
-            # xmax_cell = crop_xmin + (i + 1) * cell_width_eqc
-            # ymin_cell = crop_ymin + j * cell_height_eqc
-            # ymax_cell = crop_ymin + (j + 1) * cell_height_eqc
-
-            # Corrected calculation for cell bounds to match row/column indexing (origin='upper')
-            # The top-left corner of the image is (xmin_eqc, ymax_eqc) in EQC
-            # The top-left corner of the mesh starts at (crop_xmin, crop_ymax) in EQC for the first cell (0,0)
-            xmin_cell_eqc = crop_xmin + i * cell_width_eqc
-            xmax_cell_eqc = crop_xmin + (i + 1) * cell_width_eqc
-            # For y, we start from the top (crop_ymax) and move downwards
-            ymax_cell_eqc = crop_ymax - j * cell_height_eqc
-            ymin_cell_eqc = crop_ymax - (j + 1) * cell_height_eqc
-
-
-            # Convert EQC bounds to pixel window in the mosaic data
-            try:
-                # The from_bounds function expects (west, south, east, north)
-                window = from_bounds(xmin_cell_eqc, ymin_cell_eqc, xmax_cell_eqc, ymax_cell_eqc, mosaic_transform)
-            except Exception as e:
-                print(f"Error calculating window for cell ({i}, {j}): {e}")
-                continue
-
-
-            # Extract pixel values within the window for each band
-            # Read the data for the current window for all bands
-            try:
-                cell_data = mosaic_data[:, int(window.row_off):int(window.row_off + window.height),
-                                        int(window.col_off):int(window.col_off + window.width)]
-            except IndexError:
-                # This can happen if the calculated window is outside the mosaic dimensions
-                # In this case, the cell is outside the data coverage, so we'll have NaN values
-                cell_data = np.full((3, int(window.height), int(window.width)), np.nan)
-            except Exception as e:
-                print(f"Error extracting data for cell ({i}, {j}): {e}")
-                cell_data = np.full((3, int(window.height), int(window.width)), np.nan)
-
-
-            # Calculate average non-NaN value for each band in the cell
-            # Bands are assumed to be D2300, BD2210, BD1900
-            avg_d2300 = np.nanmean(cell_data[0, :, :])
-            avg_bd2210 = np.nanmean(cell_data[1, :, :])
-            avg_bd1900 = np.nanmean(cell_data[2, :, :])
-
-            # Append the results for the current cell
-            results.append({'x': i,
-                            'y': j,
-                            'Avg_D2300': avg_d2300,
-                            'Avg_BD2210': avg_bd2210,
-                            'Avg_BD1900': avg_bd1900})
-
-    # Create a pandas DataFrame from the results
-    df_results = pd.DataFrame(results)
+from jezero_grid import JEZERO_GRID
+
+# Assuming mosaic_data, mosaic_transform, mosaic_crs are available from the previous cell
+
+if 'mosaic_data' in locals() and 'mosaic_transform' in locals() and 'mosaic_crs' in locals():
+
+    # Mean non-NaN value of each band (D2300, BD2210, BD1900) in every cell: (3, ny, nx)
+    cell_means, cell_counts = JEZERO_GRID.aggregate(mosaic_data, mosaic_crs, mosaic_transform)
+
+    df_results = JEZERO_GRID.table({'Avg_D2300': cell_means[0],
+                                    'Avg_BD2210': cell_means[1],
+                                    'Avg_BD1900': cell_means[2]})
+    df_results = df_results.sort_values(['x', 'y']).reset_index(drop=True)
 
     # Replace NaN values with 0 as requested by the user
     df_results = df_results.fillna(0)
@@ -120,17 +59,12 @@ if 'mosaic_data' in locals() and 'mosaic_transform' in locals() and \
     # Write the DataFrame to a CSV file
     df_results.to_csv(output_csv_path, index=False)
 
-# Show the shape of the df_results DataFrame
-if 'df_results' in locals():
     print(f"Shape of df_results: {df_results.shape}")
-else:
-    print("Errore: La variabile 'df_results' non è stata trovata. Assicurati di aver eseguito la cella che crea il DataFrame.")
-
     print(f"✅ File CSV creato con successo: {output_csv_path}")
     display(df_results.head())
 
 else:
-    print("Errore: Variabili del mosaico o di ritaglio non trovate. Assicurati di aver eseguito le celle precedenti.")
+    print("Errore: Variabili del mosaico non trovate. Assicurati di aver eseguito le celle precedenti.")
 
 # 3. Ensure the DataFrame df_results with average mineral index values per mesh cell is available.
 import pandas as pd
@@ -1,4 +1,7 @@
 # Add a 100x100 mesh to the current plot
+from crism_mesh_overlay import add_mesh, fit_image_to_output
+
+MESH_DPI = 150  # output resolution of the meshed PNG
 
 # Receive fig and ax from the previous cell
 if 'fig' in locals() and 'ax' in locals():
@@ -6,31 +9,20 @@ if 'fig' in locals() and 'ax' in locals():
     current_xlim = ax.get_xlim()
     current_ylim = ax.get_ylim()
 
-    # Calculate the step size for the mesh lines
-    x_step = (current_xlim[1] - current_xlim[0]) / 100
-    y_step = (current_ylim[1] - current_ylim[0]) / 100
-
-    # Create the mesh lines
-    x_lines = np.linspace(current_xlim[0], current_xlim[1], 101) # 100 divisions means 101 lines
-    y_lines = np.linspace(current_ylim[0], current_ylim[1], 101) # 100 divisions means 101 lines
-
-    # Add vertical lines
-    for x in x_lines:
-        ax.axvline(x, color='black', linestyle='-', linewidth=0.5)
-
-    # Add horizontal lines
-    for y in y_lines:
-        ax.axhline(y, color='black', linestyle='-', linewidth=0.5)
+    # Show only the visible part of the mosaic, decimated to the output resolution
+    if 'im' in locals() and 'img' in locals() and 'extent' in locals():
+        fit_image_to_output(im, img, extent, dpi=MESH_DPI)
 
-    # Redraw the canvas to show the mesh
-    plt.draw()
+    # Add the 100x100 mesh (101 vertical + 101 horizontal lines) as one LineCollection
+    add_mesh(ax, 100, 100, current_xlim, current_ylim, colors='black', linewidths=0.5)
 
     # --- Save and display the figure ---
     # Define a path to save the figure
     meshed_image_path = os.path.join(OUT_DIR, "jezero_CRISM_RGB_mosaic_meshed.png")
 
     # Save the figure
-    fig.savefig(meshed_image_path, bbox_inches='tight', pad_inches=0.1)
+    # Layout already fixed by tight_layout(rect=...) in the plotting cell: no bbox_inches='tight' pass
+    fig.savefig(meshed_image_path, dpi=MESH_DPI)
     print(f"Grafico con mesh salvato come: {meshed_image_path}")
 
     # Close the figure to prevent it from being displayed again by plt.show()
@@ -1,4 +1,5 @@
 # Create a new plot based on the first plot's setup, but with mesh cell indices on axes
+from crism_mesh_overlay import add_mesh, fit_image_to_output
 
 if 'img' in locals() and 'extent' in locals() and \
    'crop_xmin' in locals() and 'crop_xmax' in locals() and \
@@ -22,26 +23,11 @@ if 'img' in locals() and 'extent' in locals() and \
     # Ensure the aspect ratio is equal to prevent stretching
     ax_combined.set_aspect('equal', adjustable='box')
 
-    # --- Add the 100x100 mesh lines ---
-    # Get the current plot limits (which are the cropped EQC limits)
-    current_xlim = ax_combined.get_xlim()
-    current_ylim = ax_combined.get_ylim()
+    # Display level matched to the output size: crop to the AOI and decimate to the axes pixels
+    fit_image_to_output(im_combined, img, extent)
 
-    # Calculate the step size for the mesh lines based on the cropped EQC extent
-    x_step_mesh_lines = (current_xlim[1] - current_xlim[0]) / 100
-    y_step_mesh_lines = (current_ylim[1] - current_ylim[0]) / 100
-
-    # Create the mesh lines
-    x_lines_mesh = np.linspace(current_xlim[0], current_xlim[1], 101) # 100 divisions means 101 lines
-    y_lines_mesh = np.linspace(current_ylim[0], current_ylim[1], 101) # 100 divisions means 101 lines
-
-    # Add vertical lines
-    for x in x_lines_mesh:
-        ax_combined.axvline(x, color='black', linestyle='-', linewidth=0.5)
-
-    # Add horizontal lines
-    for y in y_lines_mesh:
-        ax_combined.axhline(y, color='black', linestyle='-', linewidth=0.5)
+    # --- Add the 100x100 mesh lines (one LineCollection) ---
+    add_mesh(ax_combined, 100, 100, ax_combined.get_xlim(), ax_combined.get_ylim(), colors='black', linewidths=0.5)
     # --- End mesh lines ---
 
 
@@ -0,0 +1,171 @@
+# crism_classify.py
+# Per-pixel mineral classification on CRISM MTRDR summary-parameter cubes.
+# - MINERAL_CLASSES  -> ordered threshold rules over summary parameters (first match wins)
+# - classify_cube    -> class raster (uint8, native cube geometry), processed in line chunks
+#                       sized from a fixed memory budget, vectorized NumPy inside each chunk
+# - CellClassCounter / class_fractions_table -> per-cell class fractions on the 100×100 mesh
+#   (pixel -> cell maps from jezero_grid.JEZERO_GRID.index_map)
+#
+# Works on MTRDRCube (crism_mtrdr.py): only the parameters used by the rules are read,
+# chunk by chunk, straight from the memmap. Thresholds follow the usual CRISM summary
+# parameter detection levels (Viviano-Beck et al., 2014) and can be tuned here.
+
+import numpy as np
+import pandas as pd
+
+NODATA_CLASS = 255
+UNCLASSIFIED = 0
+
+# code, name, rules: list of (aliases, min value); all rules of a class must hold.
+# Order = priority: the first class whose rules hold is assigned.
+MINERAL_CLASSES = [
+    {"code": 1, "name": "carbonate",      "rules": [(["MIN2295_2480"], 0.005), (["BD1900_2", "BD1900"], 0.005)]},
+    {"code": 2, "name": "olivine",        "rules": [(["OLINDEX3", "OLINDEX2"], 0.10)]},
+    {"code": 3, "name": "fe_mg_smectite", "rules": [(["D2300"], 0.015), (["BD1900_2", "BD1900"], 0.005)]},
+    {"code": 4, "name": "al_oh",          "rules": [(["BD2210_2", "BD2210", "D2200"], 0.005)]},
+    {"code": 5, "name": "hydrated_silica","rules": [(["MIN2250", "BD2250"], 0.005), (["BD1900_2", "BD1900"], 0.005)]},
+    {"code": 6, "name": "pyroxene",       "rules": [(["LCPINDEX2", "HCPINDEX2"], 0.02)]},
+    {"code": 7, "name": "hydrated",       "rules": [(["BD1900_2", "BD1900"], 0.01)]},
+]
+
+MEM_BUDGET_MB = 256
+
+
+def resolve_rules(cube, classes=MINERAL_CLASSES):
+    """
+    Map every rule to a band index of this cube. Classes whose parameters are missing in
+    the cube are dropped (with a message), so the same rule set works on every product.
+    Returns (active_classes, band_indices_used).
+    """
+    active, used = [], []
+    for cls in classes:
+        resolved = []
+        for aliases, thr in cls["rules"]:
+            i = cube.band_index(aliases)
+            if i is None:
+                resolved = None; break
+            resolved.append((i, thr))
+            if i not in used:
+                used.append(i)
+        if resolved is None:
+            print(f"[info] class '{cls['name']}': parameters missing in cube, skipped")
+            continue
+        active.append({**cls, "resolved": resolved})
+    return active, used
+
+
+def chunk_lines(samples, n_params, mem_budget_mb=MEM_BUDGET_MB, align=1):
+    """
+    Lines per chunk so the peak of one chunk fits the budget. Bytes per pixel:
+      classify_block       -> params 4·n_params (float32) + codes, valid, free, hit, 2 bool temporaries
+      CellClassCounter.add -> codes + inside mask + int32 keys + selected int32 keys (params freed)
+    The bincount output of the counter is fixed (cells × codes) and not counted.
+    align: chunk height rounded down to a multiple of it (e.g. GeoTIFF block height).
+    """
+    per_line = samples * max(4 * n_params + 6, 1 + 1 + 4 + 4)
+    step = max(1, int(mem_budget_mb * 1024 * 1024 // per_line))
+    return max(align, step // align * align)
+
+
+def classify_block(params, nodata, active):
+    """Classify one chunk. params: {band index: (n, samples) float32}, returns uint8 codes."""
+    first = next(iter(params.values()))
+    codes = np.full(first.shape, UNCLASSIFIED, dtype=np.uint8)
+    valid = np.ones(first.shape, dtype=bool)
+    for a in params.values():
+        valid &= np.isfinite(a)
+        if nodata is not None:
+            valid &= a != nodata
+    free = valid.copy()
+    for cls in active:
+        hit = free.copy()
+        for i, thr in cls["resolved"]:
+            hit &= params[i] >= thr
+        codes[hit] = cls["code"]
+        free &= ~hit
+    codes[~valid] = NODATA_CLASS
+    return codes
+
+
+def classify_cube(cube, classes=MINERAL_CLASSES, mem_budget_mb=MEM_BUDGET_MB, out=None, on_chunk=None,
+                  keep=True, align=1):
+    """
+    Class raster for a whole MTRDRCube, chunk by chunk (lines), within mem_budget_mb.
+    out: optional preallocated (lines, samples) uint8 array/memmap.
+    on_chunk(line0, codes): optional callback per chunk (e.g. to accumulate cell counts or write
+    the chunk to a GeoTIFF window).
+    keep=False: no full raster, the codes only go to on_chunk (returns None for codes).
+    align: chunk height multiple (see chunk_lines).
+    Returns (codes, active_classes).
+    """
+    active, used = resolve_rules(cube, classes)
+    if out is None and keep:
+        out = np.empty((cube.lines, cube.samples), dtype=np.uint8)
+    if not active:
+        if out is not None:
+            out[...] = NODATA_CLASS
+        if on_chunk is not None:
+            step = chunk_lines(cube.samples, 0, mem_budget_mb, align)
+            for l0 in range(0, cube.lines, step):
+                on_chunk(l0, np.full((min(cube.lines, l0 + step) - l0, cube.samples), NODATA_CLASS, np.uint8))
+        return out, active
+    step = chunk_lines(cube.samples, len(used), mem_budget_mb, align)
+    for l0 in range(0, cube.lines, step):
+        l1 = min(cube.lines, l0 + step)
+        params = {i: np.asarray(cube.band(i)[l0:l1], dtype=np.float32) for i in used}
+        codes = classify_block(params, cube.nodata, active)
+        del params
+        if out is not None:
+            out[l0:l1] = codes
+        if on_chunk is not None:
+            on_chunk(l0, codes)
+    return out, active
+
+
+# ===========================
+# Per-cell class fractions
+# ===========================
+
+class CellClassCounter:
+    """Accumulates (cell, class) pixel counts chunk by chunk, across scenes."""
+
+    def __init__(self, grid_shape=(100, 100), n_codes=max(c["code"] for c in MINERAL_CLASSES) + 1):
+        self.grid_shape = grid_shape
+        self.n_codes = n_codes
+        self.counts = np.zeros(grid_shape[0] * grid_shape[1] * n_codes, dtype=np.int64)
+
+    def add(self, codes, rows, cols):
+        """codes: (n, samples) uint8, rows: (n,), cols: (samples,) from JEZERO_GRID.index_map."""
+        nx = self.grid_shape[1]
+        inside = codes != NODATA_CLASS
+        inside &= (rows >= 0)[:, None]
+        inside &= (cols >= 0)[None, :]
+        # key = cell * n_codes + code in int32 (cells × codes is far below 2**31)
+        key = np.add.outer((np.asarray(rows) * (nx * self.n_codes)).astype(np.int32),
+                           (np.asarray(cols) * self.n_codes).astype(np.int32))
+        key += codes
+        self.counts += np.bincount(key[inside], minlength=self.counts.size)
+
+    def callback(self, rows, cols):
+        """on_chunk callback for classify_cube."""
+        return lambda l0, codes: self.add(codes, rows[l0:l0 + codes.shape[0]], cols)
+
+    def fractions(self):
+        """(ny, nx, n_codes) class fractions over the valid pixels of each cell (NaN if none)."""
+        c = self.counts.reshape(self.grid_shape[0], self.grid_shape[1], self.n_codes).astype(np.float64)
+        tot = c.sum(axis=2, keepdims=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(tot > 0, c / tot, np.nan)
+
+
+def class_fractions_table(counter, classes=MINERAL_CLASSES):
+    """Grid table (x, y, n_valid_px, frac_<class>...) matching the mesh CSV layout (x = column)."""
+    ny, nx = counter.grid_shape
+    frac = counter.fractions()
+    counts = counter.counts.reshape(ny, nx, counter.n_codes)
+    yy, xx = np.meshgrid(np.arange(ny), np.arange(nx), indexing="ij")
+    table = {"x": xx.ravel(), "y": yy.ravel(), "n_valid_px": counts.sum(axis=2).ravel()}
+    table["frac_unclassified"] = frac[..., UNCLASSIFIED].ravel()
+    for cls in classes:
+        table[f"frac_{cls['name']}"] = frac[..., cls["code"]].ravel()
+    return pd.DataFrame(table).sort_values(["x", "y"]).reset_index(drop=True)
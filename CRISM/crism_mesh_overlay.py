@@ -0,0 +1,75 @@
+# crism_mesh_overlay.py
+# Fast mesh overlay for the CRISM RGB plots (CRISM_mesh.py, CRISM_mesh_axis.py).
+# - add_mesh          -> the whole nx×ny mesh as ONE LineCollection (instead of 2·(n+1)
+#                        axvline/axhline artists, each with its own transform and draw call)
+# - image_for_output  -> crop the RGB(A) image to the visible limits and decimate it to the
+#                        output pixel size, so imshow never resamples a full-resolution mosaic
+# Rendering cost then depends on the output size (figsize·dpi), not on the mosaic size or n.
+
+import math
+import numpy as np
+from matplotlib.collections import LineCollection
+
+MESH_STYLE = {"colors": "black", "linewidths": 0.5, "linestyles": "solid"}
+
+
+def mesh_segments(xlim, ylim, nx=100, ny=100):
+    """(nx+1 + ny+1, 2, 2) segments of a regular mesh spanning xlim × ylim."""
+    xs = np.linspace(xlim[0], xlim[1], nx + 1)
+    ys = np.linspace(ylim[0], ylim[1], ny + 1)
+    v = np.empty((nx + 1, 2, 2)); v[:, :, 0] = xs[:, None]; v[:, 0, 1] = ylim[0]; v[:, 1, 1] = ylim[1]
+    h = np.empty((ny + 1, 2, 2)); h[:, :, 1] = ys[:, None]; h[:, 0, 0] = xlim[0]; h[:, 1, 0] = xlim[1]
+    return np.concatenate([v, h])
+
+
+def add_mesh(ax, nx=100, ny=100, xlim=None, ylim=None, **style):
+    """Add the mesh to ax as a single LineCollection over the current (or given) limits."""
+    xlim = ax.get_xlim() if xlim is None else xlim
+    ylim = ax.get_ylim() if ylim is None else ylim
+    lc = LineCollection(mesh_segments(xlim, ylim, nx, ny), **{**MESH_STYLE, **style})
+    ax.add_collection(lc, autolim=False)
+    return lc
+
+
+def axes_size_px(ax, dpi=None):
+    """Width/height of ax in output pixels at dpi (default: figure dpi)."""
+    fig = ax.figure
+    dpi = fig.dpi if dpi is None else dpi
+    bbox = ax.get_position()
+    w_in, h_in = fig.get_size_inches()
+    return max(1, int(round(bbox.width * w_in * dpi))), max(1, int(round(bbox.height * h_in * dpi)))
+
+
+def image_for_output(img, extent, xlim, ylim, out_w_px, out_h_px):
+    """
+    Crop img (H, W[, C], origin='upper', extent=[left, right, bottom, top]) to xlim × ylim and
+    decimate by the integer factor that keeps at least one image pixel per output pixel.
+    Returns (img_view, extent_of_view); img_view is a strided view (no copy).
+    """
+    H, W = img.shape[:2]
+    left, right, bottom, top = extent
+    px_w, px_h = (right - left) / W, (top - bottom) / H
+    x0, x1 = sorted(xlim); y0, y1 = sorted(ylim)
+    c0 = max(0, int(math.floor((x0 - left) / px_w))); c1 = min(W, int(math.ceil((x1 - left) / px_w)))
+    r0 = max(0, int(math.floor((top - y1) / px_h)));  r1 = min(H, int(math.ceil((top - y0) / px_h)))
+    if c1 <= c0 or r1 <= r0:
+        return img[:0, :0], extent
+    step = max(1, min((c1 - c0) // out_w_px, (r1 - r0) // out_h_px))
+    view = img[r0:r1:step, c0:c1:step]
+    r1 = r0 + view.shape[0] * step
+    c1 = c0 + view.shape[1] * step
+    sub_extent = [left + c0 * px_w, left + c1 * px_w, top - r1 * px_h, top - r0 * px_h]
+    return view, sub_extent
+
+
+def fit_image_to_output(im, img, extent, dpi=None):
+    """Swap the data of an AxesImage for the view matching its axes limits and output size."""
+    ax = im.axes
+    ax.apply_aspect()                       # final axes box (aspect='equal')
+    xlim, ylim = ax.get_xlim(), ax.get_ylim()
+    w, h = axes_size_px(ax, dpi)
+    view, sub_extent = image_for_output(img, extent, xlim, ylim, w, h)
+    im.set_data(view)
+    im.set_extent(sub_extent)
+    ax.set_xlim(xlim); ax.set_ylim(ylim)   # set_extent may autoscale
+    return view.shape
@@ -0,0 +1,286 @@
+# crism_mtrdr.py
+# Native reader for CRISM MTRDR cubes (*_mtr3.img + PDS3 label), no GDAL involved.
+# - parse_pds3_label -> nested dict of the label (OBJECT/GROUP blocks, units stripped)
+# - MTRDRCube        -> label parsed once, cube exposed as numpy.memmap (bands, lines, samples)
+#                       with the right interleave/dtype/byte order; band lookups are O(1)
+#                       and single bands are views (nothing is read until pixels are touched)
+# - MTRDRCube.transform / crs_proj4 -> georeferencing for rasterio.warp.reproject (numpy source)
+
+import os
+import re
+import numpy as np
+
+# PDS3 SAMPLE_TYPE -> numpy byte order + kind
+_SAMPLE_TYPES = {
+    "PC_REAL": "<f", "IEEE_REAL": ">f", "MAC_REAL": ">f", "SUN_REAL": ">f", "REAL": ">f",
+    "LSB_INTEGER": "<i", "MSB_INTEGER": ">i", "PC_INTEGER": "<i", "MAC_INTEGER": ">i",
+    "SUN_INTEGER": ">i", "INTEGER": ">i",
+    "LSB_UNSIGNED_INTEGER": "<u", "MSB_UNSIGNED_INTEGER": ">u", "PC_UNSIGNED_INTEGER": "<u",
+    "MAC_UNSIGNED_INTEGER": ">u", "SUN_UNSIGNED_INTEGER": ">u", "UNSIGNED_INTEGER": ">u",
+}
+
+# BAND_STORAGE_TYPE -> axis order on disk and transpose to (bands, lines, samples)
+_INTERLEAVE = {
+    "BAND_SEQUENTIAL":   ("bsq", (0, 1, 2)),
+    "LINE_INTERLEAVED":  ("bil", (1, 0, 2)),
+    "SAMPLE_INTERLEAVED": ("bip", (2, 0, 1)),
+}
+
+
+# ===========================
+# PDS3 label
+# ===========================
+
+def _parse_value(raw):
+    """PDS3 value -> python (str/float/int/tuple); units like <KM> are dropped."""
+    v = raw.strip()
+    if v.startswith("(") or v.startswith("{"):
+        inner = v[1:-1]
+        items = re.findall(r'"[^"]*"|[^,]+', inner)
+        return tuple(_parse_value(i) for i in items if i.strip())
+    if v.startswith('"'):
+        return re.sub(r"\s+", " ", v.strip('"')).strip()
+    v = re.sub(r"<[^>]*>", "", v).strip()
+    for cast in (int, float):
+        try:
+            return cast(v)
+        except ValueError:
+            pass
+    return v.strip("'")
+
+
+def parse_pds3_label(path):
+    """
+    Parse a PDS3 label (detached .lbl or attached at the start of the .img).
+    Returns a dict; OBJECT/GROUP blocks become nested dicts under their name
+    (repeated names get a numeric suffix: IMAGE, IMAGE_2, ...).
+    """
+    with open(path, "rb") as fh:
+        head = fh.read(1 << 20)
+    txt = head.decode("latin-1")
+    end = re.search(r"^\s*END\s*$", txt, re.MULTILINE)
+    if end:
+        txt = txt[:end.start()]
+
+    root = {}
+    stack = [root]
+    key, buf = None, ""
+
+    def flush():
+        nonlocal key, buf
+        if key is None:
+            return
+        k, v = key, _parse_value(buf)
+        key, buf = None, ""
+        if k in ("OBJECT", "GROUP"):
+            node, name = {}, str(v)
+            parent = stack[-1]
+            n, base = 2, name
+            while name in parent:
+                name = f"{base}_{n}"; n += 1
+            parent[name] = node
+            stack.append(node)
+        elif k in ("END_OBJECT", "END_GROUP"):
+            if len(stack) > 1:
+                stack.pop()
+        else:
+            stack[-1][k] = v
+
+    for line in txt.splitlines():
+        line = re.sub(r"/\*.*?\*/", "", line).rstrip()
+        if not line.strip():
+            continue
+        m = re.match(r"^\s*(\^?[A-Za-z][\w:]*)\s*=\s*(.*)$", line)
+        opening = buf.count("(") + buf.count("{") > buf.count(")") + buf.count("}")
+        open_quote = buf.count('"') % 2 == 1
+        if m and not opening and not open_quote:
+            flush()
+            key, buf = m.group(1).upper(), m.group(2)
+        elif m is None and line.strip() in ("END_OBJECT", "END_GROUP") and not opening:
+            flush()
+            key, buf = line.strip(), ""
+            flush()
+        else:
+            buf += " " + line.strip()
+    flush()
+    return root
+
+
+def find_key(label, key):
+    """First value of key anywhere in the (nested) label, or None."""
+    if key in label:
+        return label[key]
+    for v in label.values():
+        if isinstance(v, dict):
+            hit = find_key(v, key)
+            if hit is not None:
+                return hit
+    return None
+
+
+def find_label(path):
+    """Detached label for a .img (same stem, .lbl/.LBL), or the .img itself (attached label)."""
+    stem, ext = os.path.splitext(path)
+    if ext.lower() == ".lbl":
+        return path
+    for e in (".lbl", ".LBL"):
+        if os.path.exists(stem + e):
+            return stem + e
+    return path
+
+
+def _image_file_and_offset(label, label_path):
+    """Resolve ^IMAGE to (data file path, byte offset)."""
+    ptr = label.get("^IMAGE")
+    rec = int(label.get("RECORD_BYTES", 1))
+    folder = os.path.dirname(label_path)
+    if ptr is None:
+        raise ValueError(f"{os.path.basename(label_path)}: no ^IMAGE pointer in label")
+    if isinstance(ptr, tuple):
+        fname, pos = ptr[0], ptr[1] if len(ptr) > 1 else 1
+        path = os.path.join(folder, str(fname))
+        if not os.path.exists(path):
+            for cand in (str(fname).lower(), str(fname).upper()):
+                if os.path.exists(os.path.join(folder, cand)):
+                    path = os.path.join(folder, cand); break
+    elif isinstance(ptr, str):
+        fname, pos = ptr, 1
+        path = os.path.join(folder, fname)
+        if not os.path.exists(path):
+            for cand in (fname.lower(), fname.upper()):
+                if os.path.exists(os.path.join(folder, cand)):
+                    path = os.path.join(folder, cand); break
+    else:
+        path, pos = label_path, ptr
+    # <BYTES> units are dropped by the parser: values >= RECORD_BYTES on a record-based
+    # label are ambiguous, so read the raw pointer text to tell bytes from records
+    with open(label_path, "rb") as fh:
+        raw = fh.read(1 << 20).decode("latin-1")
+    in_bytes = re.search(r"\^IMAGE\s*=.*<\s*BYTES\s*>", raw, re.IGNORECASE) is not None
+    offset = int(pos) - 1 if in_bytes else (int(pos) - 1) * rec
+    return path, offset
+
+
+# ===========================
+# MTRDR cube
+# ===========================
+
+class MTRDRCube:
+    """
+    Memory-mapped CRISM MTRDR cube.
+        cube = MTRDRCube(".../frt000047a3_07_sr166j_mtr3.img")
+        i = cube.band_index("BD1900")        # O(1), aliases from BAND_ALIASES-like lists
+        bd1900 = cube.band("BD1900")          # (lines, samples) view, no read
+        d23, bd221, bd190 = cube.bands(["D2300", "BD2210", "BD1900"])
+    """
+
+    def __init__(self, path):
+        self.label_path = find_label(path)
+        self.label = parse_pds3_label(self.label_path)
+        img = self.label.get("IMAGE") or find_key(self.label, "IMAGE")
+        if not isinstance(img, dict):
+            raise ValueError(f"{os.path.basename(self.label_path)}: no IMAGE object in label")
+        self.image_label = img
+
+        self.lines = int(img["LINES"])
+        self.samples = int(img["LINE_SAMPLES"])
+        self.n_bands = int(img.get("BANDS", 1))
+        if int(img.get("LINE_PREFIX_BYTES", 0)) or int(img.get("LINE_SUFFIX_BYTES", 0)):
+            raise ValueError("line prefix/suffix bytes are not supported")
+
+        stype = str(img["SAMPLE_TYPE"]).upper()
+        if stype not in _SAMPLE_TYPES:
+            raise ValueError(f"unsupported SAMPLE_TYPE {stype}")
+        self.dtype = np.dtype(f"{_SAMPLE_TYPES[stype]}{int(img['SAMPLE_BITS']) // 8}")
+
+        storage = str(img.get("BAND_STORAGE_TYPE", "BAND_SEQUENTIAL")).upper()
+        if storage not in _INTERLEAVE:
+            raise ValueError(f"unsupported BAND_STORAGE_TYPE {storage}")
+        self.interleave, axes = _INTERLEAVE[storage]
+
+        self.nodata = None
+        for k in ("CORE_NULL", "MISSING_CONSTANT", "NULL"):
+            if isinstance(img.get(k), (int, float)):
+                self.nodata = float(img[k]); break
+
+        names = img.get("BAND_NAME") or find_key(self.label, "BAND_NAME")
+        if isinstance(names, str):
+            names = (names,)
+        self.band_names = [str(n) for n in names] if names else [f"B{i}" for i in range(1, self.n_bands + 1)]
+        self._index = {n.upper(): i for i, n in enumerate(self.band_names)}
+
+        self.img_path, self.offset = _image_file_and_offset(self.label, self.label_path)
+        disk_shape = {
+            "bsq": (self.n_bands, self.lines, self.samples),
+            "bil": (self.lines, self.n_bands, self.samples),
+            "bip": (self.lines, self.samples, self.n_bands),
+        }[self.interleave]
+        raw = np.memmap(self.img_path, dtype=self.dtype, mode="r", offset=self.offset, shape=disk_shape)
+        self.data = raw.transpose(axes)   # (bands, lines, samples) view, no copy
+
+    # ---- band access ----
+    def band_index(self, name_or_aliases):
+        """0-based band index for a name or a list of aliases (exact match first, then substring)."""
+        targets = [name_or_aliases] if isinstance(name_or_aliases, str) else list(name_or_aliases)
+        for t in targets:
+            i = self._index.get(t.upper())
+            if i is not None:
+                return i
+        for t in targets:
+            for n, i in self._index.items():
+                if t.upper() in n:
+                    return i
+        return None
+
+    def band(self, name_or_index):
+        """Single band as a (lines, samples) view of the memmap."""
+        i = name_or_index if isinstance(name_or_index, (int, np.integer)) else self.band_index(name_or_index)
+        if i is None:
+            raise KeyError(name_or_index)
+        return self.data[i]
+
+    def bands(self, names):
+        """List of band views (no copy, only the touched bytes are ever read)."""
+        return [self.band(n) for n in names]
+
+    def read(self, name_or_index, dtype=np.float32):
+        """Band as a native-endian float array with nodata -> NaN (this one reads)."""
+        a = np.asarray(self.band(name_or_index), dtype=dtype)
+        if self.nodata is not None:
+            a[a == self.nodata] = np.nan
+        return a
+
+    # ---- georeferencing ----
+    @property
+    def projection(self):
+        return find_key(self.label, "IMAGE_MAP_PROJECTION") or {}
+
+    @property
+    def crs_proj4(self):
+        """Equirectangular CRS of the product as a PROJ string (None if the label has no map projection)."""
+        p = self.projection
+        if not p:
+            return None
+        r_m = float(p.get("A_AXIS_RADIUS", 3396.19)) * 1000.0
+        lat_ts = float(p.get("CENTER_LATITUDE", 0.0))
+        lon_0 = float(p.get("CENTER_LONGITUDE", 0.0))
+        return f"+proj=eqc +lat_ts={lat_ts} +lat_0=0 +lon_0={lon_0} +a={r_m} +b={r_m} +units=m +no_defs"
+
+    @property
+    def transform(self):
+        """
+        Affine coefficients (a, b, c, d, e, f) in metres, GDAL PDS convention:
+        ULX = -(SAMPLE_PROJECTION_OFFSET - 0.5)·scale, ULY = (LINE_PROJECTION_OFFSET - 0.5)·scale.
+        """
+        p = self.projection
+        if not p:
+            return None
+        scale = float(p["MAP_SCALE"]) * 1000.0
+        ulx = -(float(p["SAMPLE_PROJECTION_OFFSET"]) - 0.5) * scale
+        uly = (float(p["LINE_PROJECTION_OFFSET"]) - 0.5) * scale
+        return (scale, 0.0, ulx, 0.0, -scale, uly)
+
+    @property
+    def bounds(self):
+        a, _, c, _, e, f = self.transform
+        return c, f + e * self.lines, c + a * self.samples, f   # left, bottom, right, top
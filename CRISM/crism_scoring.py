@@ -0,0 +1,142 @@
+# crism_scoring.py
+# Shared CRISM scoring engine used by good_bad_spots.py and flag_mineral_composition.py.
+# It computes, once per input table:
+# - crism_has_data      -> the cell has real CRISM coverage (not all Avg_* == 0)
+# - CRISM_score         -> weighted score 0–100 (water-first weights)
+# - Q                   -> p60/p80 quantile table over cells with data
+# - CRISM_OK_quantile   -> GOOD/BAD decision (see CRISM/README.md)
+# Results are cached together with a fingerprint of the input columns, so the plotting
+# and export steps reuse the same flag table in memory instead of re-reading the CSV.
+
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+
+MESH_CSV = "mesh_mineral_averages_percentages.csv"
+
+AVG_COLS = ["Avg_D2300", "Avg_BD2210", "Avg_BD1900"]
+PCT_COLS = ["% H2O", "% Fe/Mg", "% Al-OH"]
+
+# Weights: “water-first” (w_H2O, w_FeMg, w_AlOH), same order as PCT_COLS
+DEFAULT_WEIGHTS = (0.60, 0.30, 0.10)
+
+# Quantiles used by the adaptive thresholds
+QUANTILES = {"p60": 0.6, "p80": 0.8}
+
+# Score threshold = 0.55·p80(%H2O) + 0.45·p60(%Fe/Mg)
+SCORE_THR_W = (0.55, 0.45)
+
+# { (fingerprint, weights): (df_flags, Q) }
+_CACHE = {}
+# { csv_path: (mtime, df) }
+_CSV_CACHE = {}
+
+
+def input_fingerprint(df):
+    """Hash of the columns the score depends on (order-sensitive)."""
+    arr = np.ascontiguousarray(df[AVG_COLS + PCT_COLS].to_numpy(dtype=np.float64))
+    return hashlib.sha1(arr.tobytes()).hexdigest()
+
+
+def read_mesh_table(out_dir, filename=MESH_CSV):
+    """Read the per-cell percentages CSV once (re-read only if the file changed on disk)."""
+    path = os.path.join(out_dir, filename)
+    try:
+        mtime = os.path.getmtime(path)
+    except FileNotFoundError:
+        print(f"Error: The file {path} was not found.")
+        print("Please ensure the previous steps for saving the CSV were executed correctly.")
+        raise SystemExit("Missing CSV file.")
+    hit = _CSV_CACHE.get(path)
+    if hit is not None and hit[0] == mtime:
+        return hit[1]
+    df = pd.read_csv(path)
+    _CSV_CACHE[path] = (mtime, df)
+    return df
+
+
+def has_data_mask(df):
+    """Gating: a row with all zero averages has no CRISM coverage."""
+    return df[AVG_COLS].to_numpy().sum(axis=1) > 0
+
+
+def quantile_table(df, has_data=None):
+    """p60/p80 of the mineral percentages over the cells with data."""
+    if has_data is None:
+        has_data = has_data_mask(df)
+    return df.loc[has_data, PCT_COLS].quantile(list(QUANTILES.values())).rename(
+        index={v: k for k, v in QUANTILES.items()}
+    )
+
+
+def _decide(pct, has_data, scores, Q):
+    """
+    Quantile decision rule, vectorized over cells (rows) and weight vectors (columns).
+    pct: (N, 3) in PCT_COLS order, has_data: (N,), scores: (N, K) -> (N, K) bool.
+    """
+    h2o, femg = pct[:, 0], pct[:, 1]
+    mineral_ok = (
+        (h2o >= Q.loc["p80", "% H2O"]) |                                          # top 20% H2O
+        ((h2o >= Q.loc["p60", "% H2O"]) & (femg >= Q.loc["p60", "% Fe/Mg"]))
+    )
+    thr = SCORE_THR_W[0] * Q.loc["p80", "% H2O"] + SCORE_THR_W[1] * Q.loc["p60", "% Fe/Mg"]
+    return (has_data & mineral_ok)[:, None] & (scores >= thr)
+
+
+def score_flags(df, weights=DEFAULT_WEIGHTS):
+    """
+    Add crism_has_data, CRISM_score and CRISM_OK_quantile to df (in place) and return (df, Q).
+    Cached on (input fingerprint, weights): a second call with the same table is free.
+    """
+    weights = tuple(float(w) for w in weights)
+    key = (input_fingerprint(df), weights)
+    hit = _CACHE.get(key)
+    if hit is not None:
+        cached, Q = hit
+        for c in ["crism_has_data", "CRISM_score", "CRISM_OK_quantile"]:
+            df[c] = cached[c].to_numpy()
+        return df, Q
+
+    has_data = has_data_mask(df)
+    Q = quantile_table(df, has_data)
+    pct = df[PCT_COLS].to_numpy(dtype=float)
+    scores = pct @ np.asarray(weights)
+    ok = _decide(pct, has_data, scores[:, None], Q)[:, 0]
+
+    df["crism_has_data"] = has_data
+    df["CRISM_score"] = scores
+    df["CRISM_OK_quantile"] = ok
+    _CACHE[key] = (df[["crism_has_data", "CRISM_score", "CRISM_OK_quantile"]].copy(), Q)
+    return df, Q
+
+
+def batch_scores(df, weight_sets):
+    """
+    Re-score under several weight vectors in one vectorized call.
+    weight_sets: (K, 3) array-like of (w_H2O, w_FeMg, w_AlOH).
+    Returns (scores, ok) as (N, K) arrays; quantile thresholds are shared (they do not
+    depend on the weights) and come from the cache when available.
+    """
+    W = np.atleast_2d(np.asarray(weight_sets, dtype=float))
+    if W.shape[1] != len(PCT_COLS):
+        raise ValueError(f"weight_sets must have {len(PCT_COLS)} columns (w_H2O, w_FeMg, w_AlOH), got {W.shape[1]}")
+    has_data = has_data_mask(df)
+    fp = input_fingerprint(df)
+    Q = next((q for (f, _), (_, q) in _CACHE.items() if f == fp), None)
+    if Q is None:
+        Q = quantile_table(df, has_data)
+    pct = df[PCT_COLS].to_numpy(dtype=float)
+    scores = pct @ W.T
+    return scores, _decide(pct, has_data, scores, Q)
+
+
+def load_flag_table(out_dir, df=None, weights=DEFAULT_WEIGHTS):
+    """
+    Return the scored flag table, reusing df when it is already in memory
+    (e.g. the notebook global) and reading MESH_CSV from out_dir otherwise.
+    """
+    if df is None or df.empty:
+        df = read_mesh_table(out_dir)
+    df, _ = score_flags(df, weights)
+    return df
@@ -0,0 +1,83 @@
+# crism_stretch.py
+# 2–98% contrast stretch for CRISM index bands without a full sort.
+# - stretch_limits   -> (vmin, vmax) from a uniform random sample of the finite pixels of the band
+# - robust_norm_rgb  -> fused, in-place normalization of a (3, H, W) stack
+#
+# The sample never materializes the finite population: positions are drawn uniformly over the whole
+# band (fixed seed) and the finite values among them are kept, topped up with further draws. Kept
+# draws are i.i.d. uniform over the finite pixels, so with n of them the Dvoretzky–Kiefer–Wolfowitz
+# inequality gives
+# |F_sample - F| <= sqrt(ln(2/alpha) / (2n)) with probability 1 - alpha, i.e. the returned "2%"
+# limit lies between the true 2 - eps% and 2 + eps% percentiles.
+# For the default 1e6 samples and alpha = 1e-3, eps ≈ 0.2 percentile points.
+
+import numpy as np
+
+STRETCH_PCT = (2.0, 98.0)
+MAX_SAMPLES = 1_000_000
+SEED = 0                 # fixed: the same band always gets the same limits
+MAX_ROUNDS = 8           # draws of max_samples positions before a mostly-NaN band is scanned instead
+
+
+def sample_finite(a, max_samples=MAX_SAMPLES, seed=SEED, max_rounds=MAX_ROUNDS):
+    """
+    Uniform random sample (fixed seed) of at most max_samples finite values of a; memory is
+    O(max_samples) whatever the size of a. Bands with fewer finite pixels than that (estimated
+    from the draws) return all of them, gathered block by block.
+    """
+    flat = a.reshape(-1)
+    if flat.size <= max_samples:
+        return flat[np.isfinite(flat)]
+    rng = np.random.default_rng(seed)
+    kept, n_kept, n_drawn = [], 0, 0
+    for _ in range(max_rounds):
+        v = flat[np.sort(rng.integers(0, flat.size, max_samples))]
+        v = v[np.isfinite(v)][:max_samples - n_kept]
+        kept.append(v)
+        n_kept += v.size
+        n_drawn += max_samples
+        if n_kept == max_samples:
+            return np.concatenate(kept)
+    if n_kept and n_kept / n_drawn * flat.size > max_samples:
+        return np.concatenate(kept)
+    kept = []
+    for r0 in range(0, flat.size, max_samples):
+        block = flat[r0:r0 + max_samples]
+        kept.append(block[np.isfinite(block)])
+    return np.concatenate(kept)
+
+
+def stretch_limits(a, pct=STRETCH_PCT, max_samples=MAX_SAMPLES):
+    """(vmin, vmax) for the stretch, or None if the band has no usable range."""
+    v = sample_finite(a, max_samples)
+    if v.size == 0:
+        return None
+    vmin, vmax = np.percentile(v, pct)
+    if not np.isfinite(vmin) or not np.isfinite(vmax) or vmax <= vmin:
+        return None
+    return float(vmin), float(vmax)
+
+
+def robust_norm_rgb(stack, limits=None, out=None):
+    """
+    Normalize a (3, H, W) float32 stack to [0, 1] with one fused pass per operation.
+    limits: list of (vmin, vmax) or None per band (computed with stretch_limits if omitted).
+    Writes into out (default: stack itself, in place); bands without a range become 0.
+    """
+    if out is None:
+        out = stack
+    elif out is not stack:
+        np.copyto(out, stack)
+    if limits is None:
+        limits = [stretch_limits(stack[b]) for b in range(stack.shape[0])]
+    vmin = np.zeros((stack.shape[0], 1, 1), dtype=out.dtype)
+    span = np.ones((stack.shape[0], 1, 1), dtype=out.dtype)
+    for b, lim in enumerate(limits):
+        if lim is None:
+            out[b] = 0.0
+        else:
+            vmin[b], span[b] = lim[0], lim[1] - lim[0]
+    out -= vmin
+    out /= span
+    np.clip(out, 0.0, 1.0, out=out)
+    return out
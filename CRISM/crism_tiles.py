@@ -0,0 +1,154 @@
+# crism_tiles.py
+# Quadtree-tiled mosaic store for CRISM index bands (regional / multi-crater coverage).
+# - Global grid in the Mars EQC used by CRISM_RGB.py (lon_0=0), origin at (0, 0) m,
+#   level 0 = finest resolution (TARGET_RES_M), level z = resolution · 2^z.
+# - Tiles are (bands, TILE, TILE) float32 .npy files under <root>/<z>/<ty>/<tx>.npy,
+#   NaN = no data. A scene only rewrites the level-0 tiles it touches (merge = max,
+#   like rasterio.merge(method='max')), and build_overviews() rebuilds only the
+#   coarser tiles above them, each from its 4 children (2×2 NaN-aware mean).
+# - read_bbox() memory-maps only the tiles intersecting the requested box.
+# The store is cumulative: nothing is ever cleared, so values written by earlier runs stay in
+# the tiles (and in read_bbox) until the root directory is deleted.
+# Scenes must be on the store pixel grid: reproject with aligned_grid() (GDAL "-tap").
+
+import json
+import math
+import os
+import numpy as np
+
+TILE = 256
+LEVELS = 6
+BANDS = ("D2300", "BD2210", "BD1900")
+
+
+class TileStore:
+    def __init__(self, root, res, tile=TILE, levels=LEVELS, bands=BANDS, crs=None):
+        self.root = root
+        meta_path = os.path.join(root, "store.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as fh:
+                meta = json.load(fh)
+            if (meta["res"], meta["tile"], tuple(meta["bands"])) != (float(res), int(tile), tuple(bands)):
+                raise ValueError(f"{meta_path}: existing store has res={meta['res']}, tile={meta['tile']}, "
+                                 f"bands={meta['bands']} (requested res={res}, tile={tile}, bands={list(bands)})")
+            levels = meta["levels"]
+        else:
+            os.makedirs(root, exist_ok=True)
+            with open(meta_path, "w") as fh:
+                json.dump({"res": float(res), "tile": int(tile), "levels": int(levels),
+                           "bands": list(bands), "crs": crs}, fh, indent=2)
+        self.res, self.tile, self.levels, self.bands = float(res), int(tile), int(levels), tuple(bands)
+        self.dirty = set()   # level-0 tiles written since the last build_overviews()
+
+    # ---- geometry ----
+    def level_res(self, z):
+        return self.res * (2 ** z)
+
+    def aligned_grid(self, left, bottom, right, top, z=0):
+        """(transform, width, height) covering the bounds, snapped outward to the level-z pixel grid."""
+        r = self.level_res(z)
+        c0, c1 = math.floor(left / r), math.ceil(right / r)
+        r0, r1 = math.floor(-top / r), math.ceil(-bottom / r)
+        return (r, 0.0, c0 * r, 0.0, -r, -r0 * r), c1 - c0, r1 - r0
+
+    def _pixel_origin(self, transform, z=0):
+        a, b, c, d, e, f = tuple(transform)[:6]
+        r = self.level_res(z)
+        col0, row0 = c / r, -f / r
+        if abs(a - r) > 1e-6 * r or abs(e + r) > 1e-6 * r or b or d or \
+           abs(col0 - round(col0)) > 1e-6 or abs(row0 - round(row0)) > 1e-6:
+            raise ValueError("array is not on the store pixel grid: reproject with TileStore.aligned_grid()")
+        return int(round(col0)), int(round(row0))
+
+    def _path(self, z, tx, ty):
+        return os.path.join(self.root, str(z), str(ty), f"{tx}.npy")
+
+    def _load(self, z, tx, ty, mmap=False):
+        p = self._path(z, tx, ty)
+        if not os.path.exists(p):
+            return None
+        return np.load(p, mmap_mode="r" if mmap else None)
+
+    def _save(self, z, tx, ty, arr):
+        p = self._path(z, tx, ty)
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        tmp = p + ".tmp.npy"
+        np.save(tmp, arr)
+        os.replace(tmp, p)
+
+    def _empty(self):
+        return np.full((len(self.bands), self.tile, self.tile), np.nan, dtype=np.float32)
+
+    # ---- write ----
+    def write_scene(self, data, transform):
+        """Merge a (bands, H, W) array on the level-0 grid into the tiles it touches (max, NaN-aware)."""
+        data = np.asarray(data, dtype=np.float32)
+        col0, row0 = self._pixel_origin(transform)
+        _, H, W = data.shape
+        T = self.tile
+        touched = 0
+        for ty in range(row0 // T, (row0 + H - 1) // T + 1):
+            for tx in range(col0 // T, (col0 + W - 1) // T + 1):
+                # overlap in global pixel coordinates
+                gr0, gr1 = max(row0, ty * T), min(row0 + H, (ty + 1) * T)
+                gc0, gc1 = max(col0, tx * T), min(col0 + W, (tx + 1) * T)
+                part = data[:, gr0 - row0:gr1 - row0, gc0 - col0:gc1 - col0]
+                if not np.isfinite(part).any():
+                    continue
+                tile = self._load(0, tx, ty)
+                tile = self._empty() if tile is None else np.array(tile)
+                dst = tile[:, gr0 - ty * T:gr1 - ty * T, gc0 - tx * T:gc1 - tx * T]
+                np.fmax(dst, part, out=dst)
+                self._save(0, tx, ty, tile)
+                self.dirty.add((tx, ty))
+                touched += 1
+        return touched
+
+    def build_overviews(self):
+        """Rebuild levels 1..LEVELS-1 above the dirty level-0 tiles only."""
+        dirty = set(self.dirty)
+        T = self.tile
+        for z in range(1, self.levels):
+            parents = {(tx // 2, ty // 2) for tx, ty in dirty}
+            for px, py in parents:
+                block = np.full((len(self.bands), 2 * T, 2 * T), np.nan, dtype=np.float32)
+                for dy in (0, 1):
+                    for dx in (0, 1):
+                        child = self._load(z - 1, 2 * px + dx, 2 * py + dy, mmap=True)
+                        if child is not None:
+                            block[:, dy * T:(dy + 1) * T, dx * T:(dx + 1) * T] = child
+                b4 = block.reshape(len(self.bands), T, 2, T, 2)
+                ok = np.isfinite(b4)
+                n = ok.sum(axis=(2, 4))
+                s = np.where(ok, b4, 0.0).sum(axis=(2, 4))
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    parent = np.where(n > 0, s / n, np.nan).astype(np.float32)
+                self._save(z, px, py, parent)
+            dirty = parents
+        self.dirty.clear()
+
+    # ---- read ----
+    def read_bbox(self, left, bottom, right, top, z=0):
+        """
+        Mosaic of the requested box at level z, reading only the intersecting tiles.
+        Returns (array (bands, h, w) float32 with NaN = no data, transform tuple).
+        """
+        transform, W, H = self.aligned_grid(left, bottom, right, top, z)
+        col0, row0 = self._pixel_origin(transform, z)
+        out = np.full((len(self.bands), H, W), np.nan, dtype=np.float32)
+        T = self.tile
+        for ty in range(row0 // T, (row0 + H - 1) // T + 1):
+            for tx in range(col0 // T, (col0 + W - 1) // T + 1):
+                tile = self._load(z, tx, ty, mmap=True)
+                if tile is None:
+                    continue
+                gr0, gr1 = max(row0, ty * T), min(row0 + H, (ty + 1) * T)
+                gc0, gc1 = max(col0, tx * T), min(col0 + W, (tx + 1) * T)
+                out[:, gr0 - row0:gr1 - row0, gc0 - col0:gc1 - col0] = \
+                    tile[:, gr0 - ty * T:gr1 - ty * T, gc0 - tx * T:gc1 - tx * T]
+        return out, transform
+
+    def level_for_resolution(self, res_m):
+        """Coarsest level whose pixel is not larger than res_m (for previews / overview plots)."""
+        z = int(math.floor(math.log2(max(res_m, self.res) / self.res)))
+        return min(max(z, 0), self.levels - 1)
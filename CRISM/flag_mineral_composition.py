@@ -1,32 +1,11 @@
 import os
 import pandas as pd
 
+from crism_scoring import load_flag_table
+
 # Ensure df is loaded and CRISM_OK_quantile is calculated
-# This block is a safeguard; it reloads and recalculates if 'df' is not in locals or missing columns
-if 'df' not in locals() or df.empty or 'CRISM_OK_quantile' not in df.columns:
-    output_csv_path_updated = os.path.join(OUT_DIR, "mesh_mineral_averages_percentages.csv")
-    try:
-        df = pd.read_csv(output_csv_path_updated)
-        df["crism_has_data"] = (df[["Avg_D2300","Avg_BD2210","Avg_BD1900"]].sum(axis=1) > 0)
-        w_H2O, w_FeMg, w_AlOH = 0.60, 0.30, 0.10
-        df["CRISM_score"] = (w_H2O*df["% H2O"] + w_FeMg*df["% Fe/Mg"] + w_AlOH*df["% Al-OH"])
-        
-        # Recalculate CRISM_OK_quantile
-        Q = df.loc[df["crism_has_data"], ["% H2O","% Fe/Mg","% Al-OH"]].quantile([0.6, 0.8]).rename(
-            index={0.6:"p60", 0.8:"p80"}
-        )
-        df["CRISM_OK_quantile"] = (
-            df["crism_has_data"] &
-            (
-                (df["% H2O"] >= Q.loc["p80","% H2O"]) |                                   # top 20% H2O
-                ((df["% H2O"] >= Q.loc["p60","% H2O"]) & (df["% Fe/Mg"] >= Q.loc["p60","% Fe/Mg"]))
-            ) &
-            (df["CRISM_score"] >= (0.55*Q.loc["p80","% H2O"] + 0.45*Q.loc["p60","% Fe/Mg"]))
-        )
-    except FileNotFoundError:
-        print(f"Error: The file {output_csv_path_updated} was not found.")
-        print("Please ensure the previous steps for saving the CSV were executed correctly.")
-        raise SystemExit("Missing CSV file.")
+# Reuses the scored flag table in memory (crism_scoring.py cache); reads the CSV only if df is missing
+df = load_flag_table(OUT_DIR, df=df if 'df' in locals() else None)
 
 # Create the DataFrame for the machine learning model
 # Select 'x' and 'y' (pixel positions) and convert 'CRISM_OK_quantile' to an integer flag
@@ -56,29 +35,7 @@ import pandas as pd
 import os
 
 # Ensure df is loaded and CRISM_OK_quantile is calculated
-if 'df' not in locals() or df.empty or 'CRISM_OK_quantile' not in df.columns:
-    output_csv_path_updated = os.path.join(OUT_DIR, "mesh_mineral_averages_percentages.csv")
-    try:
-        df = pd.read_csv(output_csv_path_updated)
-        df["crism_has_data"] = (df[["Avg_D2300","Avg_BD2210","Avg_BD1900"]].sum(axis=1) > 0)
-        w_H2O, w_FeMg, w_AlOH = 0.60, 0.30, 0.10
-        df["CRISM_score"] = (w_H2O*df["% H2O"] + w_FeMg*df["% Fe/Mg"] + w_AlOH*df["% Al-OH"])
-        
-        Q = df.loc[df["crism_has_data"], ["% H2O","% Fe/Mg","% Al-OH"]].quantile([0.6, 0.8]).rename(
-            index={0.6:"p60", 0.8:"p80"}
-        )
-        df["CRISM_OK_quantile"] = (
-            df["crism_has_data"] &
-            (
-                (df["% H2O"] >= Q.loc["p80","% H2O"]) |                                   
-                ((df["% H2O"] >= Q.loc["p60","% H2O"]) & (df["% Fe/Mg"] >= Q.loc["p60","% Fe/Mg"]))
-            ) &
-            (df["CRISM_score"] >= (0.55*Q.loc["p80","% H2O"] + 0.45*Q.loc["p60","% Fe/Mg"]))
-        )
-    except FileNotFoundError:
-        print(f"Error: The file {output_csv_path_updated} was not found.")
-        print("Please ensure the previous steps for saving the CSV were executed correctly.")
-        raise SystemExit("Missing CSV file.")
+df = load_flag_table(OUT_DIR, df=df if 'df' in locals() else None)
 
 # Filter for good landing spots based on CRISM_OK_quantile
 df_good_spots = df[df['CRISM_OK_quantile'] == True].copy()
@@ -3,74 +3,19 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-# Assuming OUT_DIR is defined from previous cells
-output_csv_path_updated = os.path.join(OUT_DIR, "mesh_mineral_averages_percentages.csv")
+from crism_scoring import DEFAULT_WEIGHTS, read_mesh_table, score_flags
 
-# Ensure the DataFrame is loaded
+# Assuming OUT_DIR is defined from previous cells
+# Ensure the DataFrame is loaded (the CSV is read once and kept in memory)
 if 'df' not in locals() or df.empty:
-    try:
-        df = pd.read_csv(output_csv_path_updated)
-    except FileNotFoundError:
-        print(f"Error: The file {output_csv_path_updated} was not found.")
-        print("Please ensure the previous steps for saving the CSV were executed correctly.")
-        # Exit or handle the error appropriately
-        raise SystemExit("Missing CSV file.")
-
-# 1) Gating: if the row has all zero -> avoid it
-df["crism_has_data"] = (df[["Avg_D2300","Avg_BD2210","Avg_BD1900"]].sum(axis=1) > 0)
-
-# 2) Weights: “water-first”
-w_H2O, w_FeMg, w_AlOH = 0.60, 0.30, 0.10
-
-# 3) Weighted score (0–100)
-df["CRISM_score"] = (w_H2O*df["% H2O"] +
-                     w_FeMg*df["% Fe/Mg"] +
-                     w_AlOH*df["% Al-OH"])
-
-# 4B) Adaptive thresholds (recommended): use the quantiles of your dataset
-Q = df.loc[df["crism_has_data"], ["% H2O","% Fe/Mg","% Al-OH"]].quantile([0.6, 0.8]).rename(
-    index={0.6:"p60", 0.8:"p80"}
-)
-df["CRISM_OK_quantile"] = (
-    df["crism_has_data"] &
-    (
-        (df["% H2O"] >= Q.loc["p80","% H2O"]) |                                   # top 20% H2O
-        ((df["% H2O"] >= Q.loc["p60","% H2O"]) & (df["% Fe/Mg"] >= Q.loc["p60","% Fe/Mg"]))
-    ) &
-    (df["CRISM_score"] >= (0.55*Q.loc["p80","% H2O"] + 0.45*Q.loc["p60","% Fe/Mg"]))
-)
-
-import matplotlib.pyplot as plt
-import seaborn as sns
-import os
+    df = read_mesh_table(OUT_DIR)
 
-# Ensure df is loaded and CRISM_score is calculated
-# If df is not in locals, load it first and re-calculate necessary columns
-if 'df' not in locals() or df.empty or 'CRISM_score' not in df.columns:
-    output_csv_path_updated = os.path.join(OUT_DIR, "mesh_mineral_averages_percentages.csv")
-    try:
-        df = pd.read_csv(output_csv_path_updated)
-        df["crism_has_data"] = (df[["Avg_D2300","Avg_BD2210","Avg_BD1900"]].sum(axis=1) > 0)
-        w_H2O, w_FeMg, w_AlOH = 0.60, 0.30, 0.10
-        df["CRISM_score"] = (w_H2O*df["% H2O"] + w_FeMg*df["% Fe/Mg"] + w_AlOH*df["% Al-OH"])
-        
-        # Re-calculate CRISM_OK_quantile in case the DataFrame was reloaded
-        Q = df.loc[df["crism_has_data"], ["% H2O","% Fe/Mg","% Al-OH"]].quantile([0.6, 0.8]).rename(
-            index={0.6:"p60", 0.8:"p80"}
-        )
-        df["CRISM_OK_quantile"] = (
-            df["crism_has_data"] &
-            (
-                (df["% H2O"] >= Q.loc["p80","% H2O"]) |                                   # top 20% H2O
-                ((df["% H2O"] >= Q.loc["p60","% H2O"]) & (df["% Fe/Mg"] >= Q.loc["p60","% Fe/Mg"]))
-            ) &
-            (df["CRISM_score"] >= (0.55*Q.loc["p80","% H2O"] + 0.45*Q.loc["p60","% Fe/Mg"]))
-        )
+# Weights: “water-first”
+w_H2O, w_FeMg, w_AlOH = DEFAULT_WEIGHTS
 
-    except FileNotFoundError:
-        print(f"Error: The file {output_csv_path_updated} was not found.")
-        print("Please ensure the previous steps for saving the CSV were executed correctly.")
-        raise SystemExit("Missing CSV file.")
+# Gating (crism_has_data), weighted score (CRISM_score, 0–100) and adaptive p60/p80
+# thresholds (Q -> CRISM_OK_quantile), computed once and cached with the input fingerprint
+df, Q = score_flags(df, (w_H2O, w_FeMg, w_AlOH))
 
 # Filter out rows where there is no CRISM data (all original averages were 0)
 df_crism_data = df[df['crism_has_data']].copy()
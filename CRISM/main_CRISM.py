@@ -30,8 +30,9 @@ from pathlib import Path
 #   3. CRISM_mesh.py
 #   4. CRISM_data.py
 #   5. CRISM_data_percentage
-#   6. good_bad_spots.py
-#   7. flag_mineral_composition.py
+#   6. CRISM_classification.py
+#   7. good_bad_spots.py
+#   8. flag_mineral_composition.py
 # =====================================================================
 
 SCRIPTS_ORDER = [
@@ -40,6 +41,7 @@ SCRIPTS_ORDER = [
     CRISM_mesh.py,
     CRISM_data.py,
     CRISM_data_percentage,
+    CRISM_classification.py,
     good_bad_spots.py,
     flag_mineral_composition.py
 ]
@@ -11,6 +11,9 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
 
+from feature_store import open_store, crism_coverage
+from predict import save_model
+
 import matplotlib.pyplot as plt
 
 
@@ -18,28 +21,22 @@ import matplotlib.pyplot as plt
 # 1. Load data
 # ================================
 # --- 1. Load and Filter Data ---
-data = pd.read_csv("/content/jezero_final_ML.csv")
-
-# Define the columns for filtering
-cols_to_check = ['% Fe/Mg', '% Al-OH', '% H2O']
-
-# Create a Boolean mask to identify rows where ALL three columns are 0.00
-rows_to_drop_mask = (
-    (data[cols_to_check[0]] == 0.00) &
-    (data[cols_to_check[1]] == 0.00) &
-    (data[cols_to_check[2]] == 0.00)
-)
+# Typed, memory-mapped feature store (feature_store.py); built from the CSV on the first run.
+DATA_CSV = "/content/jezero_final_ML.csv"
+DATA_STORE = "/content/jezero_final_ML.store"
+store = open_store(DATA_STORE, csv_path=DATA_CSV)
 
-# Filter the data: keep only the rows that are NOT in the mask
-data_filtered = data[~rows_to_drop_mask].copy()
+# Keep only the rows where the CRISM percentages ('% Fe/Mg', '% Al-OH', '% H2O') are NOT all 0.00;
+# the mask is computed on those three columns only
+data_filtered = store.read(where=crism_coverage)
 
-print(f"Original rows: {len(data)}, Filtered rows: {len(data_filtered)}")
+print(f"Original rows: {store.n_rows}, Filtered rows: {len(data_filtered)}")
 
 # --- 2. Define Features (X) and Target (y) ---
 # Drop the target and the coordinate columns 'x' and 'y' from the feature matrix X
 columns_to_drop = ["good_landing_place", "x", "y"]
 X = data_filtered.drop(columns_to_drop, axis=1)
-y = data_filtered["good_landing_place"]
+y = data_filtered["good_landing_place"].astype(int)   # 0 / 1 labels in the report (older stores hold bool)
 # ================================
 # 2. Train/test split
 # ================================
@@ -66,6 +63,9 @@ X_test_scaled = scaler.transform(X_test)
 model = LogisticRegression(class_weight="balanced", max_iter=200)
 model.fit(X_train_scaled, y_train)
 
+# Scaler + model + feature schema for predict.py (probability / per-slot suitability rasters)
+save_model("/content/landing_model.joblib", scaler, model, list(X.columns), X_train)
+
 y_pred = model.predict(X_test_scaled)
 y_proba = model.predict_proba(X_test_scaled)[:, 1]
 
@@ -178,11 +178,8 @@ print(" - correlation_heatmap.png")
 # 1!. Print some numbers
 # ================================
 
-import pandas as pd
-
-# Load the CSV file. 
-file_path = "/content/jezero_final_ML.csv"
-data = pd.read_csv(file_path)
+file_path = DATA_STORE
+data = store.read(["good_landing_place"])
 
 print(f"Number of samples available for training: {len(X_train)}")
 print(f"Number of samples available for testing: {len(X_test)}")
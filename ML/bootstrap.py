@@ -0,0 +1,164 @@
+# bootstrap.py
+# Bootstrap (bagging) ensemble for per-cell uncertainty of the landing probability.
+# - K models (model_zoo.py) are trained on bootstrap resamples of the training rows
+#   (resampled within each class, so every replica sees both classes), over a process pool.
+# - Shared read-only features: workers open the memory-mapped feature store themselves (cached
+#   per process, like the DEM sources of mola_tiled.py) and only gather their bootstrap rows;
+#   the page cache holds the columns once for all workers.
+# - Every replica writes its probabilities for all cells into row k of one (K, n_cells)
+#   float32 .npy opened with open_memmap, so nothing large goes through the pool. Cells outside
+#   the training filter (no CRISM coverage by default) are NaN, as in predict.py.
+# - ensemble_stats: mean, std and percentile intervals over the K predictions in one vectorized
+#   pass over column chunks of STATS_BLOCK_BYTES (columns per chunk = budget / (K × 8 bytes)).
+# Outputs: landing_uncertainty.csv (x, y, proba_mean, proba_std, proba_p05, proba_p95)
+#          landing_proba_<stat>.tif on the shared grid.
+#
+#   python bootstrap.py --store /content/jezero_final_ML.store --k 200 --model logistic --out-dir /content
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from numpy.lib.format import open_memmap
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))   # jezero_grid.py
+from jezero_grid import JEZERO_GRID
+from feature_store import LABEL, FeatureStore, crism_coverage
+from ml_streaming import feature_columns
+from model_zoo import make_model
+from predict import CHUNK_ROWS, write_grid_tif
+
+K = 200
+PERCENTILES = (5.0, 95.0)
+SEED = 42
+PROBA_NPY = "bootstrap_proba.npy"
+ROWS_NPY = "bootstrap_train_rows.npy"
+KEEP_NPY = "bootstrap_keep.npy"
+OUT_CSV = "landing_uncertainty.csv"
+OUT_TIF = "landing_proba_{stat}.tif"
+STATS_BLOCK_BYTES = 64 * 2 ** 20   # float64 (K, cols) block of ensemble_stats (np.percentile copies it once)
+
+_STORES = {}
+
+
+def _store(path):
+    if path not in _STORES:
+        _STORES[path] = FeatureStore(path)
+    return _STORES[path]
+
+
+def _matrix(store, features, rows=None):
+    if rows is None:
+        return np.column_stack([np.asarray(store[f], dtype=np.float64) for f in features])
+    return np.column_stack([store[f][rows].astype(np.float64) for f in features])
+
+
+def bootstrap_rows(train_rows, labels, rng):
+    """Resample train_rows with replacement within each class (same class counts)."""
+    parts = []
+    for cls in np.unique(labels):
+        members = np.asarray(train_rows)[labels == cls]
+        parts.append(rng.choice(members, size=len(members), replace=True))
+    return np.sort(np.concatenate(parts))
+
+
+def _fit_replica(store_path, features, label, rows_path, model_name, k, seed, proba_path, chunk_rows):
+    """Fit replica k and write its probabilities for every row of the store into row k of proba_path."""
+    store = _store(store_path)
+    train_rows = np.load(rows_path, mmap_mode="r")
+    keep = np.load(os.path.join(os.path.dirname(rows_path), KEEP_NPY), mmap_mode="r")
+    rng = np.random.default_rng(seed + k)
+    y_train = np.asarray(store[label][train_rows]).astype(np.int64)
+    rows = bootstrap_rows(train_rows, y_train, rng)
+    model = make_model(model_name, seed=seed + k)
+    if "n_jobs" in model.get_params():
+        model.set_params(n_jobs=1)                     # the pool already uses every core
+    model.fit(_matrix(store, features, rows), np.asarray(store[label][rows]).astype(np.int64))
+    out = open_memmap(proba_path, mode="r+")
+    for r0 in range(0, store.n_rows, chunk_rows):
+        r1 = min(r0 + chunk_rows, store.n_rows)
+        X = _matrix(store, features, slice(r0, r1))
+        ok = np.isfinite(X).all(axis=1) & keep[r0:r1]
+        p = np.full(r1 - r0, np.nan, dtype=np.float32)
+        if ok.any():
+            p[ok] = model.predict_proba(X[ok])[:, 1]
+        out[k, r0:r1] = p
+    out.flush()
+    return k
+
+
+def bootstrap_ensemble(store_path, out_dir, k=K, model_name="logistic", features=None, where=crism_coverage,
+                       workers=None, seed=SEED, chunk_rows=CHUNK_ROWS, label=LABEL):
+    """Train K replicas in parallel; returns the (K, n_rows) float32 memmap of their probabilities."""
+    store = _store(store_path)
+    features = feature_columns(store, label) if features is None else list(features)
+    train_rows = store.rows(where) if where is not None else np.arange(store.n_rows)
+    os.makedirs(out_dir, exist_ok=True)
+    proba_path = os.path.join(out_dir, PROBA_NPY)
+    rows_path = os.path.join(out_dir, ROWS_NPY)          # read by the workers, not pickled per task
+    np.save(rows_path, train_rows)
+    keep = np.zeros(store.n_rows, dtype=bool)
+    keep[train_rows] = True
+    np.save(os.path.join(out_dir, KEEP_NPY), keep)
+    open_memmap(proba_path, mode="w+", dtype=np.float32, shape=(k, store.n_rows)).flush()
+    args = (store_path, features, label, rows_path, model_name)
+    if workers == 1:
+        for i in range(k):
+            _fit_replica(*args, i, seed, proba_path, chunk_rows)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(_fit_replica, *zip(*[(*args, i, seed, proba_path, chunk_rows) for i in range(k)])))
+    return open_memmap(proba_path, mode="r")
+
+
+def ensemble_stats(P, percentiles=PERCENTILES, block_bytes=STATS_BLOCK_BYTES):
+    """
+    {proba_mean, proba_std, proba_p<q>...} per cell from the (K, n) predictions. A cell that is
+    NaN in every replica (outside the training filter) stays NaN; no per-replica NaN handling.
+    """
+    n = P.shape[1]
+    chunk_cols = max(1, block_bytes // (8 * P.shape[0]))
+    names = ["proba_mean", "proba_std"] + [f"proba_p{q:02.0f}" for q in percentiles]
+    out = {name: np.empty(n, dtype=np.float32) for name in names}
+    for c0 in range(0, n, chunk_cols):
+        block = np.asarray(P[:, c0:c0 + chunk_cols], dtype=np.float64)
+        c1 = c0 + block.shape[1]
+        with np.errstate(invalid="ignore"):
+            out["proba_mean"][c0:c1] = block.mean(axis=0)
+            out["proba_std"][c0:c1] = block.std(axis=0)
+            for q, v in zip(percentiles, np.percentile(block, percentiles, axis=0)):
+                out[f"proba_p{q:02.0f}"][c0:c1] = v
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Bootstrap ensemble: per-cell mean / std / intervals of P(good landing).")
+    ap.add_argument("--store", default="/content/jezero_final_ML.store")
+    ap.add_argument("--k", type=int, default=K)
+    ap.add_argument("--model", default="logistic")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--out-dir", default=".")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    P = bootstrap_ensemble(args.store, args.out_dir, args.k, args.model, workers=args.workers)
+    print(f"{args.k} replicas of '{args.model}' in {time.perf_counter() - t0:.1f} s")
+    stats = ensemble_stats(P)
+
+    store = _store(args.store)
+    x = np.asarray(store["x"], dtype=np.int64)
+    y = np.asarray(store["y"], dtype=np.int64)
+    pd.DataFrame({"x": x, "y": y, **stats}).to_csv(os.path.join(args.out_dir, OUT_CSV), index=False)
+    grid = JEZERO_GRID.with_shape((int(y.max()) + 1, int(x.max()) + 1))
+    for name, values in stats.items():
+        layer = np.full(grid.shape, np.nan, dtype=np.float32)
+        layer[y, x] = values
+        print("Saved:", write_grid_tif(os.path.join(args.out_dir, OUT_TIF.format(stat=name[6:])), layer, grid))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# context_features.py
+# Spatial-context features: statistics of the neighbourhood of every grid cell, so a cell next
+# to a steep scarp or a cold trap no longer looks like one in a flat plain.
+# For every feature and window k (3×3, 5×5, 9×9 cells):
+#   <feature>__mean<k>, <feature>__std<k>, <feature>__max<k>   (NaN-aware, windows clipped at the grid edge)
+#   <feature>__grad<k>   gradient magnitude of the k-window mean (feature units per cell)
+# All windows are separable: box sums are two 1-D running sums (cumsum differences, one per
+# axis) of value, value² and valid count; the max is two 1-D running maxima. Cost is
+# O(cells) per feature and window, independent of k.
+# Rows are placed on the dense (y, x) grid from the x / y columns and gathered back, and the
+# new columns are appended to the feature store. CRISM percentages are 0.0 where a cell has
+# no CRISM coverage (crism_coverage); those cells are NaN for the CRISM windows, so the
+# statistics near the coverage edge only use measured cells.
+#
+#   python context_features.py --store /content/jezero_final_ML.store
+
+import argparse
+import time
+
+import numpy as np
+from scipy.ndimage import maximum_filter1d
+
+from feature_store import COORDS, CRISM_COLUMNS, LABEL, FeatureStore, crism_coverage
+
+WINDOWS = (3, 5, 9)
+STATS = ("mean", "std", "max", "grad")
+SEP = "__"               # <feature>__<stat><k>: derived columns are never used as inputs again
+
+
+def box_sum(a, k):
+    """Sum over the k×k window centred on every cell (window clipped at the edges), separable."""
+    r = k // 2
+    out = a
+    for axis in (0, 1):
+        n = out.shape[axis]
+        c = np.cumsum(out, axis=axis, dtype=np.float64)
+        c = np.concatenate([np.zeros_like(np.take(c, [0], axis=axis)), c], axis=axis)
+        hi = np.minimum(np.arange(n) + r + 1, n)
+        lo = np.maximum(np.arange(n) - r, 0)
+        out = np.take(c, hi, axis=axis) - np.take(c, lo, axis=axis)
+    return out
+
+
+def box_max(a, k):
+    """Max over the k×k window (NaN ignored; NaN where the whole window is NaN), separable."""
+    m = np.where(np.isnan(a), -np.inf, a)
+    m = maximum_filter1d(maximum_filter1d(m, k, axis=0, mode="constant", cval=-np.inf),
+                         k, axis=1, mode="constant", cval=-np.inf)
+    return np.where(np.isneginf(m), np.nan, m)
+
+
+def window_stats(a, k, stats=STATS):
+    """{stat: (ny, nx) float32} for one (ny, nx) layer and window k."""
+    a = np.asarray(a, dtype=np.float64)
+    valid = np.isfinite(a)
+    v = np.where(valid, a, 0.0)
+    n = box_sum(valid.astype(np.float64), k)
+    s1 = box_sum(v, k)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(n > 0, s1 / n, np.nan)
+        out = {}
+        if "mean" in stats:
+            out["mean"] = mean
+        if "std" in stats:
+            s2 = box_sum(v * v, k)
+            out["std"] = np.sqrt(np.maximum(s2 / n - mean * mean, 0.0))
+    if "max" in stats:
+        out["max"] = box_max(a, k)
+    if "grad" in stats:
+        gy, gx = np.gradient(mean) if min(mean.shape) > 1 else (np.zeros_like(mean),) * 2
+        out["grad"] = np.hypot(gx, gy)
+    return {s: out[s].astype(np.float32) for s in stats}
+
+
+def context_layers(layers, windows=WINDOWS, stats=STATS):
+    """{<feature>__<stat><k>: (ny, nx) float32} for every layer {feature: (ny, nx) array}."""
+    out = {}
+    for name, arr in layers.items():
+        for k in windows:
+            for stat, v in window_stats(arr, k, stats).items():
+                out[f"{name}{SEP}{stat}{k}"] = v
+    return out
+
+
+def base_features(store, label=LABEL):
+    """Input features of the store: not coordinates, not the target, not derived context columns."""
+    return [c for c in store.columns if c not in COORDS and c != label and SEP not in c]
+
+
+def add_context_features(store, features=None, windows=WINDOWS, stats=STATS):
+    """Compute the context features of `features` (default: base_features) and append them to the store."""
+    features = base_features(store) if features is None else list(features)
+    x = np.asarray(store["x"], dtype=np.int64)
+    y = np.asarray(store["y"], dtype=np.int64)
+    shape = (int(y.max()) + 1, int(x.max()) + 1)
+    no_crism = ~crism_coverage(store) if all(c in store for c in CRISM_COLUMNS) else None
+    new = {}
+    for f in features:
+        grid = np.full(shape, np.nan)
+        grid[y, x] = store[f]
+        if f in CRISM_COLUMNS and no_crism is not None:
+            grid[y[no_crism], x[no_crism]] = np.nan              # 0.0 = no coverage, not a measurement
+        for name, layer in context_layers({f: grid}, windows, stats).items():
+            new[name] = layer[y, x]
+    store.add_columns(new)
+    return list(new)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Append neighbourhood statistics to the feature store.")
+    ap.add_argument("--store", default="/content/jezero_final_ML.store")
+    ap.add_argument("--windows", type=int, nargs="*", default=list(WINDOWS))
+    args = ap.parse_args()
+
+    store = FeatureStore(args.store)
+    t0 = time.perf_counter()
+    added = add_context_features(store, windows=args.windows)
+    print(f"Added {len(added)} context columns in {time.perf_counter() - t0:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# explain.py
+# Model explanations that hold for correlated features and non-linear models (the bar chart of
+# model.coef_ in ML.py does neither):
+# - permutation importance: drop of ROC-AUC when one feature is shuffled. All repeats of a
+#   feature are stacked into ONE predict_proba call (R copies of the test fold, each with its
+#   own permutation of the column)
+# - partial dependence: mean P(good landing) with one feature forced to each of GRID_POINTS
+#   quantile values; the grid values stacked into predict_proba calls
+# Every stacked matrix is capped at MAX_BATCH_BYTES (per worker): the number of copies per
+# batch is the byte budget / (rows × features × 8 bytes), so wide stores get smaller batches.
+# Both run on the spatial-block folds of model_selection.py (model fitted on the training
+# blocks, explained on the held-out blocks) and the (fold, feature) tasks are spread over
+# worker processes (joblib; each held-out fold matrix is built once and memory-mapped once, by
+# content hash, for all its feature tasks).
+# Outputs: permutation_importance.csv / .png, partial_dependence.csv / .png
+#
+#   python explain.py --store /content/jezero_final_ML.store --model logistic --repeats 20
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.metrics import roc_auc_score
+
+from feature_store import LABEL, open_store, crism_coverage
+from model_selection import BLOCK, N_FOLDS, SEED, spatial_folds
+from model_zoo import make_model
+
+N_REPEATS = 20
+GRID_POINTS = 20
+MAX_BATCH_BYTES = 256 * 2 ** 20  # float64 bytes of one stacked predict matrix (per worker)
+PDP_ROWS = 20_000               # rows per fold used for partial dependence (random subset)
+
+
+def _auc(y, p):
+    return roc_auc_score(y, p) if len(np.unique(y)) == 2 else np.nan
+
+
+def copies_per_batch(X, max_batch_bytes=MAX_BATCH_BYTES):
+    """How many stacked copies of X (float64) fit in max_batch_bytes (at least 1)."""
+    return max(1, max_batch_bytes // max(X.shape[0] * X.shape[1] * 8, 1))
+
+
+def permutation_drops(model, X, y, j, n_repeats=N_REPEATS, seed=SEED, max_batch_bytes=MAX_BATCH_BYTES):
+    """ROC-AUC drop for each of n_repeats permutations of column j, predicted in stacked batches."""
+    base = _auc(y, model.predict_proba(X)[:, 1])
+    rng = np.random.default_rng(seed + j)
+    n = len(X)
+    per_batch = copies_per_batch(X, max_batch_bytes)
+    drops = []
+    for r0 in range(0, n_repeats, per_batch):
+        r = min(per_batch, n_repeats - r0)
+        Xs = np.tile(X, (r, 1))
+        Xs[:, j] = np.concatenate([X[rng.permutation(n), j] for _ in range(r)])
+        proba = model.predict_proba(Xs)[:, 1].reshape(r, n)
+        drops.extend(base - _auc(y, p) for p in proba)
+    return np.array(drops)
+
+
+def partial_dependence(model, X, j, grid, max_batch_bytes=MAX_BATCH_BYTES):
+    """Mean P(label = 1) with column j set to each value of grid (stacked predict calls)."""
+    n = len(X)
+    per_batch = copies_per_batch(X, max_batch_bytes)
+    out = []
+    for g0 in range(0, len(grid), per_batch):
+        g = np.asarray(grid[g0:g0 + per_batch])
+        Xs = np.tile(X, (len(g), 1))
+        Xs[:, j] = np.repeat(g, n)
+        out.append(model.predict_proba(Xs)[:, 1].reshape(len(g), n).mean(axis=1))
+    return np.concatenate(out)
+
+
+def _explain_task(model, X, y, f, j, grid, n_repeats, seed, pdp_rows):
+    drops = permutation_drops(model, X, y, j, n_repeats, seed + 1000 * f)
+    sub = X if len(X) <= pdp_rows else X[np.random.default_rng(seed + f).choice(len(X), pdp_rows, replace=False)]
+    return f, j, drops, partial_dependence(model, sub, j, grid)
+
+
+def explain(X, y, folds, features, model_name="logistic", n_repeats=N_REPEATS, grid_points=GRID_POINTS,
+            n_jobs=-1, seed=SEED, pdp_rows=PDP_ROWS):
+    """
+    Returns (importance DataFrame: feature, fold, repeat, auc_drop;
+             partial dependence DataFrame: feature, value, fold, mean_proba).
+    """
+    X, y = np.asarray(X, dtype=np.float64), np.asarray(y)
+    grids = [np.unique(np.nanquantile(X[:, j], np.linspace(0.02, 0.98, grid_points))) for j in range(X.shape[1])]
+    models = []
+    for train, _ in folds:
+        m = make_model(model_name, seed)
+        models.append(m.fit(X[train], y[train]))
+    X_test = [X[test] for _, test in folds]         # one copy per fold, shared by all its tasks
+    y_test = [y[test] for _, test in folds]
+    tasks = [(models[f], X_test[f], y_test[f], f, j, grids[j], n_repeats, seed, pdp_rows)
+             for f in range(len(folds)) for j in range(X.shape[1])]
+    out = Parallel(n_jobs=n_jobs)(delayed(_explain_task)(*t) for t in tasks)
+    imp, pdp = [], []
+    for f, j, drops, pd_vals in out:
+        imp += [{"feature": features[j], "fold": f, "repeat": r, "auc_drop": d} for r, d in enumerate(drops)]
+        pdp += [{"feature": features[j], "value": v, "fold": f, "mean_proba": p} for v, p in zip(grids[j], pd_vals)]
+    return pd.DataFrame(imp), pd.DataFrame(pdp)
+
+
+def importance_table(imp):
+    """Mean / std of the ROC-AUC drop per feature over folds and repeats, most important first."""
+    t = imp.groupby("feature")["auc_drop"].agg(["mean", "std"])
+    return t.sort_values("mean", ascending=False)
+
+
+def save_plots(imp, pdp, out_prefix=""):
+    import matplotlib.pyplot as plt
+
+    t = importance_table(imp).iloc[::-1]
+    plt.figure(figsize=(10, 6))
+    plt.barh(t.index, t["mean"], xerr=t["std"])
+    plt.title("Permutation Importance (ROC-AUC drop, spatial folds)")
+    plt.xlabel("Mean ROC-AUC drop")
+    plt.ylabel("Feature")
+    plt.tight_layout()
+    plt.savefig(out_prefix + "permutation_importance.png", dpi=300, bbox_inches="tight")
+    plt.close()
+
+    features = list(dict.fromkeys(pdp["feature"]))
+    cols = 4
+    rows = -(-len(features) // cols)
+    fig, axes = plt.subplots(rows, cols, figsize=(4 * cols, 3 * rows), squeeze=False)
+    for ax, f in zip(axes.ravel(), features):
+        d = pdp[pdp["feature"] == f].groupby("value")["mean_proba"].mean()
+        ax.plot(d.index, d.values)
+        ax.set_title(f, fontsize=9)
+        ax.set_ylabel("P(good landing)")
+        ax.grid(True)
+    for ax in axes.ravel()[len(features):]:
+        ax.axis("off")
+    fig.suptitle("Partial Dependence (mean over spatial folds)")
+    fig.tight_layout()
+    fig.savefig(out_prefix + "partial_dependence.png", dpi=300, bbox_inches="tight")
+    plt.close(fig)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Permutation importance and partial dependence on spatial folds.")
+    ap.add_argument("--store", default="/content/jezero_final_ML.store")
+    ap.add_argument("--csv", default=None, help="fused CSV to convert if the store does not exist")
+    ap.add_argument("--model", default="logistic")
+    ap.add_argument("--repeats", type=int, default=N_REPEATS)
+    ap.add_argument("--block", type=int, default=BLOCK)
+    ap.add_argument("--folds", type=int, default=N_FOLDS)
+    ap.add_argument("--jobs", type=int, default=-1)
+    ap.add_argument("--no-plots", action="store_true")
+    args = ap.parse_args()
+
+    store = open_store(args.store, csv_path=args.csv)
+    data = store.read(where=crism_coverage)
+    features = [c for c in data.columns if c not in ("x", "y", LABEL)]
+    X = data[features].to_numpy(dtype=np.float64)
+    y = data[LABEL].to_numpy().astype(np.int64)
+    folds = spatial_folds(data["x"].to_numpy(), data["y"].to_numpy(), y, args.folds, args.block)
+
+    t0 = time.perf_counter()
+    imp, pdp = explain(X, y, folds, features, args.model, args.repeats, n_jobs=args.jobs)
+    print(f"Explained {len(features)} features × {len(folds)} folds × {args.repeats} repeats "
+          f"in {time.perf_counter() - t0:.1f} s")
+    print(importance_table(imp).to_string(float_format=lambda v: f"{v:.4f}"))
+    imp.to_csv("permutation_importance.csv", index=False)
+    pdp.to_csv("partial_dependence.csv", index=False)
+    if not args.no_plots:
+        save_plots(imp, pdp)
+
+
+if __name__ == "__main__":
+    main()
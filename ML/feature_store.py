@@ -0,0 +1,197 @@
+# feature_store.py
+# Typed, columnar, memory-mapped store for the fused ML table (jezero_final_ML).
+# Layout of a store directory:
+#   meta.json      -> n_rows, column order, dtype / file / stats of every column, and the
+#                     path / size / mtime of the CSV it was converted from
+#   c000.npy ...   -> one .npy per column (x, y uint16; features float32; target int8 0/1)
+# Columns are opened with np.load(mmap_mode="r"): opening is instant whatever the size,
+# and only the columns actually touched are paged in. Row filters are evaluated on the
+# columns they need, then only the projected columns are gathered for the kept rows.
+#
+#   store = FeatureStore("/content/jezero_final_ML.store")
+#   df = store.read(["avg_slope", "% H2O"], where=crism_coverage(store))
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+LABEL = "good_landing_place"
+COORDS = ("x", "y")
+CRISM_COLUMNS = ("% Fe/Mg", "% Al-OH", "% H2O")
+META = "meta.json"
+
+
+def column_dtype(name, label=LABEL):
+    if name in COORDS:
+        return np.uint16
+    if name == label:
+        return np.int8
+    return np.float32
+
+
+def column_stats(arr):
+    """min / max / mean / std / NaN count of a column (float64 accumulators, NaN ignored)."""
+    a = np.asarray(arr, dtype=np.float64)
+    n_nan = int(np.isnan(a).sum())
+    if n_nan == a.size:
+        return {"min": None, "max": None, "mean": None, "std": None, "n_nan": n_nan}
+    return {"min": float(np.nanmin(a)), "max": float(np.nanmax(a)), "mean": float(np.nanmean(a)),
+            "std": float(np.nanstd(a)), "n_nan": n_nan}
+
+
+def source_info(csv_path):
+    """Identity of a source CSV (absolute path, size, mtime) as recorded in meta.json."""
+    st = os.stat(csv_path)
+    return {"path": os.path.abspath(csv_path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def write_store(columns, path, label=LABEL, source=None):
+    """Write {name: 1-D array} (all the same length) as a store directory. Returns the path."""
+    os.makedirs(path, exist_ok=True)
+    lengths = {len(v) for v in columns.values()}
+    if len(lengths) != 1:
+        raise ValueError(f"Columns have different lengths: {sorted(lengths)}")
+    meta = {"n_rows": lengths.pop(), "columns": [], "source": source}
+    for i, (name, values) in enumerate(columns.items()):
+        dtype = column_dtype(name, label)
+        arr = np.asarray(values)
+        if dtype is np.uint16 and (arr.min() < 0 or arr.max() > np.iinfo(np.uint16).max):
+            raise ValueError(f"Column '{name}' does not fit in uint16")
+        fname = f"c{i:03d}.npy"
+        np.save(os.path.join(path, fname), np.ascontiguousarray(arr, dtype=dtype))
+        meta["columns"].append({"name": name, "dtype": np.dtype(dtype).name, "file": fname,
+                                "stats": column_stats(arr)})
+    with open(os.path.join(path, META), "w") as f:
+        json.dump(meta, f, indent=1)
+    return path
+
+
+def csv_to_store(csv_path, path, label=LABEL, chunksize=1_000_000):
+    """Convert a fused CSV once (read in chunks, typed on the way)."""
+    parts = {}
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        for c in chunk.columns:
+            parts.setdefault(c, []).append(chunk[c].to_numpy().astype(column_dtype(c, label)))
+    return write_store({c: np.concatenate(v) for c, v in parts.items()}, path, label, source_info(csv_path))
+
+
+class FeatureStore:
+    """Read side of a store directory: memory-mapped columns, projection and row filters."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META)) as f:
+            self.meta = json.load(f)
+        self._cols = {c["name"]: c for c in self.meta["columns"]}
+        self._mmaps = {}
+
+    @property
+    def columns(self):
+        return [c["name"] for c in self.meta["columns"]]
+
+    @property
+    def n_rows(self):
+        return self.meta["n_rows"]
+
+    def __len__(self):
+        return self.n_rows
+
+    def __contains__(self, name):
+        return name in self._cols
+
+    def stats(self, name):
+        return self._cols[name]["stats"]
+
+    def column(self, name):
+        """Memory-mapped, read-only 1-D array of a column."""
+        if name not in self._mmaps:
+            if name not in self._cols:
+                raise KeyError(f"Column '{name}' not in store (available: {self.columns})")
+            self._mmaps[name] = np.load(os.path.join(self.path, self._cols[name]["file"]), mmap_mode="r")
+        return self._mmaps[name]
+
+    def __getitem__(self, name):
+        return self.column(name)
+
+    def rows(self, where=None):
+        """Indices of the rows kept by `where` (bool mask, callable(store) -> mask, or None = all)."""
+        if where is None:
+            return None
+        mask = where(self) if callable(where) else where
+        return np.flatnonzero(np.asarray(mask))
+
+    def read(self, columns=None, where=None):
+        """DataFrame of the projected columns (default: all) for the rows kept by `where`."""
+        idx = self.rows(where)
+        cols = self.columns if columns is None else list(columns)
+        data = {c: (np.array(self.column(c)) if idx is None else self.column(c)[idx]) for c in cols}
+        return pd.DataFrame(data, copy=False)
+
+    def add_columns(self, columns, label=LABEL):
+        """Append (or overwrite) columns {name: 1-D array of n_rows} in place; meta.json is rewritten."""
+        used = {c["file"] for c in self.meta["columns"]}
+        for name, values in columns.items():
+            arr = np.asarray(values)
+            if len(arr) != self.n_rows:
+                raise ValueError(f"Column '{name}' has {len(arr)} rows, store has {self.n_rows}")
+            dtype = column_dtype(name, label)
+            if name in self._cols:
+                entry = self._cols[name]
+            else:
+                i = len(used)
+                while f"c{i:03d}.npy" in used:
+                    i += 1
+                entry = {"name": name, "file": f"c{i:03d}.npy"}
+                used.add(entry["file"])
+                self.meta["columns"].append(entry)
+                self._cols[name] = entry
+            self._mmaps.pop(name, None)
+            np.save(os.path.join(self.path, entry["file"]), np.ascontiguousarray(arr, dtype=dtype))
+            entry.update({"dtype": np.dtype(dtype).name, "stats": column_stats(arr)})
+        with open(os.path.join(self.path, META), "w") as f:
+            json.dump(self.meta, f, indent=1)
+
+    def chunks(self, columns=None, chunk_rows=1_000_000, starts=None):
+        """Yield (row0, {column: array}) over consecutive row ranges; starts = custom chunk order."""
+        cols = self.columns if columns is None else list(columns)
+        if starts is None:
+            starts = range(0, self.n_rows, chunk_rows)
+        for r0 in starts:
+            r1 = min(r0 + chunk_rows, self.n_rows)
+            yield r0, {c: np.asarray(self.column(c)[r0:r1]) for c in cols}
+
+
+def crism_coverage(data, columns=CRISM_COLUMNS):
+    """
+    Row filter: cells where the CRISM percentages are not all 0.00 (no CRISM coverage).
+    data: a FeatureStore or any {column: array} mapping (e.g. one batch of rows).
+    """
+    zero = np.asarray(data[columns[0]]) == 0.0
+    for c in columns[1:]:
+        zero &= np.asarray(data[c]) == 0.0
+    return ~zero
+
+
+def open_store(path, csv_path=None, label=LABEL):
+    """
+    Open a store, converting csv_path first if the store does not exist yet or was converted
+    from another version of the CSV (path, size or mtime differ). A rebuild drops the columns
+    added later with add_columns (context features, rule labels): recompute them.
+    """
+    meta_path = os.path.join(path, META)
+    if not os.path.exists(meta_path):
+        if csv_path is None:
+            raise FileNotFoundError(f"No feature store at '{path}'")
+        csv_to_store(csv_path, path, label)
+    elif csv_path is not None and os.path.exists(csv_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("source") != source_info(csv_path):
+            print(f"[info] '{csv_path}' changed since the store was built: rebuilding '{path}'")
+            for c in meta["columns"]:
+                os.remove(os.path.join(path, c["file"]))
+            os.remove(meta_path)
+            csv_to_store(csv_path, path, label)
+    return FeatureStore(path)
@@ -0,0 +1,127 @@
+# fusion.py
+# Fusion stage: per-instrument grid products -> jezero_final_ML (CSV + binary columns).
+# Every product is a dense (ny, nx) array on the shared grid (jezero_grid.py), so fusing is
+# stacking: a table (x, y, <value>...) is scattered into its array by direct indexing
+# (arr[y, x] = value), and the fused columns are the flattened arrays in grid order
+# (y outer, x inner, like every CSV export of the project). No key joins, O(cells).
+#
+# Outputs
+# - jezero_final_ML.csv : same columns and row order as the hand-assembled file
+# - jezero_final_ML.store/ : typed, memory-mapped columnar store (feature_store.py)
+#
+#   python fusion.py --mola MOLA_finalversion_ML.csv --themis THEMIS_finalversion_ML.csv \
+#                    --crism CRISM_finalversion_ML.csv --labels labels.csv --out-dir /content
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))   # jezero_grid.py
+from jezero_grid import JEZERO_GRID
+from feature_store import LABEL, write_store
+
+SLOTS = ("5_30AM", "6_30PM", "7_00AM", "7_00PM")
+
+# Feature columns taken from each instrument table, in the column order of jezero_final_ML.csv
+SOURCES = {
+    "mola": ("avg_slope",),
+    "themis": tuple(f"mean_temperature_{s}" for s in SLOTS),
+    "crism": ("% Fe/Mg", "% Al-OH", "% H2O"),
+}
+
+OUT_CSV = "jezero_final_ML.csv"
+OUT_STORE = "jezero_final_ML.store"
+
+
+# ===========================
+# Tables <-> grid arrays
+# ===========================
+
+def table_to_grid(df, columns, shape=JEZERO_GRID.shape):
+    """{column: (ny, nx) float64 array} from a table with integer x, y (missing cells = NaN)."""
+    ny, nx = shape
+    x = df["x"].to_numpy()
+    y = df["y"].to_numpy()
+    if x.min() < 0 or y.min() < 0 or x.max() >= nx or y.max() >= ny:
+        raise ValueError(f"x / y outside the {nx}×{ny} grid")
+    flat = y.astype(np.int64) * nx + x
+    if np.bincount(flat, minlength=nx * ny).max() > 1:
+        raise ValueError("Duplicate (x, y) cells in the table")
+    out = {}
+    for c in columns:
+        arr = np.full(ny * nx, np.nan)
+        arr[flat] = df[c].to_numpy(dtype=np.float64)
+        out[c] = arr.reshape(ny, nx)
+    return out
+
+
+def read_grid_csv(path, columns, shape=JEZERO_GRID.shape):
+    """Only the x, y and requested columns of a grid CSV, as (ny, nx) arrays."""
+    return table_to_grid(pd.read_csv(path, usecols=["x", "y", *columns]), columns, shape)
+
+
+def fuse(layers, shape=JEZERO_GRID.shape):
+    """
+    Fused columns {x, y, <layer>...}: 1-D arrays in grid order (y outer, x inner).
+    layers: {name: (ny, nx) array}; C-contiguous layers are passed on as views (no copy).
+    """
+    ny, nx = shape
+    yy, xx = np.divmod(np.arange(nx * ny), nx)
+    columns = {"x": xx, "y": yy}
+    for name, arr in layers.items():
+        arr = np.asarray(arr)
+        if arr.shape != (ny, nx):
+            raise ValueError(f"Layer '{name}' has shape {arr.shape}, expected {(ny, nx)}")
+        columns[name] = arr.reshape(-1)
+    return columns
+
+
+def write_fused(columns, out_dir, csv_name=OUT_CSV, store_name=OUT_STORE):
+    """Write the fused columns as CSV and as a feature store. Returns (csv, store) paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    csv_path = os.path.join(out_dir, csv_name)
+    store_path = os.path.join(out_dir, store_name)
+    pd.DataFrame(columns, copy=False).to_csv(csv_path, index=False)
+    write_store(columns, store_path, label=LABEL)
+    return csv_path, store_path
+
+
+# ===========================
+# Fusion of the instrument tables
+# ===========================
+
+def fuse_tables(paths, labels=None, shape=JEZERO_GRID.shape, sources=SOURCES):
+    """
+    paths: {"mola": csv, "themis": csv, "crism": csv}; labels: optional CSV with x, y, LABEL.
+    Returns the fused columns (feature order of SOURCES, label last as int8).
+    """
+    layers = {}
+    for key, cols in sources.items():
+        layers.update(read_grid_csv(paths[key], cols, shape))
+    if labels is not None:
+        lab = read_grid_csv(labels, [LABEL], shape)[LABEL]
+        if np.isnan(lab).any():
+            raise ValueError(f"'{LABEL}' is missing for {int(np.isnan(lab).sum())} cells")
+        layers[LABEL] = lab.astype(np.int8)
+    return fuse(layers, shape)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fuse the MOLA / THEMIS / CRISM grid tables into jezero_final_ML.")
+    ap.add_argument("--mola", default="MOLA_finalversion_ML.csv")
+    ap.add_argument("--themis", default="THEMIS_finalversion_ML.csv")
+    ap.add_argument("--crism", default="CRISM_finalversion_ML.csv")
+    ap.add_argument("--labels", default=None, help=f"CSV with x, y, {LABEL}")
+    ap.add_argument("--out-dir", default=".")
+    args = ap.parse_args()
+
+    columns = fuse_tables({"mola": args.mola, "themis": args.themis, "crism": args.crism}, args.labels)
+    csv_path, store_path = write_fused(columns, args.out_dir)
+    print(f"Fused {len(columns['x'])} cells × {len(columns) - 2} columns -> {csv_path}, {store_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+# ml_streaming.py
+# Out-of-core training of the landing classifier, for feature stores too large for memory
+# (per-pixel features, 10^7 - 10^8 rows). Same model family, outputs and plots as ML.py:
+# - rows are streamed from the memory-mapped store (feature_store.py) in fixed-size chunks;
+#   the CRISM coverage filter and the 80/20 split are applied per chunk, so nothing
+#   proportional to the row count is ever held
+# - stratified split: every row gets a 64-bit hash of its index; within each class the
+#   test rows are the ones with the smallest hashes, as many as train_test_split(stratify=y)
+#   holds out. The per-class cut is found with a histogram of the hash prefixes (one pass)
+#   plus one pass over the rows of the boundary bin.
+# - StreamingScaler   -> mean / std (and the feature covariance) with the parallel update of
+#                        Chan et al.; replaces StandardScaler.fit_transform on the full matrix
+# - SGDClassifier(loss="log_loss") trained with partial_fit over shuffled chunks = logistic
+#   regression with the penalty of LogisticRegression(C); class_weight="balanced" becomes
+#   per-row sample weights from the class counts. Epochs run until the largest relative
+#   change of the weights stays below TOL for PATIENCE epochs (or MAX_EPOCHS): the default
+#   "optimal" 1 / (alpha·t) step size decays to the LogisticRegression solution.
+# - StreamingMetrics  -> confusion matrix + per-class score histograms of the held-out stream:
+#                        accuracy, classification report, ROC and precision-recall curves
+# Memory is O(chunk_rows × features) whatever the size of the store.
+#
+#   python ml_streaming.py --store /content/jezero_final_ML.store --csv /content/jezero_final_ML.csv
+
+import argparse
+
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+
+from feature_store import CRISM_COLUMNS, LABEL, COORDS, open_store, crism_coverage
+
+CHUNK_ROWS = 1_000_000
+TEST_SIZE = 0.2
+MAX_EPOCHS = 1000
+TOL = 1e-3               # max |Δw| / max |w| between epochs
+PATIENCE = 5             # epochs in a row below TOL
+HASH_BITS = 20           # prefix histogram of the split hashes: 2^20 bins per class
+N_BINS = 4096            # score histogram resolution of the ROC / PR curves
+SEED = 42
+
+
+# ===========================
+# Streaming statistics
+# ===========================
+
+class StreamingScaler:
+    """Standardization fitted chunk by chunk (population std, like StandardScaler); also keeps the covariance."""
+
+    def __init__(self, n_features):
+        self.n = 0
+        self.mean_ = np.zeros(n_features)
+        self.comoment = np.zeros((n_features, n_features))
+
+    def partial_fit(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        nb = X.shape[0]
+        if nb == 0:
+            return self
+        mb = X.mean(axis=0)
+        d = X - mb
+        delta = mb - self.mean_
+        n = self.n + nb
+        self.comoment += d.T @ d + np.outer(delta, delta) * (self.n * nb / n)
+        self.mean_ += delta * (nb / n)
+        self.n = n
+        return self
+
+    @property
+    def var_(self):
+        return np.diag(self.comoment) / max(self.n, 1)
+
+    @property
+    def scale_(self):
+        s = np.sqrt(self.var_)
+        return np.where(s > 0, s, 1.0)
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+
+    def correlation(self):
+        s = np.sqrt(np.diag(self.comoment))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.comoment / np.outer(s, s)
+
+
+class StreamingMetrics:
+    """Binary classification metrics accumulated over a stream of (y_true, proba) chunks."""
+
+    def __init__(self, n_bins=N_BINS, threshold=0.5):
+        self.n_bins = n_bins
+        self.threshold = threshold
+        self.cm = np.zeros((2, 2), dtype=np.int64)
+        self.hist = np.zeros((2, n_bins), dtype=np.int64)      # score histogram per true class
+
+    def update(self, y_true, proba):
+        y = np.asarray(y_true).astype(np.int64)
+        pred = (proba >= self.threshold).astype(np.int64)
+        self.cm += np.bincount(2 * y + pred, minlength=4).reshape(2, 2)
+        b = np.minimum((proba * self.n_bins).astype(np.int64), self.n_bins - 1)
+        self.hist += np.bincount(y * self.n_bins + b, minlength=2 * self.n_bins).reshape(2, self.n_bins)
+
+    @property
+    def accuracy(self):
+        return np.trace(self.cm) / max(self.cm.sum(), 1)
+
+    def report(self, digits=2):
+        """Text report in the layout of sklearn.metrics.classification_report."""
+        tp = np.diag(self.cm).astype(float)
+        support = self.cm.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            precision = np.nan_to_num(tp / self.cm.sum(axis=0))
+            recall = np.nan_to_num(tp / support)
+            f1 = np.nan_to_num(2 * precision * recall / (precision + recall))
+        n = support.sum()
+        lines = [f"{'':>12} {'precision':>9} {'recall':>9} {'f1-score':>9} {'support':>9}", ""]
+        for k in range(2):
+            lines.append(f"{k:>12} {precision[k]:>9.{digits}f} {recall[k]:>9.{digits}f} {f1[k]:>9.{digits}f} {support[k]:>9}")
+        lines.append("")
+        lines.append(f"{'accuracy':>12} {'':>9} {'':>9} {self.accuracy:>9.{digits}f} {n:>9}")
+        for name, w in (("macro avg", np.full(2, 0.5)), ("weighted avg", support / max(n, 1))):
+            lines.append(f"{name:>12} {w @ precision:>9.{digits}f} {w @ recall:>9.{digits}f} {w @ f1:>9.{digits}f} {n:>9}")
+        return "\n".join(lines)
+
+    def _cumulative(self):
+        """(false positives, true positives) above each score bin edge, highest threshold first."""
+        neg, pos = self.hist[0][::-1], self.hist[1][::-1]
+        return np.concatenate([[0], np.cumsum(neg)]), np.concatenate([[0], np.cumsum(pos)])
+
+    def roc_curve(self):
+        fp, tp = self._cumulative()
+        return fp / max(fp[-1], 1), tp / max(tp[-1], 1)
+
+    def roc_auc(self):
+        fpr, tpr = self.roc_curve()
+        return float(np.trapezoid(tpr, fpr))
+
+    def pr_curve(self):
+        """(precision, recall) from the lowest to the highest threshold, like precision_recall_curve."""
+        fp, tp = self._cumulative()
+        keep = (fp + tp) > 0
+        precision = tp[keep] / (fp[keep] + tp[keep])
+        recall = tp[keep] / max(tp[-1], 1)
+        return np.concatenate([precision[::-1], [1.0]]), np.concatenate([recall[::-1], [0.0]])
+
+
+# ===========================
+# Streams
+# ===========================
+
+def row_hash(row_idx, seed=SEED):
+    """64-bit hash of the global row index (a bijection: no two rows share a hash)."""
+    return (np.asarray(row_idx).astype(np.uint64) ^ np.uint64(seed)) * np.uint64(0x9E3779B97F4A7C15)
+
+
+def _labels(store, where, label, chunk_rows):
+    """(row0, y int64, keep) over the chunks, reading only the label and the filter columns."""
+    if where is None:
+        cols = [label]
+    elif where is crism_coverage:
+        cols = [label, *CRISM_COLUMNS]
+    else:                                                   # any other filter may use any column
+        cols = store.columns
+    for r0, c in store.chunks(cols, chunk_rows):
+        y = np.asarray(c[label]).astype(np.int64)
+        yield r0, y, (np.ones(len(y), dtype=bool) if where is None else where(c))
+
+
+def test_counts(class_counts, test_size=TEST_SIZE):
+    """Held-out rows per class, allocated like train_test_split(stratify=y)."""
+    counts = np.asarray(class_counts, dtype=np.int64)
+    n = counts.sum()
+    n_test = int(np.ceil(test_size * n))
+    exact = counts * n_test / max(n, 1)
+    k = np.floor(exact).astype(np.int64)
+    k[np.argsort(-(exact - k), kind="stable")[:n_test - k.sum()]] += 1
+    return k
+
+
+def split_thresholds(store, where=crism_coverage, label=LABEL, test_size=TEST_SIZE, seed=SEED,
+                     chunk_rows=CHUNK_ROWS, bits=HASH_BITS):
+    """
+    Per-class hash cut: a row of class c is held out when row_hash <= cut[c] (and k[c] > 0).
+    Returns (cut uint64 (2,), k (2,) held-out rows per class).
+    """
+    shift = np.uint64(64 - bits)
+    hist = np.zeros((2, 1 << bits), dtype=np.int64)
+    for r0, y, keep in _labels(store, where, label, chunk_rows):
+        prefix = (row_hash(np.arange(r0, r0 + len(y))[keep], seed) >> shift).astype(np.int64)
+        hist += np.bincount(y[keep] * (1 << bits) + prefix, minlength=2 << bits).reshape(2, -1)
+    k = test_counts(hist.sum(axis=1), test_size)
+    cum = np.cumsum(hist, axis=1)
+    bins = np.array([np.searchsorted(cum[c], max(k[c], 1)) for c in range(2)])   # bin of the k-th smallest
+    rank = np.array([max(k[c], 1) - (cum[c, bins[c] - 1] if bins[c] > 0 else 0) for c in range(2)])
+    boundary = [[], []]
+    for r0, y, keep in _labels(store, where, label, chunk_rows):
+        h = row_hash(np.arange(r0, r0 + len(y)), seed)
+        for c in range(2):
+            sel = keep & (y == c) & ((h >> shift).astype(np.int64) == bins[c])
+            boundary[c].append(h[sel])
+    cut = np.zeros(2, dtype=np.uint64)
+    for c in range(2):
+        if k[c] > 0:
+            cut[c] = np.sort(np.concatenate(boundary[c]))[rank[c] - 1]
+    return cut, k
+
+
+def test_split(row_idx, y, split, seed=SEED):
+    """Held-out mask of rows row_idx with labels y, for split = split_thresholds(...)."""
+    cut, k = split
+    y = np.asarray(y).astype(np.int64)
+    return (k[y] > 0) & (row_hash(row_idx, seed) <= cut[y])
+
+
+def stream(store, features, part, split, chunk_rows=CHUNK_ROWS, where=crism_coverage, starts=None,
+           label=LABEL, seed=SEED):
+    """Yield (X float64, y int64) chunks of the "train" or "test" rows kept by `where`."""
+    for r0, cols in store.chunks(list(dict.fromkeys([*features, label])), chunk_rows, starts):
+        y = np.asarray(cols[label]).astype(np.int64)
+        keep = np.ones(len(y), dtype=bool) if where is None else where(cols)
+        is_test = test_split(np.arange(r0, r0 + len(y)), y, split, seed)
+        keep &= is_test if part == "test" else ~is_test
+        if keep.any():
+            yield np.column_stack([cols[f][keep] for f in features]).astype(np.float64), y[keep]
+
+
+def feature_columns(store, label=LABEL):
+    """Every column except the coordinates and the target (the X of ML.py)."""
+    return [c for c in store.columns if c not in COORDS and c != label]
+
+
+# ===========================
+# Training
+# ===========================
+
+def train_streaming(store, features=None, chunk_rows=CHUNK_ROWS, max_epochs=MAX_EPOCHS, tol=TOL,
+                    patience=PATIENCE, C=1.0, where=crism_coverage, seed=SEED, test_size=TEST_SIZE):
+    """
+    Two passes for the stratified split, one for the statistics, partial_fit epochs until the
+    weights converge, one pass for the evaluation.
+    Returns dict(model, scaler, features, metrics, correlation (all kept rows), n_train, n_test,
+    n_epochs, converged).
+    """
+    features = feature_columns(store) if features is None else list(features)
+    split = split_thresholds(store, where, test_size=test_size, seed=seed, chunk_rows=chunk_rows)
+    scaler = StreamingScaler(len(features))
+    all_rows = StreamingScaler(len(features))
+    counts = np.zeros(2, dtype=np.int64)
+    for X, y in stream(store, features, "train", split, chunk_rows, where, seed=seed):
+        scaler.partial_fit(X)
+        all_rows.partial_fit(X)
+        counts += np.bincount(y, minlength=2)
+    for X, _ in stream(store, features, "test", split, chunk_rows, where, seed=seed):
+        all_rows.partial_fit(X)
+    n_train = int(counts.sum())
+    if n_train == 0 or counts.min() == 0:
+        raise ValueError(f"Training stream needs both classes (class counts {counts.tolist()})")
+    class_weight = n_train / (2.0 * counts)                 # class_weight="balanced"
+
+    model = SGDClassifier(loss="log_loss", alpha=1.0 / (C * n_train), random_state=seed)
+    rng = np.random.default_rng(seed)
+    starts = np.arange(0, store.n_rows, chunk_rows)
+    prev, calm, epoch = None, 0, 0
+    while epoch < max_epochs and calm < patience:
+        for X, y in stream(store, features, "train", split, chunk_rows, where, starts=rng.permutation(starts),
+                           seed=seed):
+            perm = rng.permutation(len(y))
+            model.partial_fit(scaler.transform(X[perm]), y[perm], classes=[0, 1], sample_weight=class_weight[y[perm]])
+        epoch += 1
+        w = np.concatenate([model.coef_.ravel(), model.intercept_])
+        if prev is not None:
+            change = np.abs(w - prev).max() / max(np.abs(w).max(), 1e-12)
+            calm = calm + 1 if change < tol else 0
+        prev = w
+
+    metrics = StreamingMetrics()
+    n_test = 0
+    for X, y in stream(store, features, "test", split, chunk_rows, where, seed=seed):
+        metrics.update(y, model.predict_proba(scaler.transform(X))[:, 1])
+        n_test += len(y)
+    return {"model": model, "scaler": scaler, "features": features, "metrics": metrics,
+            "correlation": all_rows.correlation(), "n_train": n_train, "n_test": n_test,
+            "n_epochs": epoch, "converged": calm >= patience}
+
+
+# ===========================
+# Plots (same files as ML.py)
+# ===========================
+
+def save_plots(result, out_prefix=""):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from sklearn.metrics import PrecisionRecallDisplay
+
+    m, features = result["metrics"], result["features"]
+
+    plt.figure(figsize=(5, 5))
+    plt.imshow(m.cm)
+    plt.title("Confusion Matrix")
+    plt.xlabel("Predicted")
+    plt.ylabel("Actual")
+    for i in range(2):
+        for j in range(2):
+            plt.text(j, i, str(m.cm[i, j]), ha="center", va="center")
+    plt.savefig(out_prefix + "confusion_matrix.png", dpi=300, bbox_inches="tight")
+    plt.close()
+
+    fpr, tpr = m.roc_curve()
+    plt.figure(figsize=(6, 6))
+    plt.plot(fpr, tpr, color='darkorange', lw=2, label=f'ROC curve (area = {m.roc_auc():.2f})')
+    plt.plot([0, 1], [0, 1], color='navy', lw=2, linestyle='--')
+    plt.xlim([0.0, 1.0])
+    plt.ylim([0.0, 1.05])
+    plt.xlabel('False Positive Rate')
+    plt.ylabel('True Positive Rate')
+    plt.title('Receiver Operating Characteristic (ROC) Curve')
+    plt.legend(loc="lower right")
+    plt.grid(True)
+    plt.savefig(out_prefix + "roc_curve.png", dpi=300, bbox_inches="tight")
+    plt.close()
+
+    precision, recall = m.pr_curve()
+    PrecisionRecallDisplay(precision=precision, recall=recall).plot()
+    plt.title('Precision-Recall Curve')
+    plt.grid(True)
+    plt.savefig(out_prefix + "precision_recall_curve.png", dpi=300, bbox_inches="tight")
+    plt.close()
+
+    plt.figure(figsize=(10, 6))
+    plt.barh(features, result["model"].coef_[0])
+    plt.title("Feature Importance (Logistic Regression Coefficients)")
+    plt.xlabel("Coefficient Value")
+    plt.ylabel("Feature")
+    plt.tight_layout()
+    plt.savefig(out_prefix + "feature_importance.png", dpi=300, bbox_inches="tight")
+    plt.close()
+
+    plt.figure(figsize=(10, 8))
+    sns.heatmap(result["correlation"], annot=True, cmap='coolwarm', fmt=".2f",
+                xticklabels=features, yticklabels=features)
+    plt.title('Correlation Heatmap of Features')
+    plt.tight_layout()
+    plt.savefig(out_prefix + "correlation_heatmap.png", dpi=300, bbox_inches="tight")
+    plt.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Out-of-core training of the landing classifier.")
+    ap.add_argument("--store", default="/content/jezero_final_ML.store")
+    ap.add_argument("--csv", default=None, help="fused CSV to convert if the store does not exist")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    ap.add_argument("--max-epochs", type=int, default=MAX_EPOCHS)
+    ap.add_argument("--tol", type=float, default=TOL)
+    ap.add_argument("--no-plots", action="store_true")
+    args = ap.parse_args()
+
+    store = open_store(args.store, csv_path=args.csv)
+    result = train_streaming(store, chunk_rows=args.chunk_rows, max_epochs=args.max_epochs, tol=args.tol)
+    print(f"SGD epochs: {result['n_epochs']} ({'converged' if result['converged'] else 'NOT converged'}, tol {args.tol})")
+    m = result["metrics"]
+    print("Accuracy:", m.accuracy)
+    print("\nConfusion matrix:\n", m.cm)
+    print("\nClassification report:\n", m.report())
+    print(f"ROC AUC: {m.roc_auc():.3f}")
+    print(f"Number of samples available for training: {result['n_train']}")
+    print(f"Number of samples available for testing: {result['n_test']}")
+    if not args.no_plots:
+        save_plots(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# model_selection.py
+# Spatial-block cross-validation and hyperparameter search for the landing classifier.
+# Neighbouring cells are strongly correlated, so a random 80/20 split leaks information
+# between train and test. Here:
+# - spatial_folds     -> the grid is cut into BLOCK × BLOCK cell blocks; whole blocks go to
+#                        the same fold (StratifiedGroupKFold: blocks as groups, class ratio
+#                        kept as far as the blocks allow)
+# - successive_halving -> every (candidate, fold) fit of a round runs in parallel (joblib,
+#                        all cores); round 1 trains on a subsample of each training fold, then
+#                        only the best 1/ETA candidates survive and the sample grows ETA times
+#                        until the full folds. Weak candidates cost a fraction of a full fit.
+# - every fit is recorded (round, candidate, fold, n_train, fit / score time, ROC-AUC, PR-AUC)
+#
+#   python model_selection.py --store /content/jezero_final_ML.store --csv /content/jezero_final_ML.csv
+
+import argparse
+import itertools
+import time
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import average_precision_score, roc_auc_score
+from sklearn.model_selection import StratifiedGroupKFold
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+from feature_store import LABEL, open_store, crism_coverage
+
+BLOCK = 10              # cells per side of a spatial block
+N_FOLDS = 5
+ETA = 3                 # halving factor
+MIN_FRACTION = 1 / 9    # share of each training fold used in the first round
+SEED = 42
+
+PARAM_GRID = {
+    "logisticregression__C": [float(c) for c in np.logspace(-3, 2, 11)],
+    "logisticregression__class_weight": [None, "balanced"],
+}
+
+
+def default_estimator():
+    """The model of ML.py: standardization + logistic regression."""
+    return make_pipeline(StandardScaler(), LogisticRegression(max_iter=200))
+
+
+# ===========================
+# Folds
+# ===========================
+
+def spatial_blocks(x, y, block=BLOCK):
+    """Block id of every cell: cells in the same block × block square share an id."""
+    bx, by = np.asarray(x) // block, np.asarray(y) // block
+    return by.astype(np.int64) * (int(bx.max()) + 1) + bx
+
+
+def spatial_folds(x, y, labels, n_folds=N_FOLDS, block=BLOCK, seed=SEED):
+    """[(train_idx, test_idx), ...] with whole spatial blocks in each test fold."""
+    groups = spatial_blocks(x, y, block)
+    cv = StratifiedGroupKFold(n_splits=n_folds, shuffle=True, random_state=seed)
+    return list(cv.split(np.zeros(len(groups)), labels, groups))
+
+
+# ===========================
+# Successive halving
+# ===========================
+
+def param_candidates(grid=PARAM_GRID):
+    keys = list(grid)
+    return [dict(zip(keys, vals)) for vals in itertools.product(*(grid[k] for k in keys))]
+
+
+def _subsample(idx, y, n, seed):
+    """About n rows of idx, stratified by class (at least one row of every class)."""
+    if n >= len(idx):
+        return idx
+    rng = np.random.default_rng(seed)
+    parts = []
+    for cls in np.unique(y[idx]):
+        members = idx[y[idx] == cls]
+        k = min(len(members), max(1, int(round(n * len(members) / len(idx)))))
+        parts.append(rng.choice(members, size=k, replace=False))
+    return np.sort(np.concatenate(parts))
+
+
+def _fit_score(estimator, params, X, y, train, test):
+    """One fit: (fit seconds, score seconds, ROC-AUC, PR-AUC); NaN scores if the fold has one class."""
+    model = clone(estimator).set_params(**params)
+    t0 = time.perf_counter()
+    model.fit(X[train], y[train])
+    t1 = time.perf_counter()
+    proba = model.predict_proba(X[test])[:, 1]
+    t2 = time.perf_counter()
+    if len(np.unique(y[test])) < 2:
+        return t1 - t0, t2 - t1, np.nan, np.nan
+    return t1 - t0, t2 - t1, roc_auc_score(y[test], proba), average_precision_score(y[test], proba)
+
+
+def successive_halving(X, y, folds, candidates, estimator=None, eta=ETA, min_fraction=MIN_FRACTION,
+                       n_jobs=-1, seed=SEED, verbose=True):
+    """
+    Returns (best params, results DataFrame with one row per (round, candidate, fold) fit).
+    Candidates are ranked by mean ROC-AUC over the folds of the round.
+    """
+    estimator = default_estimator() if estimator is None else estimator
+    X, y = np.asarray(X), np.asarray(y)
+    alive = list(range(len(candidates)))
+    fraction = min_fraction
+    rows = []
+    with Parallel(n_jobs=n_jobs) as parallel:
+        for rnd in itertools.count():
+            fraction = min(fraction, 1.0)
+            tasks = []
+            for f, (train, test) in enumerate(folds):
+                sub = _subsample(train, y, int(round(fraction * len(train))), seed + 1000 * rnd + f)
+                for c in alive:
+                    tasks.append((c, f, sub, test))
+            t0 = time.perf_counter()
+            out = parallel(delayed(_fit_score)(estimator, candidates[c], X, y, sub, test)
+                           for c, f, sub, test in tasks)
+            wall = time.perf_counter() - t0
+            for (c, f, sub, _), (fit_t, score_t, auc, ap) in zip(tasks, out):
+                rows.append({"round": rnd, "candidate": c, **{k.split("__")[-1]: v for k, v in candidates[c].items()},
+                             "fold": f, "n_train": len(sub), "fit_time": fit_t, "score_time": score_t,
+                             "roc_auc": auc, "pr_auc": ap})
+            res = pd.DataFrame(rows)
+            mean = res[res["round"] == rnd].groupby("candidate")["roc_auc"].mean().reindex(alive)
+            if verbose:
+                print(f"round {rnd}: {len(alive)} candidates × {len(folds)} folds, "
+                      f"{fraction:.0%} of each training fold, {wall:.2f} s, best ROC-AUC {mean.max():.3f}")
+            if fraction >= 1.0 or len(alive) == 1:
+                break
+            keep = max(1, len(alive) // eta)
+            alive = list(mean.sort_values(ascending=False, na_position="last").index[:keep])
+            fraction *= eta
+    best = int(mean.idxmax())
+    return candidates[best], pd.DataFrame(rows)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Spatial-block CV + successive-halving search for the landing classifier.")
+    ap.add_argument("--store", default="/content/jezero_final_ML.store")
+    ap.add_argument("--csv", default=None, help="fused CSV to convert if the store does not exist")
+    ap.add_argument("--block", type=int, default=BLOCK)
+    ap.add_argument("--folds", type=int, default=N_FOLDS)
+    ap.add_argument("--jobs", type=int, default=-1)
+    ap.add_argument("--out", default="model_selection_results.csv")
+    args = ap.parse_args()
+
+    store = open_store(args.store, csv_path=args.csv)
+    data = store.read(where=crism_coverage)
+    X = data.drop(columns=[LABEL, "x", "y"]).to_numpy(dtype=np.float64)
+    y = data[LABEL].to_numpy().astype(np.int64)
+    folds = spatial_folds(data["x"].to_numpy(), data["y"].to_numpy(), y, args.folds, args.block)
+
+    t0 = time.perf_counter()
+    best, results = successive_halving(X, y, folds, param_candidates(), n_jobs=args.jobs)
+    print(f"Search time: {time.perf_counter() - t0:.2f} s ({len(results)} fits)")
+    results.to_csv(args.out, index=False)
+
+    final = results[results["round"] == results["round"].max()]
+    print("\nPer-fold results of the last round:")
+    print(final[["candidate", "C", "class_weight", "fold", "n_train", "fit_time", "score_time", "roc_auc", "pr_auc"]]
+          .to_string(index=False))
+    print(f"\nBest parameters: {best}")
+    print(f"Results saved to: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# model_zoo.py
+# Registry of landing-suitability estimators and a benchmark runner.
+# Every entry of MODELS is a factory returning an unfitted sklearn estimator with
+# fit / predict_proba (scaling included where the model needs it), so any of them can be
+# trained, cross-validated (model_selection.py) and persisted / scored (predict.py) the same way.
+# New models: decorate a factory with @register_model("name").
+#
+# benchmark() runs every model on the SAME spatial-block folds and records per fold:
+#   fit_time_s, predict_rows_per_s (on at least THROUGHPUT_ROWS rows), peak_fit_mem_mb, roc_auc, pr_auc
+# and writes them to a CSV table; summary() gives the per-model means plus ROC-AUC per ms of fit.
+# The fit is timed without any instrumentation; peak_fit_mem_mb comes from a second fit of a
+# fresh model: growth of the process peak RSS over the RSS before the fit, so memory allocated
+# in C / Cython / OpenMP threads counts too. Freed heap is returned to the OS first (gc +
+# glibc malloc_trim), otherwise the fit reuses it without growing the RSS. Linux: peak reset
+# through /proc/self/clear_refs; elsewhere ru_maxrss, which only shows growth above the
+# earlier peak of the process.
+#
+#   python model_zoo.py --store /content/jezero_final_ML.store --out model_benchmark.csv
+
+import argparse
+import ctypes
+import gc
+import resource
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import average_precision_score, roc_auc_score
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import LinearSVC
+
+from feature_store import LABEL, open_store, crism_coverage
+from model_selection import BLOCK, N_FOLDS, SEED, spatial_folds
+
+THROUGHPUT_ROWS = 100_000
+
+MODELS = {}
+
+
+def register_model(name):
+    """Decorator: add an estimator factory to MODELS under `name`."""
+    def deco(factory):
+        MODELS[name] = factory
+        return factory
+    return deco
+
+
+@register_model("logistic")
+def logistic(seed=SEED):
+    """The model of ML.py."""
+    return make_pipeline(StandardScaler(), LogisticRegression(class_weight="balanced", max_iter=200))
+
+
+@register_model("hist_gradient_boosting")
+def hist_gradient_boosting(seed=SEED):
+    return HistGradientBoostingClassifier(class_weight="balanced", random_state=seed)
+
+
+@register_model("random_forest")
+def random_forest(seed=SEED):
+    return RandomForestClassifier(n_estimators=200, min_samples_leaf=2, class_weight="balanced",
+                                  n_jobs=-1, random_state=seed)
+
+
+@register_model("linear_svm")
+def linear_svm(seed=SEED):
+    """Linear SVM with Platt-scaled probabilities (predict_proba like the other models)."""
+    return make_pipeline(StandardScaler(),
+                         CalibratedClassifierCV(LinearSVC(class_weight="balanced", random_state=seed),
+                                                method="sigmoid", cv=3))
+
+
+def make_model(name, seed=SEED):
+    if name not in MODELS:
+        raise KeyError(f"Unknown model '{name}' (available: {sorted(MODELS)})")
+    return MODELS[name](seed=seed)
+
+
+# ===========================
+# Benchmark
+# ===========================
+
+def _throughput(model, X, min_rows=THROUGHPUT_ROWS):
+    """Rows per second of predict_proba on X tiled to at least min_rows rows."""
+    reps = max(1, -(-min_rows // max(len(X), 1)))
+    Xr = np.tile(X, (reps, 1)) if reps > 1 else X
+    t0 = time.perf_counter()
+    model.predict_proba(Xr)
+    return len(Xr) / max(time.perf_counter() - t0, 1e-9)
+
+
+def _status_mb(key):
+    """VmRSS / VmHWM of this process in MB from /proc (None where /proc is not available)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(key + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+def _maxrss_mb():
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return r / 2 ** 20 if sys.platform == "darwin" else r / 1024      # bytes on macOS, KB on Linux
+
+
+def _release_heap():
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):                               # not glibc
+        pass
+
+
+def peak_rss_during(fn):
+    """Run fn(); return the growth (MB) of the process peak RSS over the RSS before the call."""
+    _release_heap()
+    base = _status_mb("VmRSS")
+    try:
+        with open("/proc/self/clear_refs", "w") as f:             # reset VmHWM to the current RSS
+            f.write("5")
+        reset = base is not None
+    except OSError:
+        reset = False
+    if not reset:
+        base = _maxrss_mb()
+    fn()
+    peak = _status_mb("VmHWM") if reset else _maxrss_mb()
+    return max(peak - base, 0.0)
+
+
+def benchmark_fold(name, X, y, train, test, seed=SEED):
+    Xtr, ytr = X[train], y[train]
+    model = make_model(name, seed)
+    t0 = time.perf_counter()
+    model.fit(Xtr, ytr)
+    fit_time = time.perf_counter() - t0
+    peak_mb = peak_rss_during(lambda: make_model(name, seed).fit(Xtr, ytr))
+    proba = model.predict_proba(X[test])[:, 1]
+    two_classes = len(np.unique(y[test])) == 2
+    return {"model": name, "n_train": len(train), "n_test": len(test),
+            "fit_time_s": fit_time, "predict_rows_per_s": _throughput(model, X[test]),
+            "peak_fit_mem_mb": peak_mb,
+            "roc_auc": roc_auc_score(y[test], proba) if two_classes else np.nan,
+            "pr_auc": average_precision_score(y[test], proba) if two_classes else np.nan}
+
+
+def benchmark(X, y, folds, names=None, seed=SEED, verbose=True):
+    """One row per (model, fold); all models see the same folds."""
+    names = list(MODELS) if names is None else list(names)
+    X, y = np.asarray(X, dtype=np.float64), np.asarray(y)
+    rows = []
+    for name in names:
+        for f, (train, test) in enumerate(folds):
+            rows.append({**benchmark_fold(name, X, y, train, test, seed), "fold": f})
+        if verbose:
+            r = pd.DataFrame(rows[-len(folds):])
+            print(f"{name:>24}: ROC-AUC {r['roc_auc'].mean():.3f}, fit {r['fit_time_s'].mean() * 1e3:.1f} ms, "
+                  f"{r['predict_rows_per_s'].mean():,.0f} rows/s")
+    return pd.DataFrame(rows)
+
+
+def summary(results):
+    """Per-model means, sorted by ROC-AUC per millisecond of fit."""
+    s = results.groupby("model")[["fit_time_s", "predict_rows_per_s", "peak_fit_mem_mb", "roc_auc", "pr_auc"]].mean()
+    s["roc_auc_per_fit_ms"] = s["roc_auc"] / (s["fit_time_s"] * 1e3)
+    return s.sort_values("roc_auc_per_fit_ms", ascending=False)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the registered landing models on spatial-block folds.")
+    ap.add_argument("--store", default="/content/jezero_final_ML.store")
+    ap.add_argument("--csv", default=None, help="fused CSV to convert if the store does not exist")
+    ap.add_argument("--models", nargs="*", default=None, help=f"subset of {sorted(MODELS)}")
+    ap.add_argument("--block", type=int, default=BLOCK)
+    ap.add_argument("--folds", type=int, default=N_FOLDS)
+    ap.add_argument("--out", default="model_benchmark.csv")
+    args = ap.parse_args()
+
+    store = open_store(args.store, csv_path=args.csv)
+    data = store.read(where=crism_coverage)
+    X = data.drop(columns=[LABEL, "x", "y"]).to_numpy(dtype=np.float64)
+    y = data[LABEL].to_numpy().astype(np.int64)
+    folds = spatial_folds(data["x"].to_numpy(), data["y"].to_numpy(), y, args.folds, args.block)
+
+    results = benchmark(X, y, folds, args.models)
+    results.to_csv(args.out, index=False)
+    print("\n", summary(results).to_string(float_format=lambda v: f"{v:.4g}"))
+    print(f"\nResults saved to: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
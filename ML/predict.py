@@ -0,0 +1,209 @@
+# predict.py
+# Inference for the landing classifier: persisted model + feature schema, chunked vectorized
+# scoring of any grid, and suitability rasters on the shared grid (pipeline.md, node n1).
+# Only numpy / pandas / joblib at import time (no plotting, no training code), so it can be
+# imported by any pipeline stage or service.
+# - save_model / load_model -> scaler + estimator + feature schema (order, dtype, training
+#                              range) in one joblib bundle, schema also as JSON next to it
+# - Predictor               -> P(good landing place) in fixed-size chunks; for linear models the
+#                              scaler is folded into the weights, so a chunk is one mat-vec
+#                              product and a sigmoid (no per-chunk sklearn overhead). Cells the
+#                              model never saw are NaN: no CRISM coverage (dropped by ML.py) and,
+#                              with within_range, any feature outside the saved training range
+# - slot_layers             -> per-slot suitability = probability where the THEMIS slot flag
+#                              holds, 0 where it fails
+# - write_grid_tif          -> float32 GeoTIFF on the shared lon/lat grid (rasterio)
+#
+#   python predict.py --model /content/landing_model.joblib --store /content/jezero_final_ML.store \
+#                     --themis-flags /content/THEMIS_finalversion_ML.csv --out-dir /content
+
+import argparse
+import json
+import os
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))   # jezero_grid.py
+from jezero_grid import JEZERO_GRID, MARS_LONLAT
+from feature_store import CRISM_COLUMNS, LABEL, crism_coverage, open_store
+
+CHUNK_ROWS = 262_144
+SLOTS = ("5_30AM", "7_00AM", "6_30PM", "7_00PM")
+OUT_PROBA_TIF = "landing_probability.tif"
+OUT_SLOT_TIF = "landing_suitability_{slot}.tif"
+OUT_CSV = "landing_probability.csv"
+
+
+# ===========================
+# Persistence
+# ===========================
+
+def feature_schema(X, features):
+    """Order, dtype and training range of every feature (X: 2-D training matrix)."""
+    X = np.asarray(X, dtype=np.float64)
+    return [{"name": f, "dtype": "float32", "min": float(np.nanmin(X[:, i])), "max": float(np.nanmax(X[:, i]))}
+            for i, f in enumerate(features)]
+
+
+def save_model(path, scaler, model, features, X_train=None, label=LABEL):
+    """
+    Bundle scaler + model + schema with joblib; schema also written to <path>.schema.json.
+    scaler=None for models that scale internally (pipelines of model_zoo.py).
+    """
+    schema = feature_schema(X_train, features) if X_train is not None else [{"name": f} for f in features]
+    bundle = {"scaler": scaler, "model": model, "schema": schema, "label": label}
+    joblib.dump(bundle, path)
+    with open(path + ".schema.json", "w") as f:
+        json.dump({"label": label, "features": schema, "model": type(model).__name__}, f, indent=1)
+    return path
+
+
+def load_model(path):
+    return Predictor(joblib.load(path))
+
+
+# ===========================
+# Predictor
+# ===========================
+
+class Predictor:
+    """P(label = 1) for feature columns in the schema order, scored in chunks of CHUNK_ROWS."""
+
+    def __init__(self, bundle, chunk_rows=CHUNK_ROWS):
+        self.scaler = bundle["scaler"]
+        self.model = bundle["model"]
+        self.schema = bundle["schema"]
+        self.features = [s["name"] for s in self.schema]
+        self.chunk_rows = chunk_rows
+        self._linear = None
+        if hasattr(self.model, "coef_") and hasattr(self.model, "intercept_") and self.model.coef_.shape[0] == 1:
+            mean = getattr(self.scaler, "mean_", 0.0)
+            scale = getattr(self.scaler, "scale_", 1.0)
+            w = self.model.coef_[0] / scale
+            self._linear = (w.astype(np.float64), float(self.model.intercept_[0] - np.sum(w * mean)))
+
+    def matrix(self, data):
+        """(n, n_features) float64 matrix from a DataFrame / {column: array} mapping, in schema order."""
+        missing = [f for f in self.features if f not in data]
+        if missing:
+            raise KeyError(f"Missing feature columns: {missing} (model expects {self.features})")
+        return np.column_stack([np.asarray(data[f], dtype=np.float64).ravel() for f in self.features])
+
+    def in_training_range(self, X):
+        """Rows whose features all lie inside the training [min, max] of the schema."""
+        lo = np.array([s.get("min", -np.inf) for s in self.schema])
+        hi = np.array([s.get("max", np.inf) for s in self.schema])
+        return ((X >= lo) & (X <= hi)).all(axis=1)
+
+    def _score(self, X):
+        if self._linear is not None:
+            w, b = self._linear
+            return 1.0 / (1.0 + np.exp(-(X @ w + b)))
+        if self.scaler is not None:
+            X = self.scaler.transform(X)
+        return self.model.predict_proba(X)[:, 1]
+
+    def predict_proba(self, X, within_range=False):
+        """
+        Probabilities (float32) for a 2-D matrix or a column mapping; NaN where a feature is NaN
+        (and, with within_range, where a feature is outside the training range).
+        """
+        if not isinstance(X, np.ndarray):
+            X = self.matrix(X)
+        out = np.full(X.shape[0], np.nan, dtype=np.float32)
+        for r0 in range(0, X.shape[0], self.chunk_rows):
+            chunk = X[r0:r0 + self.chunk_rows]
+            ok = np.isfinite(chunk).all(axis=1)
+            if within_range:
+                ok &= self.in_training_range(chunk)
+            if ok.all():
+                out[r0:r0 + len(chunk)] = self._score(chunk)
+            elif ok.any():
+                out[r0:r0 + len(chunk)][ok] = self._score(chunk[ok])
+        return out
+
+    def predict_grid(self, layers):
+        """(ny, nx) probability map from {feature: (ny, nx) array} (e.g. fusion.read_grid_csv)."""
+        shape = np.shape(layers[self.features[0]])
+        return self.predict_proba(layers).reshape(shape)
+
+    def predict_store(self, store, shape=JEZERO_GRID.shape, where=crism_coverage, within_range=False):
+        """
+        (ny, nx) probability map of a feature store, scored chunk by chunk (rows placed by x, y).
+        where: row filter of the training rows (default: CRISM coverage, like ML.py); other rows are NaN.
+        """
+        extra = [c for c in CRISM_COLUMNS if c in store] if where is crism_coverage else store.columns
+        proba = np.full(shape, np.nan, dtype=np.float32)
+        for _, cols in store.chunks(list(dict.fromkeys(["x", "y", *self.features, *extra])), self.chunk_rows):
+            p = self.predict_proba(cols, within_range)
+            if where is not None:
+                p[~np.asarray(where(cols))] = np.nan
+            proba[cols["y"], cols["x"]] = p
+        return proba
+
+
+# ===========================
+# Suitability layers and rasters
+# ===========================
+
+def slot_layers(proba, slot_flags):
+    """{slot: probability where the slot flag is true, 0 where false, NaN where proba is NaN}."""
+    return {slot: np.where(np.isnan(proba), np.nan, np.where(flag, proba, 0.0)).astype(np.float32)
+            for slot, flag in slot_flags.items()}
+
+
+def read_slot_flags(path, slots=SLOTS, shape=JEZERO_GRID.shape):
+    """{slot: (ny, nx) bool} from a table with x, y, flag_<slot> (THEMIS_finalversion_ML.csv)."""
+    df = pd.read_csv(path, usecols=["x", "y", *[f"flag_{s}" for s in slots]])
+    out = {}
+    for s in slots:
+        grid = np.zeros(shape, dtype=bool)
+        grid[df["y"].to_numpy(), df["x"].to_numpy()] = df[f"flag_{s}"].to_numpy(dtype=bool)
+        out[s] = grid
+    return out
+
+
+def write_grid_tif(path, arr, grid=JEZERO_GRID):
+    """float32 GeoTIFF of a (ny, nx) array on `grid` (lon/lat, NaN = nodata)."""
+    import rasterio
+    from rasterio.transform import Affine
+
+    with rasterio.open(path, "w", driver="GTiff", height=grid.ny, width=grid.nx, count=1, dtype="float32",
+                       crs=MARS_LONLAT, transform=Affine(*grid.transform), nodata=np.nan) as dst:
+        dst.write(np.asarray(arr, dtype=np.float32), 1)
+    return path
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Score every grid cell with a saved landing model.")
+    ap.add_argument("--model", default="/content/landing_model.joblib")
+    ap.add_argument("--store", default="/content/jezero_final_ML.store")
+    ap.add_argument("--csv", default=None, help="fused CSV to convert if the store does not exist")
+    ap.add_argument("--themis-flags", default=None, help="CSV with x, y, flag_<slot> for the per-slot layers")
+    ap.add_argument("--out-dir", default=".")
+    ap.add_argument("--within-range", action="store_true",
+                    help="also NaN for cells with a feature outside the training range of the model")
+    args = ap.parse_args()
+
+    predictor = load_model(args.model)
+    store = open_store(args.store, csv_path=args.csv)
+    ny = int(store.stats("y")["max"]) + 1
+    nx = int(store.stats("x")["max"]) + 1
+    grid = JEZERO_GRID.with_shape((ny, nx))
+    proba = predictor.predict_store(store, grid.shape, within_range=args.within_range)
+    print(f"Scored {int(np.isfinite(proba).sum())} of {store.n_rows} cells (others: no CRISM coverage"
+          f"{' or outside the training range' if args.within_range else ''} -> NaN)")
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    grid.table({"probability": proba}).to_csv(os.path.join(args.out_dir, OUT_CSV), index=False)
+    print("Saved:", write_grid_tif(os.path.join(args.out_dir, OUT_PROBA_TIF), proba, grid))
+    if args.themis_flags:
+        for slot, layer in slot_layers(proba, read_slot_flags(args.themis_flags, shape=grid.shape)).items():
+            print("Saved:", write_grid_tif(os.path.join(args.out_dir, OUT_SLOT_TIF.format(slot=slot)), layer, grid))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+# rules.py
+# Rule engine for the good_landing_place label. The thresholds of the three pipelines
+# (slope < 10° of pipeline.md, the p60 / p80 quantile rule of crism_scoring.py, the strict
+# slot limits of themis_timeslot_flags_ops.py) live in one declarative file
+# (landing_rules.json) instead of being hand-coded in each module:
+#   columns  -> identifier -> fused column   ("{slot}" entries expand over "slots")
+#   params   -> named constants
+#   define   -> ordered derived arrays ("expr") and quantile references ("quantile": of / q /
+#               where / min_count / fallback), each usable by the entries after it
+#   vetoes   -> ordered checks; a cell is good when every "pass" holds, and its reason code is
+#               the FIRST veto that fails ("good" otherwise)
+# Every expression is parsed once with ast (whitelisted nodes and functions only; and / or /
+# not and chained comparisons become element-wise & | ~), compiled to a code object and then
+# evaluated over whole column arrays, so re-evaluating after a rule change is sub-second.
+#
+#   rules = compile_rules("landing_rules.json")
+#   label, reason = rules.evaluate(store)      # bool (n,), int16 (n,) index into rules.codes
+#
+#   python rules.py --rules landing_rules.json --store /content/jezero_final_ML.store --out landing_labels.csv
+#
+# The rule label is NOT the current training target: on jezero_final_ML.csv the default file marks
+# 345 cells good against 101 in good_landing_place (97.1 % agreement), and vetoes 23 of the 101 as
+# no_operable_slot. Its slot rule is also not the flag_<slot> columns of THEMIS_finalversion_ML.csv
+# (8000 true cells per slot there; 0 / 2245 / 0 / 1042 here), and no simple combination of those
+# flags, the CRISM flag and the slope reproduces the target. Every run prints this comparison;
+# --write-label replaces the target (models trained afterwards learn the rule label, not the old one).
+
+import argparse
+import ast
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from feature_store import LABEL, open_store
+
+GOOD = "good"
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "landing_rules.json")
+OUT_CSV = "landing_labels.csv"
+
+FUNCTIONS = {
+    "isfinite": np.isfinite, "isnan": np.isnan, "abs": np.abs, "where": np.where,
+    "minimum": np.minimum, "maximum": np.maximum, "clip": np.clip, "log10": np.log10, "sqrt": np.sqrt,
+}
+_ALLOWED = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.BoolOp, ast.Call, ast.Name, ast.Load,
+            ast.Constant, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.USub, ast.UAdd, ast.Not, ast.Invert,
+            ast.BitAnd, ast.BitOr, ast.And, ast.Or, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq)
+
+
+class _Elementwise(ast.NodeTransformer):
+    """and / or / not -> & | ~ ; a < b <= c -> (a < b) & (b <= c)."""
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        out = node.values[0]
+        for v in node.values[1:]:
+            out = ast.BinOp(left=out, op=op, right=v)
+        return out
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return ast.UnaryOp(op=ast.Invert(), operand=node.operand)
+        return node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if len(node.ops) == 1:
+            return node
+        left, out = node.left, None
+        for op, right in zip(node.ops, node.comparators):
+            cmp = ast.Compare(left=left, ops=[op], comparators=[right])
+            out = cmp if out is None else ast.BinOp(left=out, op=ast.BitAnd(), right=cmp)
+            left = right
+        return out
+
+
+def compile_expr(text):
+    """(code object, names used) of one rule expression; raises ValueError on anything not whitelisted."""
+    tree = ast.parse(text, mode="eval")
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED):
+            raise ValueError(f"Not allowed in rule expression {text!r}: {type(node).__name__}")
+        if isinstance(node, ast.Call) and not (isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS):
+            raise ValueError(f"Unknown function in rule expression {text!r}")
+    tree = ast.fix_missing_locations(_Elementwise().visit(tree))
+    names = {n.id for n in ast.walk(tree) if isinstance(n, ast.Name)} - set(FUNCTIONS)
+    return compile(tree, f"<rule: {text}>", "eval"), names
+
+
+def _expand(entries, slots):
+    """Repeat every entry containing "{slot}" once per slot (string values formatted)."""
+    def fmt(v, s):
+        if isinstance(v, str):
+            return v.replace("{slot}", s)
+        if isinstance(v, dict):
+            return {fmt(k, s): fmt(x, s) for k, x in v.items()}
+        return v
+
+    out = []
+    for e in entries:
+        if "{slot}" in json.dumps(e):
+            out.extend(fmt(e, s) for s in slots)
+        else:
+            out.append(e)
+    return out
+
+
+class CompiledRules:
+    """A rule file compiled once; evaluate() runs it over any {column: array} mapping."""
+
+    def __init__(self, spec):
+        self.spec = spec
+        slots = spec.get("slots", [])
+        self.columns = {}
+        for k, v in spec.get("columns", {}).items():
+            for s in (slots if "{slot}" in k else [None]):
+                self.columns[k if s is None else k.replace("{slot}", s)] = v if s is None else v.replace("{slot}", s)
+        self.params = {k: float(v) for k, v in spec.get("params", {}).items()}
+        known = set(self.columns) | set(self.params)
+
+        self.steps = []
+        for e in _expand(spec.get("define", []), slots):
+            if "expr" in e:
+                code, names = compile_expr(e["expr"])
+                self.steps.append((e["name"], "expr", code, None))
+            else:
+                q = e["quantile"]
+                where = compile_expr(q["where"]) if "where" in q else (None, set())
+                code, names = compile_expr(q["of"])
+                names = names | where[1] | ({q["fallback"]} if isinstance(q.get("fallback"), str) else set())
+                self.steps.append((e["name"], "quantile", code, dict(q, where=where[0])))
+            self._check(e["name"], names, known)
+            known.add(e["name"])
+
+        self.vetoes = []
+        for v in _expand(spec.get("vetoes", []), slots):
+            code, names = compile_expr(v["pass"])
+            self._check(v["code"], names, known)
+            self.vetoes.append((v["code"], code))
+        self.codes = [c for c, _ in self.vetoes] + [GOOD]
+
+    @staticmethod
+    def _check(name, used, known):
+        missing = sorted(used - known)
+        if missing:
+            raise ValueError(f"Rule '{name}' uses undefined names: {missing}")
+
+    def namespace(self, data):
+        """Columns (as float64 arrays), params and every define step, evaluated in order."""
+        ns = dict(FUNCTIONS)
+        ns.update(self.params)
+        for ident, col in self.columns.items():
+            ns[ident] = np.asarray(data[col], dtype=np.float64)
+        for name, kind, code, q in self.steps:
+            with np.errstate(invalid="ignore"):
+                if kind == "expr":
+                    ns[name] = eval(code, {"__builtins__": {}}, ns)
+                    continue
+                values = np.broadcast_to(eval(code, {"__builtins__": {}}, ns), (self.n_rows(ns),))
+                if q["where"] is not None:
+                    values = values[np.broadcast_to(eval(q["where"], {"__builtins__": {}}, ns), values.shape)]
+                values = values[np.isfinite(values)]
+            if len(values) >= q.get("min_count", 1):
+                ns[name] = float(np.quantile(values, q["q"]))
+            else:
+                fb = q.get("fallback", np.nan)
+                ns[name] = float(ns[fb] if isinstance(fb, str) else fb)
+        return ns
+
+    def n_rows(self, ns):
+        return len(ns[next(iter(self.columns))])
+
+    def evaluate(self, data):
+        """(label bool (n,), reason int16 (n,) index into self.codes; len(vetoes) = "good")."""
+        ns = self.namespace(data)
+        n = self.n_rows(ns)
+        reason = np.full(n, len(self.vetoes), dtype=np.int16)
+        for i in range(len(self.vetoes) - 1, -1, -1):       # last assignment = first failing veto
+            with np.errstate(invalid="ignore"):
+                ok = np.broadcast_to(eval(self.vetoes[i][1], {"__builtins__": {}}, ns), (n,))
+            reason[~ok] = i
+        return reason == len(self.vetoes), reason
+
+    def reason_names(self, reason):
+        return np.asarray(self.codes, dtype=object)[reason]
+
+
+def compile_rules(path=RULES_FILE):
+    with open(path) as f:
+        return CompiledRules(json.load(f))
+
+
+def compare_with_target(rules, label, reason, target):
+    """Print how the rule label differs from an existing 0/1 target (counts, agreement, vetoed positives)."""
+    target = np.asarray(target).astype(bool)
+    print(f"Rule label: {int(label.sum())} good, '{LABEL}': {int(target.sum())} good, "
+          f"agreement {np.mean(label == target):.1%}")
+    lost = np.bincount(reason[target & ~label], minlength=len(rules.codes))
+    for code, n in zip(rules.codes, lost):
+        if n:
+            print(f"  current positives vetoed by {code:<20} {n:>9}")
+    print(f"  new positives (target 0, rules good)       {int((label & ~target).sum()):>9}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Evaluate the landing rule file over the fused feature table.")
+    ap.add_argument("--rules", default=RULES_FILE)
+    ap.add_argument("--store", default="/content/jezero_final_ML.store")
+    ap.add_argument("--csv", default=None, help="fused CSV to convert if the store does not exist")
+    ap.add_argument("--out", default=OUT_CSV)
+    ap.add_argument("--write-label", action="store_true",
+                    help=f"also overwrite the training target '{LABEL}' in the store with the rule label")
+    args = ap.parse_args()
+
+    store = open_store(args.store, csv_path=args.csv)
+    t0 = time.perf_counter()
+    rules = compile_rules(args.rules)
+    label, reason = rules.evaluate(store)
+    print(f"{len(rules.vetoes)} vetoes over {store.n_rows} cells in {time.perf_counter() - t0:.3f} s")
+
+    counts = np.bincount(reason, minlength=len(rules.codes))
+    for code, n in zip(rules.codes, counts):
+        if n:
+            print(f"  {code:<28} {n:>9} ({n / store.n_rows:.1%})")
+    pd.DataFrame({"x": store["x"], "y": store["y"], LABEL: label.astype(np.int8),
+                  "veto_reason": rules.reason_names(reason)}).to_csv(args.out, index=False)
+    print(f"Labels saved to: {args.out}")
+    if LABEL in store:
+        compare_with_target(rules, label, reason, store[LABEL])
+    if args.write_label:
+        store.add_columns({LABEL: label})
+        print(f"'{LABEL}' in {args.store} replaced by the rule label")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,16 +4,24 @@
 
 # mola_slope_roughness.py
 import os
-import re
+import sys
 import numpy as np
-from osgeo import gdal
 import rasterio
-from rasterio.enums import Resampling
-from rasterio.windows import from_bounds
-from scipy.ndimage import generic_filter
+from rasterio.crs import CRS
+from rasterio.transform import Affine
 import matplotlib.pyplot as plt
 import csv
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))   # jezero_grid.py
+from jezero_grid import JEZERO_GRID, GridSpec
+from mola_pds import MolaTile
+from mola_mosaic import MegdrMosaic
+from mola_slope import tile_slope_aspect
+from mola_roughness import roughness_multiscale, ROUGHNESS_WINDOW
+from mola_grid import IntegralImage, grid_rows, write_grid_tables
+from mola_horizon import HorizonMap, THEMIS_SLOTS, horizon_key
+from mola_hazard import hazard_layers
+
 # -----------------------
 # USER CONFIG
 # -----------------------
@@ -21,127 +29,70 @@ DATA_FOLDER = r"C:\Users\zuzia\Documents\GitHub\Winter-School-Project-\MOLA"
 # Label file for the topography product 
 LBL_FILENAME = "megt44n000hb.lbl"
 IMG_FILENAME = "megt44n000hb.img"
+# Any site: lon/lat box (east lon, deg) read across all MEGDR tiles in DATA_FOLDER and used
+# as the grid extent. None = the single tile above and the shared Jezero grid (jezero_grid.py).
+AOI_LONLAT = None   # e.g. (77.27, 18.01, 78.11, 18.81)
+GRID = JEZERO_GRID if AOI_LONLAT is None else GridSpec(AOI_LONLAT)
+AOI_MARGIN_PX = 2   # extra pixels read around the grid (slope / roughness kernels at the border)
 
 # Output names (will be written into DATA_FOLDER)
-OUT_TOPO_TIF = "mola_topography.tif"
+OUT_TOPO_TIF = "mola_topography.tif"   # Jezero AOI crop only (the tile itself is read in place)
 OUT_SLOPE_TIF = "mola_slope_deg.tif"
+OUT_ASPECT_TIF = "mola_aspect_deg.tif"
+SLOPE_METHOD = "horn"   # "horn" | "zt" (Zevenbergen-Thorne) | "planefit"
+OUT_ROUGHNESS_TIF = "mola_roughness.tif"                 # std of elevation, ROUGHNESS_WINDOW px
+OUT_ROUGHNESS_MS_TIF = "mola_roughness_multiscale.tif"  # one band per (metric, window)
+ROUGHNESS_SIZES = (ROUGHNESS_WINDOW, 5, 9)
+GRID_SIZES = (50, 100, 250, 1000)   # cells per side of the jezero_grid_<n>.csv tables
+# Terrain shading for the THEMIS slots (horizon profiles are precomputed once into HORIZON_NPZ)
+SOLAR_LS_DEG = 0.0      # solar longitude of the THEMIS observations (deg)
+HORIZON_NPZ = "mola_horizon.npz"
+OUT_HAZARD_TIF = "mola_hazard_any.tif"   # 1 = slope, relief or crater-rim hazard
 
 # -----------------------
 # Helpers
 # -----------------------
-def read_label_map_scale_km(lbl_path):
-    """Parse MAP_SCALE value (KM/PIXEL) from a PDS3 .lbl file. Returns meters/pixel."""
-    with open(lbl_path, 'r', encoding='utf-8', errors='ignore') as fh:
-        txt = fh.read()
-    # Remove newlines and extra spaces for easier regex matching
-    txt_flat = re.sub(r'[\r\n]+', ' ', txt)
-    txt_flat = re.sub(r'\s+', ' ', txt_flat)
-    # Debug: print a snippet to help diagnose
-    print("[DEBUG] First 500 chars of label:", txt_flat[:500])
-    # look for MAP_SCALE = 3.705 <KM/PIXEL> (case-insensitive)
-    m = re.search(r"MAP_SCALE\s*=\s*([0-9]*\.?[0-9]+)\s*<\s*KM\s*/\s*PIXEL\s*>", txt_flat, re.IGNORECASE)
-    if m:
-        km_per_pixel = float(m.group(1))
-        print(f"[DEBUG] Found MAP_SCALE: {km_per_pixel} KM/PIXEL")
-        return km_per_pixel * 1000.0
-    # fallback: try MAP_RESOLUTION -> pixels/degree and approximate with mean metres per degree
-    m2 = re.search(r"MAP_RESOLUTION\s*=\s*([0-9]*\.?[0-9]+)\s*<\s*PIXEL\s*/\s*DEGREE\s*>", txt_flat, re.IGNORECASE)
-    if m2:
-        pix_per_deg = float(m2.group(1))
-        print(f"[DEBUG] Found MAP_RESOLUTION: {pix_per_deg} PIXEL/DEGREE")
-        meters_per_deg = 59200.0
-        deg_per_pix = 1.0 / pix_per_deg
-        return deg_per_pix * meters_per_deg
-    raise RuntimeError("Could not parse MAP_SCALE or MAP_RESOLUTION from label file.\nLabel snippet:\n" + txt_flat[:500])
-
 def ensure_file_exists(path):
     if not os.path.exists(path):
         raise FileNotFoundError(f"Required file not found: {path}")
 
 # -----------------------
-# 0. Check files exist
-# -----------------------
-lbl_path = os.path.join(DATA_FOLDER, LBL_FILENAME)
-img_path = os.path.join(DATA_FOLDER, IMG_FILENAME)
-ensure_file_exists(lbl_path)
-ensure_file_exists(img_path)
-
+# 0-2. Memory-map the PDS tile(s) and read only the AOI window (no full GeoTIFF conversion)
 # -----------------------
-# 1. Convert PDS (label) -> GeoTIFF (if not exists)
-# -----------------------
-out_topo_tif_path = os.path.join(DATA_FOLDER, OUT_TOPO_TIF)
-if os.path.exists(out_topo_tif_path):
-    print("✅ Topography GeoTIFF already exists:", out_topo_tif_path)
+if AOI_LONLAT is not None:
+    print("📥 Indexing MEGDR tiles (labels parsed once, .img memory-mapped on demand)...")
+    dem = MegdrMosaic(DATA_FOLDER)
+    print(f"📍 Cropping to lon/lat box {AOI_LONLAT}...")
+    topo, transform = dem.read_lonlat(*AOI_LONLAT)  # grid extent; border cells use one-sided kernels
 else:
-    print("🔄 Converting PDS topography to GeoTIFF...")
-    # Try multiple ways to open the PDS/IMG because some GDAL builds may not register the PDS driver
-    ds = None
-    candidates = [
-        f"PDS:{lbl_path}",
-        f"PDS:{img_path}",
-        lbl_path,
-        img_path,
-        lbl_path.replace('\\', '/'),
-        img_path.replace('\\', '/'),
-    ]
-    for candidate in candidates:
-        try:
-            ds = gdal.Open(candidate)
-        except Exception:
-            ds = None
-        if ds is not None:
-            print("Opened with GDAL:", candidate)
-            break
-
-    # Print whether the PDS driver is available (helps debugging)
-    try:
-        driver_count = gdal.GetDriverCount()
-        has_pds = any(gdal.GetDriver(i).ShortName == 'PDS' for i in range(driver_count))
-    except Exception:
-        has_pds = False
-    print("GDAL PDS driver available:", has_pds)
-
-    if ds is None:
-        raise RuntimeError(f"GDAL could not open PDS label or image: {lbl_path} / {img_path}\nTried candidates: {candidates}\nIf the PDS driver is missing in your GDAL build, consider installing a GDAL package that includes the PDS driver or use rasterio to read the raw .img directly.")
-    # Translate to GeoTIFF
-    gdal.Translate(out_topo_tif_path, ds, format="GTiff")
-    ds = None
-    print("💾 Converted to:", out_topo_tif_path)
+    lbl_path = os.path.join(DATA_FOLDER, LBL_FILENAME)
+    img_path = os.path.join(DATA_FOLDER, IMG_FILENAME)
+    ensure_file_exists(lbl_path)
+    ensure_file_exists(img_path)
 
-# -----------------------
-# 2. Load GeoTIFF with rasterio (CROP TO JEZERO CRATER)
-# -----------------------
-print("📥 Loading topography GeoTIFF with rasterio...")
+    print("📥 Opening MOLA PDS tile (label parsed once, .img memory-mapped)...")
+    dem = MolaTile(lbl_path, img_path)
+    print(dem.bounds)
 
-# Jezero Crater bounding box in METERS (east longitudes)
+    # Jezero Crater bounding box in METERS (east longitudes): the shared grid in the tile's EQC
+    jezero_left, jezero_bottom, jezero_right, jezero_top = GRID.bounds_in(dem.crs_proj4)
+    margin = AOI_MARGIN_PX * dem.pixel_size_m
+    jezero_left, jezero_bottom = jezero_left - margin, jezero_bottom - margin
+    jezero_right, jezero_top = jezero_right + margin, jezero_top + margin
 
-# jezero_left   = 4580787.111167222  # meters (≈ 74.5°E)
-# jezero_right  = 4630877.603791111   # meters (≈ 80.0°E)
-# jezero_bottom = 1068155.337734444    # meters (≈ 16.5°N)
-# jezero_top    = 1115709.447046667   # meters (≈ 20.0°N)
-
-jezero_left = -6086970
-jezero_right = -6041410
-jezero_bottom = 1068460
-jezero_top = 1115460
-
-
-with rasterio.open(out_topo_tif_path) as src:
     print("📍 Cropping to Jezero region (meters)...")
-    print(src.bounds)
-    # Create window using bounds directly
-    window = from_bounds(
-        left=jezero_left,
-        bottom=jezero_bottom,
-        right=jezero_right,
-        top=jezero_top,
-        transform=src.transform
-    )
-
-    topo = src.read(1, window=window).astype(np.float64)
-    transform = src.window_transform(window)
-    profile = src.profile.copy()
-    nodata = src.nodata
+    # Only the AOI rows/columns are read from disk (the window is a view of the memmap)
+    topo, transform = dem.read_window(jezero_left, jezero_bottom, jezero_right, jezero_top)
+transform = Affine(*transform)
+nodata = None  # nodata (if any in the label) is already NaN
+profile = {
+    "driver": "GTiff",
+    "count": 1,
+    "dtype": "float32",
+    "crs": CRS.from_string(dem.crs_proj4),
+    "transform": transform,
+    "nodata": np.nan,
+}
 
 # Update profile size
 profile.update({
@@ -157,41 +108,24 @@ if topo.shape[0] < 2 or topo.shape[1] < 2:
     print(f"❌ Cropped region too small for calculations: shape={topo.shape}. Expand bounds.")
     exit(1)
 
-# Replace nodata with NaN for computations
-if nodata is not None:
-    topo = np.where(topo == nodata, np.nan, topo)
-else:
-    topo = topo.astype(np.float64)
-    topo[np.isneginf(topo) | np.isposinf(topo)] = np.nan
+# Replace non-finite values with NaN for computations (nodata is handled by the reader)
+topo[np.isneginf(topo) | np.isposinf(topo)] = np.nan
 
 # -----------------------
-# 3. Determine pixel size in meters
-#    Prefer reading MAP_SCALE from .lbl (KM/pixel)
+# 3-4. Compute S1: Slope and aspect (degrees)
+#    Pixel spacing from MAP_SCALE and the EQC projection of the tile: along x it is
+#    MAP_SCALE·cos(lat) evaluated for every row (not a single centre latitude)
 # -----------------------
-pixel_size_m = read_label_map_scale_km(lbl_path)
-print(f"ℹ️ Using pixel size = {pixel_size_m:.2f} m/pixel (from MAP_SCALE in label)")
+print(f"ℹ️ Using pixel size = {dem.pixel_size_m:.2f} m/pixel (from MAP_SCALE in label)")
+print(f"🔢 Computing slope and aspect (degrees, {SLOPE_METHOD} kernel)...")
+slope_deg, aspect_deg = tile_slope_aspect(topo, transform, dem, method=SLOPE_METHOD)
 
 # -----------------------
-# 4. Compute S1: Simple slope (degrees)
-#    Using central differences via numpy.gradient which handles NaN by producing NaN
+# 5. Compute S2: Roughness (multi-scale, running-sum filters)
 # -----------------------
-print("🔢 Computing slope (degrees)...")
-# Calculate pixel spacing in degrees
-pixel_deg = 1 / 128.0  # 128 pixels per degree
-# Mars mean radius in meters
-mars_radius = 3396000.0
-# Center latitude in degrees (Jezero Crater)
-center_lat = 18.4
-# Convert degree spacing to meters
-lat_spacing_m = (np.pi / 180) * mars_radius * pixel_deg
-lon_spacing_m = (np.pi / 180) * mars_radius * pixel_deg * np.cos(np.deg2rad(center_lat))
-# Use these spacings in np.gradient
-dz_dy, dz_dx = np.gradient(topo, lat_spacing_m, lon_spacing_m)
-slope_rad = np.arctan(np.sqrt(dz_dx**2 + dz_dy**2))
-slope_deg = np.degrees(slope_rad)
-
-# mask slope where topo is nan
-slope_deg = np.where(np.isnan(topo), np.nan, slope_deg)
+print("🔢 Computing roughness...")
+rough_ms = roughness_multiscale(topo, sizes=ROUGHNESS_SIZES)
+roughness = rough_ms[("std", ROUGHNESS_WINDOW)]   # avg_roughness = local std of elevation (m)
 
 # -----------------------
 # 6. Prepare profile and save outputs as GeoTIFFs
@@ -212,36 +146,78 @@ def save_tif(path, array, profile):
         dst.write(arr, 1)
     print("Saved:", path)
 
-save_tif(os.path.join(DATA_FOLDER, OUT_TOPO_TIF), topo, out_profile)  # overwrite / confirm topo
+save_tif(os.path.join(DATA_FOLDER, OUT_TOPO_TIF), topo, out_profile)  # AOI topography
 save_tif(os.path.join(DATA_FOLDER, OUT_SLOPE_TIF), slope_deg, out_profile)
+save_tif(os.path.join(DATA_FOLDER, OUT_ASPECT_TIF), aspect_deg, out_profile)
+save_tif(os.path.join(DATA_FOLDER, OUT_ROUGHNESS_TIF), roughness, out_profile)
+
+ms_keys = sorted(rough_ms)
+with rasterio.open(os.path.join(DATA_FOLDER, OUT_ROUGHNESS_MS_TIF), 'w',
+                   **{**out_profile, "count": len(ms_keys)}) as dst:
+    for b, key in enumerate(ms_keys, start=1):
+        dst.write(rough_ms[key], b)
+        dst.set_band_description(b, f"{key[0]}_{key[1]}px")
+print("Saved:", os.path.join(DATA_FOLDER, OUT_ROUGHNESS_MS_TIF))
 
 # -----------------------
-# 7. Export slope grid to CSV
+# 7. Export slope / roughness grid to CSV
 # -----------------------
 
-n_bins_x = 100
-n_bins_y = 100
-height, width = slope_deg.shape
-bin_height = height // n_bins_y
-bin_width = width // n_bins_x
-
-rows = []
-for i in range(n_bins_y):
-    for j in range(n_bins_x):
-        y_start = i * bin_height
-        y_end = (i + 1) * bin_height if i < n_bins_y - 1 else height
-        x_start = j * bin_width
-        x_end = (j + 1) * bin_width if j < n_bins_x - 1 else width
-        bin_slope = slope_deg[y_start:y_end, x_start:x_end]
-        avg_slope = np.nanmean(bin_slope)
-        rows.append([j, i, avg_slope])
-
-csv_path = os.path.join(DATA_FOLDER, "jezero_slope_grid.csv")
+# Integral images (value sum + valid count) built once: the mean of any cell is 4 lookups,
+# so every grid size below comes from the same two tables.
+layers = {"slope": IntegralImage(slope_deg), "roughness": IntegralImage(roughness)}
+# cells of the shared grid as pixel rectangles of this AOI (same ground cells as THEMIS / CRISM)
+grid_edges = GRID.pixel_edges(dem.crs_proj4, transform, topo.shape)
+
+csv_path = os.path.join(DATA_FOLDER, "jezero_slope_grid.csv")   # 100×100 table used by the ML fusion
 with open(csv_path, "w", newline="") as f:
     writer = csv.writer(f)
-    writer.writerow(["x", "y", "avg_slope"])
-    writer.writerows(rows)
-print(f"✅ Exported slope grid to {csv_path}")
+    writer.writerow(["x", "y", "avg_slope", "avg_roughness"])
+    writer.writerows(grid_rows(layers, GRID.nx, GRID.ny, grid_edges))
+print(f"✅ Exported slope/roughness grid to {csv_path}")
+
+for n, path in write_grid_tables(layers, DATA_FOLDER, sizes=GRID_SIZES,
+                                  grid=GRID, crs=dem.crs_proj4, transform=transform).items():
+    print(f"✅ Exported {n}×{n} grid to {path}")
+
+# -----------------------
+# 7b. Terrain shadow / solar incidence for the THEMIS slots (grid features)
+# -----------------------
+horizon_path = os.path.join(DATA_FOLDER, HORIZON_NPZ)
+hz_key = horizon_key(topo, transform, dem.crs_proj4, radius_m=dem.radius_m)
+hz = HorizonMap.load(horizon_path) if os.path.exists(horizon_path) else None
+if hz is None or hz.key != hz_key:   # other AOI / transform / CRS / parameters / DEM: recompute
+    print("🔢 Precomputing horizon profiles (once per AOI)...")
+    hz = HorizonMap.from_dem(topo, transform, radius_m=dem.radius_m, crs=dem.crs_proj4)
+    hz.save(horizon_path)
+
+illum = {}
+for slot, (shadow, cos_inc) in hz.slot_maps(SOLAR_LS_DEG, THEMIS_SLOTS).items():
+    illum[f"shadow_frac_{slot}"] = IntegralImage(shadow)
+    illum[f"cos_incidence_{slot}"] = IntegralImage(cos_inc)
+
+illum_csv = os.path.join(DATA_FOLDER, "jezero_illumination_grid.csv")
+with open(illum_csv, "w", newline="") as f:
+    writer = csv.writer(f)
+    writer.writerow(["x", "y"] + list(illum))
+    writer.writerows(grid_rows(illum, GRID.nx, GRID.ny, grid_edges))
+print(f"✅ Exported shadow/incidence grid to {illum_csv}")
+
+# -----------------------
+# 7c. Hazard layers (relief, crater rims, slope > 10°) and per-cell hazard fractions
+# -----------------------
+print("🔢 Computing hazard layers (FFT convolutions)...")
+hazards = hazard_layers(topo, slope_deg, dem.pixel_size_m)
+save_tif(os.path.join(DATA_FOLDER, OUT_HAZARD_TIF), hazards["hazard_any"], out_profile)
+
+haz = {f"frac_{k}": IntegralImage(hazards[k])
+       for k in ("hazard_slope", "hazard_relief", "hazard_crater", "hazard_any")}
+hazard_csv = os.path.join(DATA_FOLDER, "jezero_hazard_grid.csv")
+with open(hazard_csv, "w", newline="") as f:
+    writer = csv.writer(f)
+    writer.writerow(["x", "y"] + list(haz))
+    writer.writerows(grid_rows(haz, GRID.nx, GRID.ny, grid_edges))
+print(f"✅ Exported hazard fractions to {hazard_csv}")
 
 # -----------------------
 # 8. Quick plotting
@@ -0,0 +1,101 @@
+# mola_grid.py
+# Grid aggregation of MOLA rasters (slope, roughness, ...) through summed-area tables.
+# Each raster is turned ONCE into two integral images (sum of valid values, count of valid
+# pixels); the NaN-aware mean of any rectangle is then 4 lookups per table, so a grid of
+# any size (50, 100, 250, 1000 cells per side) costs O(cells), not O(pixels).
+#
+# Cells are the shared lon/lat cells of jezero_grid.GridSpec when edges come from
+# grid.pixel_edges(); without a grid, edges follow the original 100×100 export loop
+# (bin = size // n pixels, the last cell takes the remainder). With more cells than pixels
+# the result differs from that loop: its bin was 0 pixels, so every cell but the last came
+# out NaN; here each cell takes the pixel it falls in (nearest-pixel upsampling).
+
+import csv
+import os
+import numpy as np
+
+GRID_SIZES = (50, 100, 250, 1000)
+
+
+class IntegralImage:
+    """Summed-area tables of values and valid counts of a 2-D raster (NaN = no data)."""
+
+    def __init__(self, arr):
+        a = np.asarray(arr, dtype=np.float64)
+        valid = np.isfinite(a)
+        self.shape = a.shape
+        self.sum = np.zeros((a.shape[0] + 1, a.shape[1] + 1), dtype=np.float64)
+        self.count = np.zeros(self.sum.shape, dtype=np.int64)
+        np.cumsum(np.cumsum(np.where(valid, a, 0.0), axis=0), axis=1, out=self.sum[1:, 1:])
+        np.cumsum(np.cumsum(valid, axis=0, dtype=np.int64), axis=1, out=self.count[1:, 1:])
+
+    @staticmethod
+    def _rect(t, r0, r1, c0, c1):
+        return t[r1, c1] - t[r0, c1] - t[r1, c0] + t[r0, c0]
+
+    def rect_sum(self, r0, r1, c0, c1):
+        """(sum, count) over rows r0:r1, cols c0:c1; bounds may be broadcastable index arrays."""
+        return self._rect(self.sum, r0, r1, c0, c1), self._rect(self.count, r0, r1, c0, c1)
+
+    def rect_mean(self, r0, r1, c0, c1):
+        s, n = self.rect_sum(r0, r1, c0, c1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(n > 0, s / np.maximum(n, 1), np.nan)
+
+
+def grid_edges(size, n):
+    """
+    (start, end) pixel index of each of the n cells along an axis of `size` pixels.
+    n <= size: same bins as the original export loop. n > size: one pixel per cell (the
+    original loop gave empty bins, i.e. NaN, for every cell but the last).
+    """
+    i = np.arange(n)
+    if n <= size:
+        step = size // n
+        start = i * step
+        end = np.where(i < n - 1, (i + 1) * step, size)
+    else:
+        start = (i * size) // n
+        end = start + 1
+    return start, end
+
+
+def grid_means(integral, nx, ny, edges=None):
+    """(ny, nx) NaN-aware cell means of the raster behind `integral`; edges = (r0, r1, c0, c1)."""
+    if edges is None:
+        H, W = integral.shape
+        (r0, r1), (c0, c1) = grid_edges(H, ny), grid_edges(W, nx)
+    else:
+        r0, r1, c0, c1 = edges
+    return integral.rect_mean(r0[:, None], r1[:, None], c0[None, :], c1[None, :])
+
+
+def grid_rows(layers, nx, ny, edges=None):
+    """Rows [x, y, <layer>...] in the order of the original export (y outer, x inner)."""
+    means = [grid_means(ii, nx, ny, edges).ravel() for ii in layers.values()]
+    yy, xx = np.divmod(np.arange(nx * ny), nx)
+    return [[int(x), int(y), *vals] for x, y, *vals in zip(xx, yy, *means)]
+
+
+def write_grid_tables(layers, out_dir, sizes=GRID_SIZES, name="jezero_grid_{n}.csv",
+                      grid=None, crs=None, transform=None):
+    """
+    One CSV per grid size from the same integral images.
+    layers: {"slope": IntegralImage, "roughness": IntegralImage, ...} -> columns avg_slope, ...
+    grid/crs/transform: n×n cells of grid.with_shape((n, n)) over a raster with this geometry.
+    Returns {n: path}.
+    """
+    header = ["x", "y"] + [f"avg_{k}" for k in layers]
+    paths = {}
+    for n in sizes:
+        path = os.path.join(out_dir, name.format(n=n))
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            edges = None
+            if grid is not None:
+                shape = next(iter(layers.values())).shape
+                edges = grid.with_shape((n, n)).pixel_edges(crs, transform, shape)
+            writer.writerows(grid_rows(layers, n, n, edges))
+        paths[n] = path
+    return paths
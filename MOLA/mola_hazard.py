@@ -0,0 +1,200 @@
+# mola_hazard.py
+# Landing hazard layers from a DEM ("slope < 10° and hazard flags" in pipeline.md).
+# All large-window operators are FFT convolutions (scipy.signal.oaconvolve, overlap-add),
+# so their cost does not grow with the kernel area:
+# - local_relief_percentiles -> robust relief P_hi - P_lo of the elevation inside a disk of
+#                               radius r: local elevation histogram = one FFT convolution
+#                               of the "z <= bin edge" indicator per bin, percentiles
+#                               interpolated inside the bin
+# - multiscale_relief        -> that relief for several radii (metres -> pixels)
+# - crater_response          -> normalized cross-correlation with a crater template
+#                               (parabolic bowl + raised rim) over several radii; max NCC
+#                               and the radius that produced it
+# - hazard_layers            -> per-pixel boolean hazards (slope, relief, crater) + "any"
+# NaN = no data everywhere (normalized convolution with the valid-pixel mask).
+# Kernel radii are in metres but capped in pixels: when the largest kernel would exceed
+# MAX_KERNEL_PX, relief and crater layers are computed on a NaN-aware block mean of the DEM
+# (factor coarse_factor(), so kernels stay <= MAX_KERNEL_PX coarse pixels) and repeated back
+# to full resolution; slope stays at full resolution. On MOLA MEGDR (463 m/px) the factor is 1.
+# For large DTMs use the "hazard" operator of mola_tiled.py: it builds the coarse DEM and the
+# global elevation range (bin edges) once, so tiles agree at their seams.
+
+import numpy as np
+from scipy.signal import oaconvolve
+
+SLOPE_MAX_DEG = 10.0
+RELIEF_RADII_M = (1500.0, 5000.0)        # disk radii for the relief layers
+RELIEF_Q = (0.05, 0.95)
+RELIEF_MAX_M = 150.0                     # robust relief above this (at the smallest radius) = hazard
+RELIEF_BINS = 64
+CRATER_RADII_M = (1500.0, 3000.0, 6000.0)
+CRATER_NCC_MIN = 0.6
+MAX_KERNEL_PX = 96                       # largest kernel radius (px) before the DEM is block-averaged
+
+
+def disk_kernel(r_px):
+    r = max(1, int(round(r_px)))
+    yy, xx = np.mgrid[-r:r + 1, -r:r + 1]
+    return (xx * xx + yy * yy <= r * r).astype(np.float64)
+
+
+def _conv(a, k):
+    return oaconvolve(a, k, mode="same")
+
+
+def _radius_px(r_m, pixel_m):
+    return max(1, int(round(r_m / pixel_m)))
+
+
+def kernel_halo(pixel_m, relief_radii_m=RELIEF_RADII_M, crater_radii_m=CRATER_RADII_M):
+    """Largest kernel radius (px at pixel_m): halo for tiled processing."""
+    return max([_radius_px(r, pixel_m) for r in relief_radii_m] +
+               [int(np.ceil(1.5 * _radius_px(r, pixel_m))) for r in crater_radii_m])
+
+
+def coarse_factor(pixel_m, relief_radii_m=RELIEF_RADII_M, crater_radii_m=CRATER_RADII_M,
+                  max_kernel_px=MAX_KERNEL_PX):
+    """Block-mean factor that keeps the largest relief / crater kernel within max_kernel_px."""
+    largest = max([r / pixel_m for r in relief_radii_m] + [1.5 * r / pixel_m for r in crater_radii_m])
+    return max(1, int(np.ceil(largest / max_kernel_px)))
+
+
+def block_mean(z, f):
+    """NaN-aware mean of f×f blocks (partial blocks at the bottom / right edge)."""
+    z = np.asarray(z, dtype=np.float64)
+    if f == 1:
+        return z
+    H, W = z.shape
+    Hc, Wc = -(-H // f), -(-W // f)
+    pad = np.full((Hc * f, Wc * f), np.nan)
+    pad[:H, :W] = z
+    blocks = pad.reshape(Hc, f, Wc, f)
+    valid = np.isfinite(blocks)
+    n = valid.sum(axis=(1, 3))
+    s = np.where(valid, blocks, 0.0).sum(axis=(1, 3))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 0, s / n, np.nan)
+
+
+def repeat_blocks(a, f, row0, col0, shape):
+    """Full-resolution view of a coarse layer: pixel (row0 + i, col0 + j) takes cell ((row0 + i) // f, (col0 + j) // f)."""
+    return a[np.ix_((row0 + np.arange(shape[0])) // f, (col0 + np.arange(shape[1])) // f)]
+
+
+# ===========================
+# Relief
+# ===========================
+
+def local_relief_percentiles(z, radius_px, q=RELIEF_Q, n_bins=RELIEF_BINS, z_range=None):
+    """
+    Local elevation percentiles q inside a disk of radius_px: tuple of arrays (NaN where z is NaN).
+    z_range: (lo, hi) of the bin edges; default = range of z (pass the global range for tiles).
+    """
+    z = np.asarray(z, dtype=np.float64)
+    valid = np.isfinite(z)
+    disk = disk_kernel(radius_px)
+    n = np.maximum(_conv(valid.astype(np.float64), disk), 1e-9)
+    lo, hi = (np.nanmin(z), np.nanmax(z)) if z_range is None else map(float, z_range)
+    edges = np.linspace(lo, hi, n_bins + 1)
+    edges[-1] = hi + 1e-9 * max(1.0, abs(hi))
+    out = [np.full(z.shape, np.nan) for _ in q]
+    prev = np.zeros(z.shape)
+    for b in range(n_bins):
+        cdf = np.clip(_conv((valid & (z <= edges[b + 1])).astype(np.float64), disk) / n, 0.0, 1.0)
+        for k, qk in enumerate(q):
+            hit = np.isnan(out[k]) & (cdf >= qk)
+            if hit.any():
+                frac = (qk - prev[hit]) / np.maximum(cdf[hit] - prev[hit], 1e-12)
+                out[k][hit] = edges[b] + np.clip(frac, 0.0, 1.0) * (edges[b + 1] - edges[b])
+        prev = cdf
+    for a in out:
+        a[~valid] = np.nan
+    return tuple(out)
+
+
+def multiscale_relief(z, pixel_m, radii_m=RELIEF_RADII_M, q=RELIEF_Q, n_bins=RELIEF_BINS, z_range=None):
+    """{radius_m: robust relief P_q[1] - P_q[0] (m)} for every radius."""
+    out = {}
+    for r_m in radii_m:
+        p_lo, p_hi = local_relief_percentiles(z, _radius_px(r_m, pixel_m), q, n_bins, z_range)
+        out[r_m] = (p_hi - p_lo).astype(np.float32)
+    return out
+
+
+# ===========================
+# Crater / rim template matching
+# ===========================
+
+def crater_template(r_px):
+    """Zero-mean crater profile (bowl inside r, raised rim at r) on a disk of radius 1.5·r."""
+    R = int(np.ceil(1.5 * r_px))
+    yy, xx = np.mgrid[-R:R + 1, -R:R + 1]
+    rho = np.hypot(xx, yy) / r_px
+    t = np.where(rho < 1.0, rho ** 2 - 1.0, 0.0) + 0.3 * np.exp(-((rho - 1.0) / 0.25) ** 2)
+    support = rho <= 1.5
+    t = np.where(support, t - t[support].mean(), 0.0)
+    return t, support.astype(np.float64)
+
+
+def crater_response(z, pixel_m, radii_m=CRATER_RADII_M, z_ref=None):
+    """
+    (max normalized cross-correlation over radii, radius_m of the max); NaN where z is NaN.
+    z_ref: elevation subtracted before the convolutions (default: mean of z; fixed for tiles).
+    """
+    z = np.asarray(z, dtype=np.float64)
+    valid = np.isfinite(z)
+    zf = np.where(valid, z - (np.nanmean(z) if z_ref is None else z_ref), 0.0)
+    best = np.full(z.shape, -np.inf)
+    best_r = np.full(z.shape, np.nan)
+    for r_m in radii_m:
+        t, support = crater_template(_radius_px(r_m, pixel_m))
+        n = support.sum()
+        s1, s2 = _conv(zf, support), _conv(zf * zf, support)
+        energy = np.maximum(s2 - s1 * s1 / n, 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ncc = _conv(zf, t[::-1, ::-1]) / (np.sqrt((t * t).sum() * energy) + 1e-12)
+        better = ncc > best
+        best[better] = ncc[better]
+        best_r[better] = r_m
+    best[~valid] = np.nan
+    best_r[~valid] = np.nan
+    return best.astype(np.float32), best_r.astype(np.float32)
+
+
+# ===========================
+# Hazard layers
+# ===========================
+
+def context_layers(z, pixel_m, relief_radii_m=RELIEF_RADII_M, crater_radii_m=CRATER_RADII_M, z_range=None):
+    """Continuous layers relief_<r>m, crater_ncc, crater_radius_m of z (already at the kernel resolution)."""
+    out = {f"relief_{int(r)}m": a for r, a in multiscale_relief(z, pixel_m, relief_radii_m, z_range=z_range).items()}
+    z_ref = None if z_range is None else 0.5 * (z_range[0] + z_range[1])
+    out["crater_ncc"], out["crater_radius_m"] = crater_response(z, pixel_m, crater_radii_m, z_ref)
+    return out
+
+
+def hazard_layers(z, slope_deg, pixel_m, slope_max=SLOPE_MAX_DEG, relief_radii_m=RELIEF_RADII_M,
+                  relief_max_m=RELIEF_MAX_M, crater_radii_m=CRATER_RADII_M, ncc_min=CRATER_NCC_MIN,
+                  max_kernel_px=MAX_KERNEL_PX, context=None):
+    """
+    Per-pixel hazard rasters. Returns a dict of float32 arrays (NaN outside the DEM):
+      relief_<r>m, crater_ncc, crater_radius_m                       (continuous layers)
+      hazard_slope, hazard_relief, hazard_crater, hazard_any         (0/1 flags)
+    context: the continuous layers at the resolution of z, if already computed (mola_tiled);
+    otherwise computed here, on a block mean of z when the kernels exceed max_kernel_px.
+    """
+    valid = np.isfinite(z)
+    if context is None:
+        f = coarse_factor(pixel_m, relief_radii_m, crater_radii_m, max_kernel_px)
+        context = {k: repeat_blocks(a, f, 0, 0, z.shape) for k, a in
+                   context_layers(block_mean(z, f), pixel_m * f, relief_radii_m, crater_radii_m).items()}
+    flags = {
+        "hazard_slope": slope_deg > slope_max,
+        "hazard_relief": context[f"relief_{int(relief_radii_m[0])}m"] > relief_max_m,
+        "hazard_crater": context["crater_ncc"] > ncc_min,
+    }
+    flags["hazard_any"] = flags["hazard_slope"] | flags["hazard_relief"] | flags["hazard_crater"]
+    out = {k: np.where(valid, a, np.nan).astype(np.float32) for k, a in context.items()}
+    for k, f in flags.items():
+        out[k] = np.where(valid, f, np.nan).astype(np.float32)
+    return out
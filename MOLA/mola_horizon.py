@@ -0,0 +1,190 @@
+# mola_horizon.py
+# Terrain horizon, cast shadows and solar incidence from the MOLA DEM, for the THEMIS
+# time slots (5:30 AM, 7:00 AM, 6:30 PM, 7:00 PM local true solar time).
+# - horizon_angles -> per-pixel horizon elevation angle for N_AZIMUTHS directions, computed
+#                     once with a vectorized line scan: for every azimuth the whole DEM is
+#                     compared with itself shifted along the ray (dense steps near the pixel,
+#                     geometric steps further out), keeping the running max of the elevation
+#                     angle (Mars curvature drop d²/2R included).
+# - HorizonMap     -> after the precompute, shadow masks and cos(incidence) for any sun
+#                     position are a lookup + interpolation between the two nearest azimuths,
+#                     so every LST slot / season costs O(pixels).
+# Sun position from local true solar time and solar longitude Ls (declination from the
+# Mars obliquity); azimuths are degrees clockwise from north, like the aspect of mola_slope.
+# A saved HorizonMap carries the key of its input (shape, transform, CRS, parameters, DEM
+# checksum); callers reuse it only when horizon_key() of the current run is equal.
+
+import json
+import math
+import zlib
+import numpy as np
+
+from mola_slope import row_spacing, slope_aspect
+
+MARS_R = 3396190.0
+MARS_OBLIQUITY_DEG = 25.19
+
+N_AZIMUTHS = 32
+MAX_DIST_M = 50000.0     # horizon search radius
+DENSE_STEPS = 16         # first steps every pixel, then distance grows by STEP_GROWTH
+STEP_GROWTH = 1.1
+
+THEMIS_SLOTS = {"5_30AM": 5.5, "7_00AM": 7.0, "6_30PM": 18.5, "7_00PM": 19.0}   # LTST hours
+
+
+# ===========================
+# Sun position
+# ===========================
+
+def solar_position(lat_deg, lst_hours, ls_deg, obliquity_deg=MARS_OBLIQUITY_DEG):
+    """(elevation, azimuth) of the sun in degrees; lat_deg may be an array (e.g. per row)."""
+    lat = np.radians(lat_deg)
+    dec = math.asin(math.sin(math.radians(obliquity_deg)) * math.sin(math.radians(ls_deg)))
+    h = math.radians(15.0 * (lst_hours - 12.0))
+    sin_el = np.sin(lat) * math.sin(dec) + np.cos(lat) * math.cos(dec) * math.cos(h)
+    el = np.degrees(np.arcsin(np.clip(sin_el, -1.0, 1.0)))
+    az = np.degrees(np.arctan2(-math.cos(dec) * math.sin(h),
+                               np.cos(lat) * math.sin(dec) - np.sin(lat) * math.cos(dec) * math.cos(h))) % 360.0
+    return el, az
+
+
+# ===========================
+# Horizon precompute
+# ===========================
+
+def ray_distances(max_dist_m, step_m, dense=DENSE_STEPS, growth=STEP_GROWTH):
+    """Sample distances along a ray: every pixel up to `dense` pixels, then geometric."""
+    d = list(step_m * np.arange(1, dense + 1))
+    while d[-1] * growth < max_dist_m:
+        d.append(d[-1] * growth)
+    return np.array(d)
+
+
+def _shift(d, n):
+    """(source slice, target slice) pairing index i with i + d along an axis of length n."""
+    return (slice(0, n - d), slice(d, n)) if d >= 0 else (slice(-d, n), slice(0, n + d))
+
+
+def horizon_angles(z, dx_rows, dy, n_azimuths=N_AZIMUTHS, max_dist_m=MAX_DIST_M, radius_m=MARS_R):
+    """
+    Horizon elevation angle (deg) for each azimuth: (n_azimuths, H, W) float32.
+    -90 where no DEM sample lies along the ray (open sky), NaN where z is NaN.
+    dx_rows: (H,) ground spacing per row, dy: spacing along columns (m).
+    """
+    z = np.asarray(z, dtype=np.float64)
+    H, W = z.shape
+    dx_rows = np.broadcast_to(np.asarray(dx_rows, dtype=np.float64), (H,))
+    zt = np.where(np.isnan(z), -np.inf, z)       # no-data never blocks the sun
+    dxm = float(dx_rows.mean())
+    dists = ray_distances(max_dist_m, min(dxm, dy))
+    azimuths = np.arange(n_azimuths) * (360.0 / n_azimuths)
+    out = np.empty((n_azimuths, H, W), dtype=np.float32)
+    best = np.empty((H, W))
+    for k, az in enumerate(np.radians(azimuths)):
+        best.fill(-np.inf)
+        seen = set()
+        for d in dists:
+            dc, dr = int(round(d * math.sin(az) / dxm)), int(round(-d * math.cos(az) / dy))
+            if (dr, dc) in seen or (dr == 0 and dc == 0) or abs(dr) >= H or abs(dc) >= W:
+                continue
+            seen.add((dr, dc))
+            sr, tr = _shift(dr, H)
+            sc, tc = _shift(dc, W)
+            dist = np.hypot(dc * dx_rows[sr], dr * dy)[:, None]          # true ground distance
+            tan = (zt[tr, tc] - z[sr, sc] - dist * dist / (2.0 * radius_m)) / dist
+            np.fmax(best[sr, sc], tan, out=best[sr, sc])
+        out[k] = np.degrees(np.arctan(best))
+    out[:, np.isnan(z)] = np.nan
+    return out, azimuths
+
+
+def horizon_key(z, transform, crs=None, radius_m=MARS_R, n_azimuths=N_AZIMUTHS, max_dist_m=MAX_DIST_M,
+                slope_method="horn"):
+    """JSON-safe description of everything a HorizonMap depends on (compare with HorizonMap.key)."""
+    key = {"shape": list(z.shape), "transform": [float(v) for v in tuple(transform)[:6]],
+           "crs": None if crs is None else str(crs), "radius_m": float(radius_m),
+           "n_azimuths": int(n_azimuths), "max_dist_m": float(max_dist_m), "slope_method": slope_method,
+           "dem_crc32": zlib.crc32(np.ascontiguousarray(z, dtype=np.float32).tobytes())}
+    return json.loads(json.dumps(key))
+
+
+class HorizonMap:
+    """
+    Horizon profiles of a DEM, computed once, plus slope/aspect for incidence.
+        hz = HorizonMap.from_dem(topo, transform, radius_m=tile.radius_m)
+        shadow = hz.shadow(7.0, ls_deg=90)          # bool (H, W)
+        cos_i  = hz.cos_incidence(7.0, ls_deg=90)   # 0 in shadow / at night
+    """
+
+    def __init__(self, horizon, azimuths, lat_rows, slope_deg, aspect_deg, key=None):
+        self.key = key
+        self.horizon = horizon
+        self.azimuths = azimuths
+        self.lat_rows = lat_rows
+        self.slope = np.radians(slope_deg.astype(np.float64))
+        self.aspect = np.radians(np.nan_to_num(aspect_deg.astype(np.float64)))   # flat: any aspect
+        self.valid = np.isfinite(slope_deg)
+
+    @classmethod
+    def from_dem(cls, z, transform, radius_m=MARS_R, n_azimuths=N_AZIMUTHS, max_dist_m=MAX_DIST_M,
+                 slope_method="horn", crs=None):
+        """Precompute from an EQC AOI (transform as returned by MolaTile.read_window)."""
+        H = z.shape[0]
+        dx_rows, dy = row_spacing(transform, H, radius_m=radius_m)
+        a, _, _, _, e, f = tuple(transform)[:6]
+        lat_rows = np.degrees((f + e * (np.arange(H) + 0.5)) / radius_m)
+        horizon, azimuths = horizon_angles(z, dx_rows, dy, n_azimuths, max_dist_m, radius_m)
+        slope, aspect = slope_aspect(z, dx_rows, dy, slope_method)
+        return cls(horizon, azimuths, lat_rows, slope, aspect,
+                   key=horizon_key(z, transform, crs, radius_m, n_azimuths, max_dist_m, slope_method))
+
+    def save(self, path):
+        np.savez_compressed(path, horizon=self.horizon, azimuths=self.azimuths, lat_rows=self.lat_rows,
+                            slope=np.degrees(self.slope), aspect=np.degrees(self.aspect) * self.valid,
+                            key=np.array(json.dumps(self.key)))
+
+    @classmethod
+    def load(cls, path):
+        f = np.load(path)
+        key = json.loads(str(f["key"])) if "key" in f.files else None     # files saved without a key never match
+        return cls(f["horizon"], f["azimuths"], f["lat_rows"], f["slope"], f["aspect"], key=key)
+
+    def horizon_at(self, az_rows):
+        """Horizon angle toward azimuth az_rows (scalar or (H,)), linear between azimuth bins."""
+        H, W = self.horizon.shape[1:]
+        n = len(self.azimuths)
+        pos = (np.broadcast_to(az_rows, (H,)) % 360.0) / (360.0 / n)
+        i0 = np.floor(pos).astype(int) % n
+        i1 = (i0 + 1) % n
+        w = (pos - np.floor(pos))[:, None]
+        rows = np.arange(H)[:, None]
+        cols = np.arange(W)[None, :]
+        return (1.0 - w) * self.horizon[i0[:, None], rows, cols] + w * self.horizon[i1[:, None], rows, cols]
+
+    def sun(self, lst_hours, ls_deg):
+        """Sun (elevation, azimuth) per row."""
+        return solar_position(self.lat_rows, lst_hours, ls_deg)
+
+    def shadow(self, lst_hours, ls_deg):
+        """True where the sun is below the local horizon (terrain shadow or night)."""
+        el, az = self.sun(lst_hours, ls_deg)
+        return (el[:, None] <= 0.0) | (el[:, None] < self.horizon_at(az))
+
+    def cos_incidence(self, lst_hours, ls_deg, shadow=None):
+        """cos(solar incidence angle) on the sloped surface, 0 in shadow; NaN outside the DEM."""
+        el, az = self.sun(lst_hours, ls_deg)
+        el, az = np.radians(el)[:, None], np.radians(az)[:, None]
+        cos_i = np.sin(el) * np.cos(self.slope) + np.cos(el) * np.sin(self.slope) * np.cos(az - self.aspect)
+        if shadow is None:
+            shadow = self.shadow(lst_hours, ls_deg)
+        cos_i = np.where(shadow, 0.0, np.maximum(cos_i, 0.0))
+        return np.where(self.valid, cos_i, np.nan).astype(np.float32)
+
+    def slot_maps(self, ls_deg, slots=THEMIS_SLOTS):
+        """{slot: (shadow float32 0/1 with NaN outside the DEM, cos_incidence)} for the THEMIS slots."""
+        out = {}
+        for name, lst in slots.items():
+            sh = self.shadow(lst, ls_deg)
+            out[name] = (np.where(self.valid, sh, np.nan).astype(np.float32),
+                         self.cos_incidence(lst, ls_deg, shadow=sh))
+        return out
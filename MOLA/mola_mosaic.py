@@ -0,0 +1,148 @@
+# mola_mosaic.py
+# On-demand MOLA MEGDR mosaic for any lon/lat box (sites near tile edges, batches of sites).
+# - The folder of MEGDR products is indexed once from the PDS labels (lat/lon extent,
+#   pixels per degree); tile names are not parsed, so any MEGDR resolution works.
+# - All tiles of one resolution share a global pixel grid (col = lon·ppd, row = (90 - lat)·ppd),
+#   so stitching is a set of array copies from the memory-mapped tiles (mola_pds.MolaTile),
+#   limited to the requested window. Boxes crossing 0°/360° E are wrapped.
+# - Opened tiles stay in an LRU cache bounded in bytes: a batch of hundreds of sites reuses
+#   the memory maps instead of reopening the files.
+#
+#   dem = MegdrMosaic(folder)
+#   topo, transform = dem.read_lonlat(77.0, 18.0, 78.2, 18.9)   # EQC metres, same grid as MolaTile
+
+import glob
+import math
+import os
+from collections import OrderedDict
+import numpy as np
+
+from mola_pds import MolaTile, read_label
+
+CACHE_BYTES = 2 * 1024 ** 3
+
+
+class TileCache:
+    """LRU cache of MolaTile objects, bounded by the bytes of their memory maps."""
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = self.misses = 0
+        self._tiles = OrderedDict()
+
+    def get(self, lbl_path):
+        tile = self._tiles.get(lbl_path)
+        if tile is not None:
+            self._tiles.move_to_end(lbl_path)
+            self.hits += 1
+            return tile
+        self.misses += 1
+        tile = MolaTile(lbl_path)
+        self._tiles[lbl_path] = tile
+        self.nbytes += tile.data.nbytes
+        while self.nbytes > self.max_bytes and len(self._tiles) > 1:
+            _, old = self._tiles.popitem(last=False)
+            self.nbytes -= old.data.nbytes
+        return tile
+
+    def __len__(self):
+        return len(self._tiles)
+
+
+class MegdrMosaic:
+    """Lon/lat window reads across the MEGDR tiles of a folder (product 't' = topography)."""
+
+    def __init__(self, folder, product="t", ppd=None, cache_bytes=CACHE_BYTES):
+        self.folder = folder
+        self.cache = TileCache(cache_bytes)
+        self.index = []
+        for path in sorted(glob.glob(os.path.join(folder, "*.lbl")) + glob.glob(os.path.join(folder, "*.LBL"))):
+            if not os.path.basename(path).lower().startswith("meg" + product):
+                continue
+            lab = read_label(path)
+            if not all(k in lab for k in ("MAP_RESOLUTION", "MAXIMUM_LATITUDE", "WESTERNMOST_LONGITUDE")):
+                continue
+            p = lab["MAP_RESOLUTION"]
+            self.index.append({
+                "path": path, "ppd": p,
+                "row0": int(round((90.0 - lab["MAXIMUM_LATITUDE"]) * p)),
+                "col0": int(round((lab["WESTERNMOST_LONGITUDE"] % 360.0) * p)),
+                "lines": int(lab["LINES"]), "samples": int(lab["LINE_SAMPLES"]),
+            })
+        if not self.index:
+            raise FileNotFoundError(f"No MEGDR 'meg{product}' labels found in {folder}")
+        self.ppd = ppd if ppd is not None else max(t["ppd"] for t in self.index)
+
+    # ---- properties of the grid (from any tile of the chosen resolution) ----
+    def _reference(self):
+        for t in self.index:
+            if t["ppd"] == self.ppd:
+                return self.cache.get(t["path"]), t
+        raise ValueError(f"No MEGDR tile at {self.ppd} pixels/degree in {self.folder}")
+
+    @property
+    def crs_proj4(self):
+        return self._reference()[0].crs_proj4
+
+    @property
+    def radius_m(self):
+        return self._reference()[0].radius_m
+
+    @property
+    def pixel_size_m(self):
+        return self._reference()[0].pixel_size_m
+
+    def covering_tiles(self, lon_min, lat_min, lon_max, lat_max):
+        """Index entries of the tiles intersecting the box (east longitudes, any range)."""
+        return [t for t, *_ in self._pieces(*self._global_window(lon_min, lat_min, lon_max, lat_max))]
+
+    # ---- geometry ----
+    def _global_window(self, lon_min, lat_min, lon_max, lat_max):
+        p = self.ppd
+        lo, hi = lon_min % 360.0, lon_max % 360.0
+        if hi <= lo:
+            hi += 360.0
+        return (int(math.floor((90.0 - lat_max) * p + 1e-9)), int(math.ceil((90.0 - lat_min) * p - 1e-9)),
+                int(math.floor(lo * p + 1e-9)), int(math.ceil(hi * p - 1e-9)))
+
+    def _pieces(self, row0, row1, col0, col1):
+        """(tile, global r0, r1, c0, c1, col shift) for every tile part inside the window."""
+        wrap = int(round(360 * self.ppd))
+        for t in self.index:
+            if t["ppd"] != self.ppd:
+                continue
+            r0, r1 = max(row0, t["row0"]), min(row1, t["row0"] + t["lines"])
+            if r1 <= r0:
+                continue
+            for shift in (0, wrap):
+                c0, c1 = max(col0, t["col0"] + shift), min(col1, t["col0"] + t["samples"] + shift)
+                if c1 > c0:
+                    yield t, r0, r1, c0, c1, shift
+
+    # ---- read ----
+    def read_lonlat(self, lon_min, lat_min, lon_max, lat_max, dtype=np.float64):
+        """
+        Stitched DEM window covering the box (NaN where no tile is available).
+        Returns (array, transform tuple) in the EQC metres of the MolaTile grid.
+        """
+        row0, row1, col0, col1 = self._global_window(lon_min, lat_min, lon_max, lat_max)
+        out = np.full((row1 - row0, col1 - col0), np.nan, dtype=dtype)
+        found = False
+        for t, r0, r1, c0, c1, shift in self._pieces(row0, row1, col0, col1):
+            tile = self.cache.get(t["path"])
+            tr, tc = r0 - t["row0"], c0 - shift - t["col0"]
+            view = tile.data[tr:tr + (r1 - r0), tc:tc + (c1 - c0)]
+            dst = out[r0 - row0:r1 - row0, c0 - col0:c1 - col0]
+            dst[...] = view
+            if tile.nodata is not None:
+                dst[view == tile.nodata] = np.nan
+            found = True
+        if not found:
+            raise FileNotFoundError(f"No MEGDR tile at {self.ppd} px/deg covers lon {lon_min}..{lon_max}, "
+                                    f"lat {lat_min}..{lat_max} in {self.folder}")
+        if np.isnan(out).any():
+            print("[warn] MEGDR tiles do not cover the whole box; missing pixels are NaN")
+        ref, t = self._reference()
+        a, b, c, d, e, f = ref.transform
+        return out, (a, b, c + (col0 - t["col0"]) * a, d, e, f + (row0 - t["row0"]) * e)
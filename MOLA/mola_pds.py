@@ -0,0 +1,131 @@
+# mola_pds.py
+# Direct reader for MOLA MEGDR PDS3 tiles (e.g. megt44n000hb.lbl / .img), no GDAL.
+# The label is parsed once (LINES, LINE_SAMPLES, SAMPLE_TYPE, SAMPLE_BITS, MAP_SCALE,
+# projection offsets, ...) and the .img is memory-mapped: an AOI crop is a NumPy view
+# of the file, so nothing outside the requested window is ever read and no intermediate
+# GeoTIFF of the whole tile is needed.
+#
+# Georeferencing follows the GDAL PDS driver, so bounds in metres are the same as the ones
+# of the GeoTIFF produced by gdal.Translate (simple cylindrical, lon_0 = CENTER_LONGITUDE):
+#   ULX = -(SAMPLE_PROJECTION_OFFSET - 0.5) · MAP_SCALE
+#   ULY =  (LINE_PROJECTION_OFFSET  - 0.5) · MAP_SCALE
+
+import math
+import os
+import re
+import numpy as np
+
+_SAMPLE_TYPES = {
+    "MSB_INTEGER": ">i", "SUN_INTEGER": ">i", "MAC_INTEGER": ">i", "INTEGER": ">i",
+    "LSB_INTEGER": "<i", "PC_INTEGER": "<i",
+    "MSB_UNSIGNED_INTEGER": ">u", "LSB_UNSIGNED_INTEGER": "<u", "UNSIGNED_INTEGER": ">u",
+    "IEEE_REAL": ">f", "REAL": ">f", "PC_REAL": "<f",
+}
+
+_NUMERIC_KEYS = [
+    "RECORD_BYTES", "LINES", "LINE_SAMPLES", "SAMPLE_BITS", "MAP_SCALE", "MAP_RESOLUTION",
+    "LINE_PROJECTION_OFFSET", "SAMPLE_PROJECTION_OFFSET", "CENTER_LATITUDE", "CENTER_LONGITUDE",
+    "A_AXIS_RADIUS", "MAXIMUM_LATITUDE", "MINIMUM_LATITUDE", "WESTERNMOST_LONGITUDE",
+    "EASTERNMOST_LONGITUDE", "MISSING_CONSTANT", "SCALING_FACTOR", "OFFSET",
+]
+
+
+def read_label(lbl_path):
+    """Parse the keys of a MEGDR PDS3 label needed to memory-map and georeference the image."""
+    with open(lbl_path, 'r', encoding='utf-8', errors='ignore') as fh:
+        txt = fh.read()
+    txt = re.sub(r'"[^"]*"', lambda m: m.group(0).replace("=", " "), txt)  # '=' inside DESCRIPTION
+    lab = {}
+    for key in _NUMERIC_KEYS:
+        m = re.search(rf"^\s*{key}\s*=\s*([-+]?[0-9]*\.?[0-9]+(?:[eE][-+]?\d+)?)", txt, re.MULTILINE)
+        if m:
+            lab[key] = float(m.group(1))
+    m = re.search(r"^\s*SAMPLE_TYPE\s*=\s*(\w+)", txt, re.MULTILINE)
+    lab["SAMPLE_TYPE"] = m.group(1).upper() if m else None
+    m = re.search(r'^\s*\^IMAGE\s*=\s*(?:\(\s*)?"?([^",)\s]+)"?(?:\s*,\s*(\d+)\s*(<\s*BYTES\s*>)?)?', txt, re.MULTILINE)
+    if m:
+        lab["IMAGE_FILE"] = m.group(1)
+        lab["IMAGE_POS"] = int(m.group(2)) if m.group(2) else 1
+        lab["IMAGE_POS_BYTES"] = bool(m.group(3))
+    missing = [k for k in ("LINES", "LINE_SAMPLES", "SAMPLE_BITS", "MAP_SCALE",
+                           "LINE_PROJECTION_OFFSET", "SAMPLE_PROJECTION_OFFSET") if k not in lab]
+    if missing or lab["SAMPLE_TYPE"] not in _SAMPLE_TYPES:
+        raise RuntimeError(f"Could not parse {missing or 'SAMPLE_TYPE'} from label file: {lbl_path}")
+    return lab
+
+
+class MolaTile:
+    """
+    Memory-mapped MEGDR tile.
+        tile = MolaTile("megt44n000hb.lbl")
+        topo, transform = tile.window(left, bottom, right, top)   # metres, NumPy view
+    """
+
+    def __init__(self, lbl_path, img_path=None):
+        self.lbl_path = lbl_path
+        self.label = lab = read_label(lbl_path)
+        self.lines, self.samples = int(lab["LINES"]), int(lab["LINE_SAMPLES"])
+        self.dtype = np.dtype(f"{_SAMPLE_TYPES[lab['SAMPLE_TYPE']]}{int(lab['SAMPLE_BITS']) // 8}")
+        self.pixel_size_m = lab["MAP_SCALE"] * 1000.0
+        self.pixels_per_degree = lab.get("MAP_RESOLUTION")
+        self.radius_m = lab.get("A_AXIS_RADIUS", 3396.0) * 1000.0
+        self.lon0 = lab.get("CENTER_LONGITUDE", 0.0)
+        self.nodata = lab.get("MISSING_CONSTANT")
+
+        if img_path is None:
+            img_path = self._find_image(os.path.dirname(lbl_path), lab.get("IMAGE_FILE"))
+        self.img_path = img_path
+        rec = int(lab.get("RECORD_BYTES", 1))
+        pos = lab.get("IMAGE_POS", 1)
+        offset = pos - 1 if lab.get("IMAGE_POS_BYTES") else (pos - 1) * rec
+        self.data = np.memmap(img_path, dtype=self.dtype, mode="r", offset=offset,
+                              shape=(self.lines, self.samples))
+
+        s = self.pixel_size_m
+        self.transform = (s, 0.0, -(lab["SAMPLE_PROJECTION_OFFSET"] - 0.5) * s,
+                          0.0, -s, (lab["LINE_PROJECTION_OFFSET"] - 0.5) * s)
+
+    @staticmethod
+    def _find_image(folder, name):
+        cands = [name, name.lower(), name.upper()] if name else []
+        for c in cands:
+            p = os.path.join(folder, c)
+            if os.path.exists(p):
+                return p
+        raise FileNotFoundError(f"Required file not found: {os.path.join(folder, name or '?')}")
+
+    @property
+    def crs_proj4(self):
+        """Simple cylindrical (equidistant) CRS of the tile, as GDAL reports it."""
+        return (f"+proj=eqc +lat_ts=0 +lat_0=0 +lon_0={self.lon0} +x_0=0 +y_0=0 "
+                f"+a={self.radius_m} +b={self.radius_m} +units=m +no_defs")
+
+    @property
+    def bounds(self):
+        a, _, c, _, e, f = self.transform
+        return c, f + e * self.lines, c + a * self.samples, f   # left, bottom, right, top
+
+    def window_indices(self, left, bottom, right, top):
+        """(row0, row1, col0, col1) of the pixels covering the bounds, clipped to the tile."""
+        a, _, c, _, e, f = self.transform
+        col0 = max(0, int(math.floor((left - c) / a + 1e-9)))
+        col1 = min(self.samples, int(math.ceil((right - c) / a - 1e-9)))
+        row0 = max(0, int(math.floor((top - f) / e + 1e-9)))
+        row1 = min(self.lines, int(math.ceil((bottom - f) / e - 1e-9)))
+        if col1 <= col0 or row1 <= row0:
+            raise ValueError(f"AOI ({left}, {bottom}, {right}, {top}) does not intersect tile bounds {self.bounds}")
+        return row0, row1, col0, col1
+
+    def window(self, left, bottom, right, top):
+        """AOI crop as a view of the memmap (no read until used) + its affine transform."""
+        r0, r1, c0, c1 = self.window_indices(left, bottom, right, top)
+        a, b, c, d, e, f = self.transform
+        return self.data[r0:r1, c0:c1], (a, b, c + c0 * a, d, e, f + r0 * e)
+
+    def read_window(self, left, bottom, right, top, dtype=np.float64):
+        """AOI crop as a native float array (copies only the window) with nodata -> NaN."""
+        view, transform = self.window(left, bottom, right, top)
+        arr = np.asarray(view, dtype=dtype)
+        if self.nodata is not None:
+            arr[view == self.nodata] = np.nan
+        return arr, transform
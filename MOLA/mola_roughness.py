@@ -0,0 +1,90 @@
+# mola_roughness.py
+# Vectorized multi-scale roughness for DEMs (replaces scipy.ndimage.generic_filter).
+# All metrics come from moving-window sums computed with uniform_filter (running sums,
+# O(1) per pixel whatever the window size), shared by every metric of the same size:
+#   n, Σz, Σz², Σx·z, Σy·z  (+ Σx, Σy, Σx², Σy², Σxy of the valid pixel positions)
+#
+# Metrics (k×k window, NaN = no data, partial windows at the borders):
+#   "std"           -> local standard deviation of elevation (np.nanstd in the window), in
+#                      metres; main.py aggregates the 3×3 one into avg_roughness
+#   "rms_detrended" -> RMS height after removing the least-squares plane of the window
+#   "tri"           -> terrain ruggedness: RMS elevation difference to the centre pixel
+#                      (Riley et al. 1999 generalised to k×k: sqrt(Σ(z_i - z_c)² / (n - 1)))
+#   "tpi"           -> topographic position: z_c - mean of the other pixels in the window
+
+import numpy as np
+from scipy.ndimage import uniform_filter
+
+ROUGHNESS_WINDOW = 3
+METRICS = ("std", "rms_detrended", "tri", "tpi")
+
+
+def _wsum(a, size):
+    """Sum over a size×size window (zero outside the array)."""
+    return uniform_filter(a, size=size, mode="constant", cval=0.0) * (size * size)
+
+
+def roughness_multiscale(topo, sizes=(3, 5, 9), metrics=METRICS, dtype=np.float32):
+    """
+    Roughness metrics for several window sizes in one call.
+    Returns {(metric, size): array} with NaN where the centre pixel has no data.
+    """
+    z = np.asarray(topo, dtype=np.float64)
+    valid = np.isfinite(z)
+    # centre elevations on the global mean: keeps Σz² - (Σz)²/n well conditioned
+    z0 = z - (np.nanmean(z) if valid.any() else 0.0)
+    z0[~valid] = 0.0
+    w = valid.astype(np.float64)
+
+    need_plane = "rms_detrended" in metrics
+    if need_plane:
+        H, W = z.shape
+        # pixel coordinates relative to the array centre (small numbers, no cancellation)
+        yy = (np.arange(H, dtype=np.float64) - (H - 1) / 2.0)[:, None] * np.ones((1, W))
+        xx = np.ones((H, 1)) * (np.arange(W, dtype=np.float64) - (W - 1) / 2.0)[None, :]
+        xw, yw = xx * w, yy * w
+
+    out = {}
+    for k in sizes:
+        n = _wsum(w, k)
+        sz = _wsum(z0, k)
+        szz = _wsum(z0 * z0, k)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = sz / n
+            var = np.maximum(szz / n - mean * mean, 0.0)
+
+            if "std" in metrics:
+                out[("std", k)] = np.sqrt(var)
+
+            if need_plane:
+                sx, sy = _wsum(xw, k), _wsum(yw, k)
+                mx, my = sx / n, sy / n
+                cxx = _wsum(xx * xw, k) / n - mx * mx
+                cyy = _wsum(yy * yw, k) / n - my * my
+                cxy = _wsum(xx * yw, k) / n - mx * my
+                cxz = _wsum(xx * z0, k) / n - mx * mean
+                cyz = _wsum(yy * z0, k) / n - my * mean
+                det = cxx * cyy - cxy * cxy
+                ok = det > 1e-12
+                det = np.where(ok, det, 1.0)
+                b = np.where(ok, (cxz * cyy - cyz * cxy) / det, 0.0)
+                c = np.where(ok, (cyz * cxx - cxz * cxy) / det, 0.0)
+                out[("rms_detrended", k)] = np.sqrt(np.maximum(var - b * cxz - c * cyz, 0.0))
+
+            if "tri" in metrics or "tpi" in metrics:
+                zc = z0
+                if "tri" in metrics:
+                    ss = szz - 2.0 * zc * sz + n * zc * zc          # Σ(z_i - z_c)²
+                    out[("tri", k)] = np.sqrt(np.maximum(ss, 0.0) / np.maximum(n - 1.0, 1.0))
+                if "tpi" in metrics:
+                    out[("tpi", k)] = zc - (sz - zc) / np.maximum(n - 1.0, 1.0)
+
+    for key, arr in out.items():
+        arr[~valid] = np.nan
+        out[key] = arr.astype(dtype, copy=False)
+    return out
+
+
+def local_std(topo, size=ROUGHNESS_WINDOW):
+    """Std of elevation (m) in a size×size window (the roughness layer of main.py)."""
+    return roughness_multiscale(topo, sizes=(size,), metrics=("std",))[("std", size)]
@@ -0,0 +1,89 @@
+# mola_slope.py
+# Latitude-correct slope / aspect for DEMs on an equirectangular (simple cylindrical) or
+# geographic grid (MOLA MEGDR, HiRISE / CTX equirectangular DTMs).
+# - row_spacing  -> ground metres per pixel along x for every row (cos(lat) of that row)
+#                   and along y, from the transform and the projection (MAP_SCALE,
+#                   A_AXIS_RADIUS, standard parallel) instead of a fixed centre latitude
+# - slope_aspect -> slope and aspect (degrees, float32) in one pass, 3×3 kernel:
+#       "horn"        Horn (1981), rows weighted 1-2-1          (GDAL / ArcGIS default)
+#       "zt"          Zevenbergen & Thorne (1987), 4 neighbours (centre row / column only)
+#       "planefit"    least-squares plane over the 3×3 window, rows weighted 1-1-1
+#   x differences are taken within each row with that row's spacing, then combined
+#   across rows, so the kernel stays exact when the spacing changes with latitude.
+# Aspect = downslope direction, degrees clockwise from north (NaN on flat pixels).
+# Raster borders are linearly extrapolated (same one-sided differences as np.gradient).
+
+import math
+import numpy as np
+
+MARS_R = 3396190.0
+
+KERNELS = {           # weights of the rows (for d/dx) and of the columns (for d/dy)
+    "horn": (1.0, 2.0, 1.0),
+    "zt": (0.0, 1.0, 0.0),
+    "planefit": (1.0, 1.0, 1.0),
+}
+
+
+def row_spacing(transform, n_rows, radius_m=MARS_R, lat_ts=0.0, geographic=False, row0=0):
+    """
+    (dx per row (n_rows,), dy) ground metres per pixel for rows row0..row0+n_rows-1.
+    transform: (a, b, c, d, e, f); projected = equirectangular with standard parallel lat_ts,
+    geographic = pixel size in degrees.
+    """
+    a, _, _, _, e, f = tuple(transform)[:6]
+    y = f + e * (np.arange(row0, row0 + n_rows) + 0.5)
+    if geographic:
+        lat = np.radians(y)
+        k = radius_m * math.pi / 180.0
+        return k * abs(a) * np.cos(lat), k * abs(e)
+    lat = y / radius_m
+    return abs(a) * np.cos(lat) / math.cos(math.radians(lat_ts)), abs(e)
+
+
+def _pad_linear(z):
+    """Pad by one pixel with 2·edge - inner, so central differences become one-sided at the border."""
+    p = np.pad(z, 1, mode="edge")
+    if z.shape[0] > 1:
+        p[0, 1:-1], p[-1, 1:-1] = 2 * z[0] - z[1], 2 * z[-1] - z[-2]
+    if z.shape[1] > 1:
+        p[:, 0], p[:, -1] = 2 * p[:, 1] - p[:, 2], 2 * p[:, -2] - p[:, -3]
+    return p
+
+
+def gradients(z, dx_rows, dy, method="horn"):
+    """(dz/dx east, dz/dy north) in m/m; dx_rows: scalar or (H,) spacing per row."""
+    if method not in KERNELS:
+        raise ValueError(f"Unknown slope method '{method}' (expected one of {sorted(KERNELS)})")
+    w0, w1, w2 = KERNELS[method]
+    z = np.asarray(z, dtype=np.float64)
+    H, W = z.shape
+    p = _pad_linear(z)
+    dx_p = np.broadcast_to(np.asarray(dx_rows, dtype=np.float64), (H,))
+    dx_p = np.concatenate([dx_p[:1], dx_p, dx_p[-1:]])[:, None]
+
+    gx_rows = (p[:, 2:] - p[:, :-2]) / (2.0 * dx_p)        # per-row central x difference
+    gy_cols = (p[:-2, :] - p[2:, :]) / (2.0 * dy)          # north-positive (row 0 = north)
+    ws = w0 + w1 + w2
+    dzdx = (w0 * gx_rows[:-2] + w1 * gx_rows[1:-1] + w2 * gx_rows[2:]) / ws
+    dzdy = (w0 * gy_cols[:, :-2] + w1 * gy_cols[:, 1:-1] + w2 * gy_cols[:, 2:]) / ws
+    return dzdx, dzdy
+
+
+def slope_aspect(z, dx_rows, dy, method="horn", dtype=np.float32):
+    """Slope (deg) and aspect (deg clockwise from north, downslope) in one pass."""
+    dzdx, dzdy = gradients(z, dx_rows, dy, method)
+    grad = np.hypot(dzdx, dzdy)
+    slope = np.degrees(np.arctan(grad))
+    aspect = np.degrees(np.arctan2(-dzdx, -dzdy)) % 360.0
+    aspect[grad == 0] = np.nan
+    nan = np.isnan(z)
+    slope[nan] = np.nan
+    aspect[nan] = np.nan
+    return slope.astype(dtype), aspect.astype(dtype)
+
+
+def tile_slope_aspect(topo, transform, tile, method="horn"):
+    """slope_aspect for an AOI read from a MolaTile / MegdrMosaic (spacing from MAP_SCALE and the EQC projection)."""
+    dx_rows, dy = row_spacing(transform, topo.shape[0], radius_m=tile.radius_m)
+    return slope_aspect(topo, dx_rows, dy, method)
@@ -0,0 +1,305 @@
+# mola_tiled.py
+# Tiled, halo-aware DEM processing for rasters that do not fit in memory
+# (1 m HiRISE / 6 m CTX DTMs of the landing ellipse, full MEGDR tiles, ...).
+# - The DEM is split into TILE×TILE cores; each core is read with a halo sized to the
+#   largest operator footprint (slope/curvature: 1 px, roughness: window//2), so the
+#   stitched result is the same as processing the whole raster at once.
+# - hazard: the km-scale relief / crater kernels run on a block-mean DEM (mola_hazard
+#   coarse_factor, kernels <= MAX_KERNEL_PX coarse px) built once per run with the global
+#   elevation range; each tile reads its coarse context from that .npy, so the full-resolution
+#   halo stays 1 px and all tiles use the same bin edges and cells (no seams).
+# - Tiles are processed in a process pool; every worker opens the source itself and reads
+#   only its window (rasterio for GeoTIFF / PDS DTMs, mola_pds.MolaTile for MEGDR .lbl).
+# - Results are written core by core into tiled, compressed float32 GeoTIFFs, with at most
+#   2·workers tiles in flight: peak memory depends on the tile size, not on the DEM size.
+#
+#   python mola_tiled.py DTM.tif out_dir --ops slope roughness curvature --tile 1024 --workers 8
+
+import argparse
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+import rasterio
+from rasterio.crs import CRS
+from rasterio.transform import Affine
+from rasterio.windows import Window
+
+from mola_pds import MolaTile
+from mola_roughness import roughness_multiscale, ROUGHNESS_WINDOW
+from mola_slope import row_spacing, slope_aspect
+from numpy.lib.format import open_memmap
+
+from mola_hazard import (CRATER_RADII_M, MAX_KERNEL_PX, RELIEF_RADII_M, block_mean, coarse_factor, context_layers,
+                         hazard_layers, kernel_halo, repeat_blocks)
+
+MARS_R = 3396190.0
+
+TILE = 1024          # core size (px), multiple of the GeoTIFF block size
+BLOCK = 256          # GeoTIFF internal tile size
+WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+
+# ===========================
+# Operators
+# ===========================
+# op(z, ctx, **params) -> {output name: array like z}
+# z: float64 block (core + halo, NaN = no data); ctx: {"dx" (m/px per row of z, (H,)),
+# "dy" (m/px), "row0", "col0" (global pixel of z[0, 0]), "transform"}.
+# halo(**params) -> px of context needed.
+
+def op_slope(z, ctx, method="horn"):
+    slope, aspect = slope_aspect(z, ctx["dx"], ctx["dy"], method)
+    return {"slope_deg": slope, "aspect_deg": aspect}
+
+
+def op_roughness(z, ctx, sizes=(ROUGHNESS_WINDOW,), metrics=("std",)):
+    out = roughness_multiscale(z, sizes=sizes, metrics=metrics)
+    return {("roughness" if (m, k) == ("std", ROUGHNESS_WINDOW) else f"{m}_{k}"): a
+            for (m, k), a in out.items()}
+
+
+def op_curvature(z, ctx):
+    """Laplacian curvature d²z/dx² + d²z/dy² (1/m); NaN on the raster border."""
+    c = np.full(z.shape, np.nan)
+    dx = np.broadcast_to(ctx["dx"], (z.shape[0],))[1:-1, None]
+    c[1:-1, 1:-1] = ((z[1:-1, 2:] - 2 * z[1:-1, 1:-1] + z[1:-1, :-2]) / dx ** 2 +
+                     (z[2:, 1:-1] - 2 * z[1:-1, 1:-1] + z[:-2, 1:-1]) / ctx["dy"] ** 2)
+    return {"curvature": c}
+
+
+_COARSE = {}    # per-process cache of opened coarse DEMs
+
+
+def op_hazard(z, ctx, pixel_m, coarse=None, factor=1, z_range=None, **params):
+    """
+    Hazard layers of mola_hazard. coarse / factor / z_range (set by run_tiled): block-mean DEM
+    (.npy) of the whole source, its factor and global elevation range; the relief / crater
+    layers come from the coarse cells around this block. Without coarse: whole-block fallback.
+    """
+    slope, _ = slope_aspect(z, ctx["dx"], ctx["dy"])
+    if coarse is None:
+        return hazard_layers(z, slope, pixel_m, **params)
+    if coarse not in _COARSE:
+        _COARSE[coarse] = np.load(coarse, mmap_mode="r")
+    zc = _COARSE[coarse]
+    f = factor
+    relief_radii_m = params.get("relief_radii_m", RELIEF_RADII_M)
+    crater_radii_m = params.get("crater_radii_m", CRATER_RADII_M)
+    hc = kernel_halo(pixel_m * f, relief_radii_m, crater_radii_m)
+    (H, W), r0, c0 = z.shape, ctx["row0"], ctx["col0"]
+    cr0, cr1 = max(0, r0 // f - hc), min(zc.shape[0], (r0 + H - 1) // f + 1 + hc)
+    cc0, cc1 = max(0, c0 // f - hc), min(zc.shape[1], (c0 + W - 1) // f + 1 + hc)
+    layers = context_layers(np.asarray(zc[cr0:cr1, cc0:cc1], dtype=np.float64), pixel_m * f,
+                            relief_radii_m, crater_radii_m, z_range)
+    context = {k: repeat_blocks(a, f, r0 - cr0 * f, c0 - cc0 * f, z.shape) for k, a in layers.items()}
+    return hazard_layers(z, slope, pixel_m, context=context, **params)
+
+
+def _hazard_halo(pixel_m, coarse=None, **p):
+    if coarse is not None:
+        return 1                                        # slope; the kernels read the coarse DEM
+    return kernel_halo(pixel_m, **{k: p[k] for k in ("relief_radii_m", "crater_radii_m") if k in p})
+
+
+OPERATORS = {
+    "slope":     (op_slope, lambda method="horn": 1),
+    "roughness": (op_roughness, lambda sizes=(ROUGHNESS_WINDOW,), metrics=("std",): max(sizes) // 2),
+    "curvature": (op_curvature, lambda: 1),
+    "hazard":    (op_hazard, _hazard_halo),
+}
+
+
+def operator_halo(ops):
+    """Halo (px) for a list of (name, params) operators."""
+    return max(OPERATORS[name][1](**params) for name, params in ops)
+
+
+# ===========================
+# Sources
+# ===========================
+
+class DemSource:
+    """Windowed float64 reads from a GeoTIFF/PDS DTM (rasterio) or a MEGDR .lbl (MolaTile)."""
+
+    def __init__(self, path, window=None):
+        self.path = path
+        if path.lower().endswith(".lbl"):
+            self._tile = MolaTile(path)
+            self._ds = None
+            H, W, transform = self._tile.lines, self._tile.samples, self._tile.transform
+            self.crs = CRS.from_string(self._tile.crs_proj4)
+            self.radius_m, self.lat_ts, self.geographic = self._tile.radius_m, 0.0, False
+        else:
+            self._tile = None
+            self._ds = rasterio.open(path)
+            H, W, transform = self._ds.height, self._ds.width, tuple(self._ds.transform)[:6]
+            self.crs = self._ds.crs
+            self.geographic = bool(self.crs and self.crs.is_geographic)
+            params = self.crs.to_dict() if self.crs else {}
+            self.radius_m = float(params.get("R", params.get("a", MARS_R)))
+            # only equirectangular grids shrink with cos(lat); other projections: constant spacing
+            self.lat_ts = float(params.get("lat_ts", 0.0)) if params.get("proj") == "eqc" else None
+        # optional sub-window (row0, row1, col0, col1) of the source
+        self.r_off, r1, self.c_off, c1 = window if window is not None else (0, H, 0, W)
+        self.height, self.width = r1 - self.r_off, c1 - self.c_off
+        a, b, c, d, e, f = transform
+        self.transform = (a, b, c + self.c_off * a, d, e, f + self.r_off * e)
+
+    def row_spacing(self, r0, r1):
+        """(dx per row, dy) ground metres per pixel for rows r0..r1-1 of the (windowed) source."""
+        if self.lat_ts is None and not self.geographic:
+            return np.full(r1 - r0, abs(self.transform[0])), abs(self.transform[4])
+        return row_spacing(self.transform, r1 - r0, self.radius_m, self.lat_ts or 0.0,
+                           self.geographic, row0=r0)
+
+    def read(self, r0, r1, c0, c1):
+        r0, r1, c0, c1 = r0 + self.r_off, r1 + self.r_off, c0 + self.c_off, c1 + self.c_off
+        if self._tile is not None:
+            view = self._tile.data[r0:r1, c0:c1]
+            z = np.asarray(view, dtype=np.float64)
+            if self._tile.nodata is not None:
+                z[view == self._tile.nodata] = np.nan
+            return z
+        m = self._ds.read(1, window=Window(c0, r0, c1 - c0, r1 - r0), masked=True)
+        return m.astype(np.float64).filled(np.nan)
+
+
+def build_coarse_dem(src, f, path):
+    """Block-mean (f×f) DEM of the whole source, streamed in row strips into a float32 .npy."""
+    out = open_memmap(path, mode="w+", dtype=np.float32, shape=(-(-src.height // f), -(-src.width // f)))
+    step = f * max(1, BLOCK // f)
+    for r0 in range(0, src.height, step):
+        r1 = min(src.height, r0 + step)
+        out[r0 // f:-(-r1 // f)] = block_mean(src.read(r0, r1, 0, src.width), f)
+    out.flush()
+    return path
+
+
+def tile_grid(height, width, tile=TILE, halo=1):
+    """(core (r0, r1, c0, c1), padded (r0, r1, c0, c1)) for every tile, halos clipped to the raster."""
+    for r0 in range(0, height, tile):
+        for c0 in range(0, width, tile):
+            r1, c1 = min(height, r0 + tile), min(width, c0 + tile)
+            yield (r0, r1, c0, c1), (max(0, r0 - halo), min(height, r1 + halo),
+                                     max(0, c0 - halo), min(width, c1 + halo))
+
+
+# ===========================
+# Worker
+# ===========================
+
+_SOURCES = {}   # per-process cache of opened sources
+
+
+def _process_tile(src_path, src_window, core, padded, ops, spacing):
+    key = (src_path, src_window)
+    if key not in _SOURCES:
+        _SOURCES[key] = DemSource(src_path, src_window)
+    src = _SOURCES[key]
+    pr0, pr1, pc0, pc1 = padded
+    z = src.read(pr0, pr1, pc0, pc1)
+    if spacing is None:
+        dx, dy = src.row_spacing(pr0, pr1)
+    else:
+        dx, dy = np.full(pr1 - pr0, float(spacing[0])), float(spacing[1])
+    ctx = {"dx": dx, "dy": dy, "row0": pr0, "col0": pc0, "transform": src.transform}
+    r0, r1, c0, c1 = core
+    crop = (slice(r0 - pr0, r1 - pr0), slice(c0 - pc0, c1 - pc0))
+    out = {}
+    for name, params in ops:
+        for k, a in OPERATORS[name][0](z, ctx, **params).items():
+            out[k] = np.ascontiguousarray(a[crop], dtype=np.float32)
+    return core, out
+
+
+# ===========================
+# Driver
+# ===========================
+
+def run_tiled(src_path, out_dir, ops=(("slope", {}), ("roughness", {})), tile=TILE,
+              workers=WORKERS, window=None, spacing=None, prefix=""):
+    """
+    Process a DEM tile by tile and write one tiled GeoTIFF per output.
+    window: optional (row0, row1, col0, col1) of the source to process (e.g. the AOI of a MEGDR tile).
+    spacing: (dx, dy) constant ground metres per pixel; default = from the projection
+             (per-row cos(lat) spacing on equirectangular / geographic grids).
+    Returns {output name: path}.
+    """
+    ops = [(name, dict(params)) for name, params in ops]
+    src = DemSource(src_path, window)
+    os.makedirs(out_dir, exist_ok=True)
+    for name, params in ops:
+        if name == "hazard" and params.get("coarse") is None:
+            f = coarse_factor(params["pixel_m"], params.get("relief_radii_m", RELIEF_RADII_M),
+                              params.get("crater_radii_m", CRATER_RADII_M),
+                              params.pop("max_kernel_px", MAX_KERNEL_PX))
+            path = build_coarse_dem(src, f, os.path.join(out_dir, f"{prefix}hazard_coarse_dem.npy"))
+            zc = np.load(path, mmap_mode="r")
+            params.update(coarse=path, factor=f, z_range=(float(np.nanmin(zc)), float(np.nanmax(zc))))
+            print(f"[info] hazard kernels on a {f}×{f} block-mean DEM {zc.shape[1]}×{zc.shape[0]}")
+    halo = operator_halo(ops)
+    tile = max(BLOCK, int(math.ceil(tile / BLOCK)) * BLOCK)
+
+    profile = {
+        "driver": "GTiff", "dtype": "float32", "count": 1, "nodata": np.nan,
+        "height": src.height, "width": src.width, "crs": src.crs,
+        "transform": Affine(*src.transform), "tiled": True, "blockxsize": BLOCK,
+        "blockysize": BLOCK, "compress": "lzw", "predictor": 3, "BIGTIFF": "IF_SAFER",
+    }
+    dsts, paths = {}, {}
+    jobs = tile_grid(src.height, src.width, tile, halo)
+
+    def write(core, out):
+        r0, r1, c0, c1 = core
+        for k, a in out.items():
+            if k not in dsts:
+                paths[k] = os.path.join(out_dir, f"{prefix}{k}.tif")
+                dsts[k] = rasterio.open(paths[k], "w", **profile)
+            dsts[k].write(a, 1, window=Window(c0, r0, c1 - c0, r1 - r0))
+
+    n_tiles = math.ceil(src.height / tile) * math.ceil(src.width / tile)
+    print(f"[info] {src.width}×{src.height} px, {n_tiles} tiles of {tile} px (halo {halo}), {workers} workers")
+    try:
+        if workers <= 1:
+            for core, padded in jobs:
+                write(*_process_tile(src_path, window, core, padded, ops, spacing))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = set()
+                for core, padded in jobs:
+                    pending.add(pool.submit(_process_tile, src_path, window, core, padded, ops, spacing))
+                    if len(pending) >= 2 * workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for fut in done:
+                            write(*fut.result())
+                for fut in pending:
+                    write(*fut.result())
+    finally:
+        for d in dsts.values():
+            d.close()
+    for k, p in paths.items():
+        print("Saved:", p)
+    return paths
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Tiled slope / roughness / curvature / hazard layers for large DEMs")
+    ap.add_argument("dem", help="GeoTIFF / PDS DTM, or MEGDR .lbl")
+    ap.add_argument("out_dir")
+    ap.add_argument("--ops", nargs="+", default=["slope", "roughness"], choices=sorted(OPERATORS))
+    ap.add_argument("--tile", type=int, default=TILE)
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    args = ap.parse_args()
+    ops = [(op, {}) for op in args.ops]
+    if "hazard" in args.ops:
+        src = DemSource(args.dem)
+        dx, dy = src.row_spacing(0, src.height)
+        ops[args.ops.index("hazard")] = ("hazard", {"pixel_m": float(np.mean(dx) + dy) / 2.0})
+    run_tiled(args.dem, args.out_dir, ops=ops,
+              tile=args.tile, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
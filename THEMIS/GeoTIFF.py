@@ -103,6 +103,7 @@ from rasterio.enums import Resampling
 from rasterio.transform import from_bounds, Affine
 from rasterio.crs import CRS
 import matplotlib.pyplot as plt
+from jezero_grid import JEZERO_GRID
 
 # -------- CONFIG: specify your XMLs for each band --------
 # Glob patterns are also accepted. You can use .xml or .img (the script tries to find the matching .xml).
@@ -130,7 +131,7 @@ FASCIA_4_XMLS = [
                  ]
 
 # Jezero BBOX in degrees (E+, N+)
-BBOX_DEG   = [77.2663, 18.0077, 78.1112, 18.8094]     # [minlon, minlat, maxlon, maxlat]
+BBOX_DEG   = list(JEZERO_GRID.bbox_deg)               # [minlon, minlat, maxlon, maxlat] of the shared grid
 TARGET_RES_M = 150.0                      # e.g. 100–200 m/px; increase if you need less RAM
 MAX_PIXELS   = 60_000_000                 # safe RAM budget
 # ------------------------------------------------
@@ -1,8 +1,9 @@
 # This cell generates 100x100 aggregated temperature maps from median TIFs.
-# It calculates block averages and saves the results as GeoTIFFs and PNGs.
+# It calculates cell averages on the shared JEZERO_GRID and saves the results as GeoTIFFs and PNGs.
 import matplotlib.pyplot as plt
 import rasterio
 import numpy as np
+from jezero_grid import JEZERO_GRID
 
 # Re-define a plotting function suitable for generic grid heatmaps with numerical axes
 def plot_grid_heatmap(arr, out_png, title, vmin=None, vmax=None, cmap="inferno", cbar_label="Value"):
@@ -43,7 +44,7 @@ if 'fasce_data' not in globals() or 'fascia_times' not in globals() or \
 else:
     print("\n--- Generazione Mappe di Temperatura Aggregate (100x100) ---")
 
-    target_grid_size = 100
+    target_grid_size = JEZERO_GRID.nx
 
     for nome, data in fasce_data.items():
         time_str_raw = fascia_times.get(nome, "Unknown Time")
@@ -54,35 +55,12 @@ else:
             with rasterio.open(tif_file_path) as src:
                 bt_data = src.read(1)  # Read the temperature data
                 bt_data[bt_data == src.nodata] = np.nan # Replace nodata with NaN
+                src_crs, src_tf = src.crs, src.transform
 
-            H_orig, W_orig = bt_data.shape
-
-            # Calculate block sizes for averaging
-            block_h = H_orig // target_grid_size
-            block_w = W_orig // target_grid_size
-
-            # Create an empty array for the aggregated grid
-            aggregated_bt = np.full((target_grid_size, target_grid_size), np.nan, dtype=np.float32)
-
-            # Perform block averaging
-            for i in range(target_grid_size):
-                for j in range(target_grid_size):
-                    h_start = i * block_h
-                    h_end = (i + 1) * block_h
-                    w_start = j * block_w
-                    w_end = (j + 1) * block_w
-
-                    # Adjust end points for the last row/column to include all pixels
-                    if i == target_grid_size - 1:
-                        h_end = H_orig
-                    if j == target_grid_size - 1:
-                        w_end = W_orig
-
-                    block_data = bt_data[h_start:h_end, w_start:w_end]
-                    valid_block_data = block_data[np.isfinite(block_data)]
-
-                    if valid_block_data.size > 0:
-                        aggregated_bt[i, j] = np.mean(valid_block_data)
+            # Cell means on the shared grid (jezero_grid.py, same cells as MOLA / CRISM):
+            # one bincount over the pixel -> cell map of this raster geometry
+            aggregated_bt, _ = JEZERO_GRID.aggregate(bt_data, src_crs, src_tf)
+            aggregated_bt = aggregated_bt.astype(np.float32)
 
             # Define filename for the aggregated TIFF
             tif_grid_path = f"/content/themis_BT_Grid100x100_{time_str_file}_median.tif"
@@ -0,0 +1,195 @@
+# jezero_grid.py
+# One grid definition shared by the MOLA, THEMIS and CRISM pipelines, so the x / y cells of
+# the per-instrument tables are the same ground cells when jezero_final_ML.csv is fused.
+# - The grid is a lon/lat rectangle (BBOX_DEG of THEMIS = crop limits of CRISM) split into
+#   nx × ny equal cells; x = column (west -> east), y = row (north -> south), from 0.
+# - Every raster of the project is on an equirectangular (eqc) or lon/lat grid, where lon
+#   depends only on the column and lat only on the row. The pixel -> cell map of a raster
+#   geometry is therefore two 1-D lookups (cell column per raster column, cell row per raster
+#   row), computed once per (CRS, transform, shape) and cached.
+# - aggregate(): NaN-aware cell means with ONE np.bincount pass per band.
+# - pixel_edges(): the same cells as pixel rectangles (for summed-area tables, mola_grid.py).
+# A pixel belongs to the cell containing its centre.
+#
+#   from jezero_grid import JEZERO_GRID
+#   means, counts = JEZERO_GRID.aggregate(arr, crs, transform)   # (ny, nx) each
+
+import math
+import numpy as np
+import pandas as pd
+
+MARS_R = 3396190.0
+BBOX_DEG = (77.2663, 18.0077, 78.1112, 18.8094)   # lon_min, lat_min, lon_max, lat_max
+GRID_SHAPE = (100, 100)                            # (ny, nx)
+MARS_LONLAT = f"+proj=longlat +a={MARS_R} +b={MARS_R} +no_defs"   # CRS of the grid itself
+
+
+def crs_params(crs):
+    """PROJ parameters of a CRS given as rasterio/pyproj CRS, PROJ string or dict."""
+    if isinstance(crs, dict):
+        return dict(crs)
+    if hasattr(crs, "to_proj4"):
+        crs = crs.to_proj4()
+    params = {}
+    for tok in str(crs).split():
+        k, _, v = tok.lstrip("+").partition("=")
+        try:
+            params[k] = float(v)
+        except ValueError:
+            params[k] = v or True
+    return params
+
+
+class GridSpec:
+    """Lon/lat cell grid with cached pixel -> cell maps for every raster geometry."""
+
+    def __init__(self, bbox_deg=BBOX_DEG, shape=GRID_SHAPE):
+        self.lon_min, self.lat_min, self.lon_max, self.lat_max = map(float, bbox_deg)
+        self.ny, self.nx = shape
+        self.dlon = (self.lon_max - self.lon_min) / self.nx
+        self.dlat = (self.lat_max - self.lat_min) / self.ny
+        self._maps = {}
+
+    @property
+    def shape(self):
+        return self.ny, self.nx
+
+    @property
+    def bbox_deg(self):
+        return self.lon_min, self.lat_min, self.lon_max, self.lat_max
+
+    def with_shape(self, shape):
+        """Same area, another number of cells (e.g. 50×50, 250×250)."""
+        return GridSpec(self.bbox_deg, shape)
+
+    @property
+    def transform(self):
+        """(a, b, c, d, e, f) of the grid as a north-up raster in MARS_LONLAT (rasterio.Affine(*t))."""
+        return self.dlon, 0.0, self.lon_min, 0.0, -self.dlat, self.lat_max
+
+    def cell_bounds_lonlat(self, x, y):
+        """(lon_min, lat_min, lon_max, lat_max) of cell (x, y)."""
+        lon0 = self.lon_min + x * self.dlon
+        lat1 = self.lat_max - y * self.dlat
+        return lon0, lat1 - self.dlat, lon0 + self.dlon, lat1
+
+    # ---- geometry of a raster ----
+    @staticmethod
+    def _lonlat_funcs(crs):
+        """(x -> lon, y -> lat, lon -> x, lat -> y) for an eqc or lon/lat CRS."""
+        p = crs_params(crs)
+        proj = p.get("proj")
+        if proj in ("longlat", "latlong", "lonlat"):
+            return (lambda x: x), (lambda y: y), (lambda lon: lon), (lambda lat: lat)
+        if proj != "eqc":
+            raise ValueError(f"Unsupported projection for the shared grid: {proj!r} (expected eqc or longlat)")
+        r = float(p.get("R", p.get("a", MARS_R)))
+        lon_0, lat_0 = float(p.get("lon_0", 0.0)), float(p.get("lat_0", 0.0))
+        x_0, y_0 = float(p.get("x_0", 0.0)), float(p.get("y_0", 0.0))
+        kx = r * math.cos(math.radians(float(p.get("lat_ts", 0.0))))
+        return (lambda x: lon_0 + np.degrees((np.asarray(x) - x_0) / kx),
+                lambda y: lat_0 + np.degrees((np.asarray(y) - y_0) / r),
+                lambda lon: x_0 + kx * np.radians(np.asarray(lon) - lon_0),
+                lambda lat: y_0 + r * np.radians(np.asarray(lat) - lat_0))
+
+    def bounds_in(self, crs):
+        """(left, bottom, right, top) of the grid in the coordinates of crs (eqc metres or degrees)."""
+        _, _, to_x, to_y = self._lonlat_funcs(crs)
+        lon_0 = crs_params(crs).get("lon_0", 0.0)
+        lo = (self.lon_min - lon_0 + 180.0) % 360.0 - 180.0 + lon_0    # same 360° branch as lon_0
+        return (float(to_x(lo)), float(to_y(self.lat_min)),
+                float(to_x(lo + self.lon_max - self.lon_min)), float(to_y(self.lat_max)))
+
+    def index_map(self, crs, transform, shape):
+        """
+        (cell row per raster row (H,), cell column per raster column (W,)), -1 outside the grid.
+        Cached per (CRS, transform, shape).
+        """
+        key = (tuple(sorted((k, str(v)) for k, v in crs_params(crs).items())),
+               tuple(float(v) for v in tuple(transform)[:6]), tuple(shape[-2:]))
+        if key in self._maps:
+            return self._maps[key]
+        a, b, c, d, e, f = key[1]
+        if b or d:
+            raise ValueError("Rotated rasters are not supported by the shared grid")
+        H, W = key[2]
+        to_lon, to_lat, _, _ = self._lonlat_funcs(crs)
+        lon = to_lon(c + a * (np.arange(W) + 0.5))
+        lat = to_lat(f + e * (np.arange(H) + 0.5))
+        lon = (lon - self.lon_min + 180.0) % 360.0 - 180.0            # longitude relative to lon_min
+        col = np.floor(lon / self.dlon).astype(np.int64)
+        row = np.floor((self.lat_max - lat) / self.dlat).astype(np.int64)
+        col[(col < 0) | (col >= self.nx)] = -1
+        row[(row < 0) | (row >= self.ny)] = -1
+        self._maps[key] = (row, col)
+        return row, col
+
+    def pixel_edges(self, crs, transform, shape):
+        """
+        Cells as pixel rectangles: (r0, r1) per cell row (ny,) and (c0, c1) per cell column (nx,),
+        half-open. Cells smaller than a pixel get the nearest pixel; cells outside the raster
+        are empty (r1 == r0 or c1 == c0). North-up rasters only.
+        """
+        row, col = self.index_map(crs, transform, shape)
+
+        def edges(idx, n):
+            pos = np.flatnonzero(idx >= 0)
+            ids = idx[pos]
+            if np.any(np.diff(ids) < 0):
+                raise ValueError("pixel_edges needs a north-up, west-to-east raster")
+            if not len(pos):
+                return np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64)
+            k = np.arange(n)
+            lo = np.searchsorted(ids, k, "left")
+            hi = np.searchsorted(ids, k, "right")
+            start = np.where(hi > lo, pos[np.minimum(lo, len(pos) - 1)], 0)
+            end = start + (hi - lo)
+            # cells smaller than a pixel (no pixel centre inside): take the nearest pixel
+            gap = hi == lo
+            if gap.any() and len(pos) > 1:
+                step = (ids[-1] - ids[0]) / (len(pos) - 1)          # cells per pixel
+                prev = np.clip(lo[gap] - 1, 0, len(pos) - 1)
+                nxt = np.clip(lo[gap], 0, len(pos) - 1)
+                pick = np.where(np.abs(k[gap] - ids[prev]) <= np.abs(ids[nxt] - k[gap]), prev, nxt)
+                fill = np.abs(k[gap] - ids[pick]) <= step
+                cells = np.flatnonzero(gap)[fill]
+                start[cells], end[cells] = pos[pick[fill]], pos[pick[fill]] + 1
+            return start, end
+
+        r0, r1 = edges(row, self.ny)
+        c0, c1 = edges(col, self.nx)
+        return r0, r1, c0, c1
+
+    # ---- aggregation ----
+    def aggregate(self, bands, crs, transform, nodata=None):
+        """
+        NaN-aware cell means of a raster (H, W) or stack (B, H, W) on this grid.
+        Returns (means, counts) with shape (ny, nx) or (B, ny, nx); one bincount per band.
+        """
+        arr = np.asarray(bands)
+        single = arr.ndim == 2
+        stack = arr[None] if single else arr
+        row, col = self.index_map(crs, transform, stack.shape)
+        inside = (row[:, None] >= 0) & (col[None, :] >= 0)
+        cell = (row[:, None] * self.nx + col[None, :])[inside]
+        n = self.nx * self.ny
+        means = np.full((stack.shape[0], n), np.nan)
+        counts = np.zeros((stack.shape[0], n), dtype=np.int64)
+        for i, band in enumerate(stack):
+            v = band[inside].astype(np.float64)
+            ok = np.isfinite(v) if nodata is None else np.isfinite(v) & (v != nodata)
+            counts[i] = np.bincount(cell[ok], minlength=n)
+            s = np.bincount(cell[ok], weights=v[ok], minlength=n)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means[i] = np.where(counts[i] > 0, s / np.maximum(counts[i], 1), np.nan)
+        means = means.reshape(-1, self.ny, self.nx)
+        counts = counts.reshape(-1, self.ny, self.nx)
+        return (means[0], counts[0]) if single else (means, counts)
+
+    def table(self, layers):
+        """DataFrame x, y, <layer>... from {name: (ny, nx) array}, rows y-major (like the CSV exports)."""
+        yy, xx = np.divmod(np.arange(self.nx * self.ny), self.nx)
+        return pd.DataFrame({"x": xx, "y": yy, **{k: np.asarray(v).ravel() for k, v in layers.items()}})
+
+
+JEZERO_GRID = GridSpec()